@@ -0,0 +1,103 @@
+"""
+CPU time and peak allocations for turning a large LLM response into an API response body.
+
+    python -m benchmarks.parse_serialize --files 40 --file-kb 10 --iterations 50
+
+legacy: regex fence stripping + json.loads + model_validate, then FastAPI's response_model
+        pass (dump to dict, re-validate, serialize, json.dumps)
+fast:   index-based JSON span + TypeAdapter.validate_json, then ModelJSONResponse
+        (one dump_json, no re-validation)
+Both sides go through a real FastAPI app in-process, so the HTTP layer is included.
+"""
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+from typing import Dict, List, Optional
+from src.core.llm import MistralLLM
+from src.core.models import CodeGenerationResponse, GeneratedFile
+
+
+def make_response(files: int, file_kb: int) -> str:
+    body = "-- FCIS customization\n" + ("UPDATE STTM_PE_FUND_EXT SET VINTAGE_YEAR = 2024 WHERE FUND_ID = 'PE001';\n" * (file_kb * 14))
+    payload = CodeGenerationResponse(
+        files=[GeneratedFile(file_name=f"file_{i}.sql", file_content=body, file_type="DML") for i in range(files)],
+        summary="Generated DML for the private equity extension.",
+    )
+    return f"Here is the generated code:\n```json\n{payload.model_dump_json(indent=2)}\n```"
+
+
+def legacy_parse(content: str) -> CodeGenerationResponse:
+    if "```" in content:
+        content = re.sub(r"```json\s*", "", content)
+        content = re.sub(r"```\s*", "", content)
+        content = content.strip()
+    start = content.find("{")
+    return CodeGenerationResponse.model_validate(json.loads(content[start:]))
+
+
+def build_app(content: str):
+    from fastapi import FastAPI
+    from src.web.responses import ModelJSONResponse
+    llm = MistralLLM(client=object())
+    app = FastAPI()
+
+    @app.post("/legacy", response_model=CodeGenerationResponse)
+    async def legacy():
+        return legacy_parse(content)
+
+    @app.post("/fast", response_model=CodeGenerationResponse)
+    async def fast():
+        result, _ = llm._parse_structured(content, CodeGenerationResponse)
+        return ModelJSONResponse(result)
+
+    return app
+
+
+async def run(app, path: str, iterations: int) -> Dict[str, float]:
+    import httpx
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    body = (await client.post(path)).content  # warm-up
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await client.post(path)
+    cpu = (time.process_time() - cpu_started) / iterations
+    wall = (time.perf_counter() - started) / iterations
+
+    tracemalloc.start()
+    await client.post(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await client.aclose()
+    return {"cpu_ms": cpu * 1000, "wall_ms": wall * 1000, "peak_kb": peak / 1024, "body": body}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare legacy and fast parse/serialize paths.")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--file-kb", type=int, default=10, help="Approximate size of each generated file")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    content = make_response(args.files, args.file_kb)
+    app = build_app(content)
+    results = {name: asyncio.run(run(app, f"/{name}", args.iterations)) for name in ("legacy", "fast")}
+    if json.loads(results["legacy"].pop("body")) != json.loads(results["fast"].pop("body")):
+        print("WARNING: response bodies differ")
+
+    print(f"LLM response: {len(content) / 1024:.0f} KB, {args.files} files, {args.iterations} iterations")
+    print(f"{'path':<8} {'cpu ms':>9} {'wall ms':>9} {'peak KB':>10}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['cpu_ms']:>9.2f} {r['wall_ms']:>9.2f} {r['peak_kb']:>10.0f}")
+    legacy, fast = results["legacy"], results["fast"]
+    print(f"cpu -{(1 - fast['cpu_ms'] / legacy['cpu_ms']):.0%}, peak allocations -{(1 - fast['peak_kb'] / legacy['peak_kb']):.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
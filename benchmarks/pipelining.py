@@ -0,0 +1,78 @@
+"""
+End-to-end latency of the BRD -> requirements -> impact -> code flow, sequential vs pipelined.
+
+    python -m benchmarks.pipelining --ms-per-token 2 --latency-ms 300 --iterations 5
+
+Uses the fake backend, whose streams spread each call's latency over its chunks, so a downstream
+stage can start while the upstream one is still generating. Reports the per-stage latencies too:
+the pipelined flow should save the tail of each upstream stage with the same number of LLM calls.
+"""
+import sys
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+from src.core.llm import MistralLLM
+from src.core.fake_llm import FakeMistralClient
+from src.core.jobs import arun_pipelined
+from src.core.speculation import SPECULATION
+from src.agents.requirement_analysis import RequirementAnalysisAgent
+from src.agents.impact_analysis import ImpactAnalysisAgent
+from src.agents.code_generation import CodeGenerationAgent
+
+BRD = "The system shall support a new Hedge Fund type with performance fees, a 90-day lock-up and monthly NAV."
+
+
+async def sequential(agents, stages: Dict[str, float]) -> None:
+    req_agent, impact_agent, code_agent = agents
+    started = time.perf_counter()
+    requirements = await req_agent.aanalyze(BRD, use_cache=False)
+    stages["requirements"] = time.perf_counter() - started
+    started = time.perf_counter()
+    impact = await impact_agent.aassess(requirements, use_cache=False)
+    stages["impact"] = time.perf_counter() - started
+    started = time.perf_counter()
+    await code_agent.agenerate(impact, use_cache=False)
+    stages["code"] = time.perf_counter() - started
+
+
+async def timed(call, iterations: int) -> float:
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return sum(samples) / len(samples)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare sequential and pipelined end-to-end latency.")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fixed latency per fake LLM call")
+    parser.add_argument("--ms-per-token", type=float, default=2.0, help="Latency per completion token")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    client = FakeMistralClient(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token)
+    llm = MistralLLM(client=client)
+    agents = (RequirementAnalysisAgent(llm), ImpactAnalysisAgent(llm), CodeGenerationAgent(llm))
+
+    stages: Dict[str, float] = {}
+    seq = asyncio.run(timed(lambda: sequential(agents, stages), args.iterations))
+    calls = client.calls
+    pipe = asyncio.run(timed(lambda: arun_pipelined(*agents, BRD, use_cache=False), args.iterations))
+    pipelined_calls = (client.calls - calls) / args.iterations
+
+    print(f"fake LLM: {args.latency_ms:.0f} ms + {args.ms_per_token:g} ms/token, {args.iterations} iterations")
+    for stage, seconds in stages.items():
+        print(f"  {stage:<13} {seconds * 1000:>8.0f} ms")
+    print(f"sequential    {seq * 1000:>8.0f} ms  (3 LLM calls)")
+    print(f"pipelined     {pipe * 1000:>8.0f} ms  ({pipelined_calls:g} LLM calls incl. restarts)")
+    print(f"latency {(pipe / seq - 1):+.0%}; longest stage {max(stages.values()) * 1000:.0f} ms")
+    print("speculative runs:", {f"{s}/{o}": int(SPECULATION.value(stage=s, outcome=o))
+                                for s in ("impact", "code") for o in ("started", "restarted", "kept", "discarded", "failed")
+                                if SPECULATION.value(stage=s, outcome=o)})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Input-token comparison between the original prompt format and the PromptBuilder format.
+
+    python -m benchmarks.prompt_savings [--brd path/to/brd.txt]
+
+The original format embedded the agent's system prompt inside the user prompt, dumped the
+payload with indent=2 (including empty/N/A fields) and sent the schema with indent=2.
+"""
+import os
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel
+from src.core.chunking import estimate_tokens
+from src.core.llm import MistralLLM
+from src.core.models import AnalysisResult, ImpactAssessment, CodeGenerationResponse
+from src.agents.requirement_analysis import RequirementAnalysisAgent
+from src.agents.impact_analysis import ImpactAnalysisAgent
+from src.agents.code_generation import CodeGenerationAgent
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "core", "fixtures")
+
+
+def legacy_messages(system_prompt: str, body: str, instruction: str, response_model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """Reproduces the message layout used before PromptBuilder."""
+    system = f"""
+        You are a helpful AI assistant.
+        Output your response strictly in valid JSON format matching the following schema id:
+        {json.dumps(response_model.model_json_schema(), indent=2)}
+        """
+    user = f"""
+        {system_prompt}
+
+        {body}
+
+        {instruction}
+        """
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare prompt sizes before/after the prompt builder.")
+    parser.add_argument("--brd", type=argparse.FileType("r", encoding="utf-8"), help="BRD text to use for the requirements stage")
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(FIXTURES_DIR, "AnalysisResult.json"), encoding="utf-8") as f:
+        requirements = AnalysisResult.model_validate(json.load(f))
+    with open(os.path.join(FIXTURES_DIR, "ImpactAssessment.json"), encoding="utf-8") as f:
+        impact = ImpactAssessment.model_validate(json.load(f))
+    brd_text = args.brd.read() if args.brd else "\n".join(requirements.functional_requirements)
+
+    llm = MistralLLM(client=object())
+    req_agent, impact_agent, code_agent = RequirementAnalysisAgent(llm), ImpactAnalysisAgent(llm), CodeGenerationAgent(llm)
+
+    stages = [
+        ("requirement_analysis", req_agent, AnalysisResult,
+         f"--- BRD CONTENT START ---\n{brd_text}\n--- BRD CONTENT END ---", "Extract the requirements now.",
+         req_agent._build_prompt(brd_text)),
+        ("impact_analysis", impact_agent, ImpactAssessment,
+         f"--- REQUIREMENTS START ---\n{requirements.model_dump_json(indent=2)}\n--- REQUIREMENTS END ---", "Perform the impact analysis now.",
+         impact_agent._build_prompt(requirements)),
+        ("code_generation", code_agent, CodeGenerationResponse,
+         f"--- IMPACT ASSESSMENT START ---\n{impact.model_dump_json(indent=2)}\n--- IMPACT ASSESSMENT END ---", "Generate the required PL/SQL code, DDLs, and DMLs now.",
+         code_agent._build_prompt(impact)),
+    ]
+
+    print(f"{'stage':<22} {'before':>8} {'after':>8} {'saved':>8}")
+    total_before = total_after = 0
+    for name, agent, model, body, instruction, prompt in stages:
+        before = tokens(legacy_messages(agent.system_prompt, body, instruction, model))
+        after = tokens(llm._structured_messages(prompt, model, agent.system_prompt))
+        total_before += before
+        total_after += after
+        print(f"{name:<22} {before:>8} {after:>8} {(before - after) / before:>7.1%}")
+    print(f"{'total':<22} {total_before:>8} {total_after:>8} {(total_before - total_after) / total_before:>7.1%}")
+    print("(token counts are estimates at ~4 characters/token)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
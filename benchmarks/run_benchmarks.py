@@ -0,0 +1,218 @@
+"""
+End-to-end latency/throughput benchmarks against the fake LLM backend.
+
+    python -m benchmarks.run_benchmarks --iterations 50 --concurrency 16 --latency-ms 0
+
+With --latency-ms 0 the numbers are pure Flexcube Copilot overhead (prompt building, parsing,
+validation, FastAPI serialization). Raise it to see how the app behaves under realistic LLM latency.
+Each run is saved to benchmarks/results/<timestamp>.json and compared with the previous run.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "core", "fixtures")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def summarize(latencies: List[float], wall_seconds: float, errors: int, peak_bytes: int) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_mem_kb": round(peak_bytes / 1024, 1),
+    }
+
+
+async def measure(call: Callable[[], Awaitable[bool]], iterations: int, concurrency: int, memory_iterations: int) -> Dict[str, Any]:
+    """Runs `call` iterations times with at most `concurrency` in flight, then a short traced pass for peak memory."""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await call()
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    await call()  # warm-up (imports, schema generation, connection setup)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    wall = time.perf_counter() - started
+
+    # tracemalloc slows allocation-heavy code down, so memory is measured in a separate pass
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await asyncio.gather(*(call() for _ in range(min(memory_iterations, iterations))))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return summarize(latencies, wall, errors, peak)
+
+
+def load_fixture(name: str) -> Dict[str, Any]:
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def run_suite(args) -> Dict[str, Dict[str, Any]]:
+    # Configure the app before importing it: fake backend, no response cache (we want to measure work, not hits)
+    os.environ["FLEXCUBE_LLM_BACKEND"] = "fake"
+    os.environ["FLEXCUBE_CACHE_DISABLED"] = "1"
+    os.environ["FLEXCUBE_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FLEXCUBE_FAKE_PAYLOAD_SCALE"] = str(args.payload_scale)
+    os.environ.setdefault("FLEXCUBE_JOBS_DIR", os.path.join(RESULTS_DIR, ".jobs"))
+
+    import httpx
+    from src.web import app as web
+    from src.core.models import AnalysisResult, ImpactAssessment
+
+    brd_text = args.brd.read() if args.brd else "\n".join(load_fixture("AnalysisResult")["functional_requirements"])
+    requirements = load_fixture("AnalysisResult")
+    impact = load_fixture("ImpactAssessment")
+    # ASGITransport does not send lifespan events; enter the lifespan so services are built once, as when served
+    lifespan = web.app.router.lifespan_context(web.app)
+    await lifespan.__aenter__()
+    req_agent, impact_agent, code_agent = web.app.state.services.agents()
+
+    def agent_call(fn):
+        async def call():
+            await fn()
+            return True
+        return call
+
+    scenarios: Dict[str, Callable[[], Awaitable[bool]]] = {
+        "agent.aanalyze": agent_call(lambda: req_agent.aanalyze(brd_text)),
+        "agent.aassess": agent_call(lambda: impact_agent.aassess(AnalysisResult.model_validate(requirements))),
+        "agent.agenerate": agent_call(lambda: code_agent.agenerate(ImpactAssessment.model_validate(impact))),
+    }
+
+    transport = httpx.ASGITransport(app=web.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+    counter = itertools.count()
+
+    def post(path: str, make_payload: Callable[[int], Dict[str, Any]], stream: bool = False):
+        # Every request gets a distinct body: identical concurrent bodies would be coalesced into one
+        # LLM call by the admission gate, and the concurrent scenarios would measure that instead of throughput
+        async def call():
+            payload = make_payload(next(counter))
+            if stream:
+                async with client.stream("POST", path, json=payload) as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+                    return response.status_code == 200
+            response = await client.post(path, json=payload)
+            return response.status_code == 200
+        return call
+
+    def with_note(payload: Dict[str, Any], field: str, n: int) -> Dict[str, Any]:
+        return {**payload, field: f"{payload[field]} (run {n})"}
+
+    def impact_payload(n: int) -> Dict[str, Any]:
+        return {**impact, "effort_estimation": with_note(impact["effort_estimation"], "justification", n)}
+
+    endpoints = {
+        "POST /api/analyze/requirements": post("/api/analyze/requirements", lambda n: {"text": f"{brd_text}\nReference: BENCH-{n}"}),
+        "POST /api/analyze/impact": post("/api/analyze/impact", lambda n: with_note(requirements, "business_objective", n)),
+        "POST /api/generate/code": post("/api/generate/code", impact_payload),
+        "POST /api/generate/code/stream": post("/api/generate/code/stream", impact_payload, stream=True),
+    }
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for name, call in scenarios.items():
+            results[name] = await measure(call, args.iterations, 1, args.memory_iterations)
+        for name, call in endpoints.items():
+            results[f"{name} [c=1]"] = await measure(call, args.iterations, 1, args.memory_iterations)
+            results[f"{name} [c={args.concurrency}]"] = await measure(call, args.iterations, args.concurrency, args.memory_iterations)
+    finally:
+        await client.aclose()
+        await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def latest_result_file(exclude: Optional[str] = None) -> Optional[str]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith(".json") and f != exclude)
+    return os.path.join(RESULTS_DIR, files[-1]) if files else None
+
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KB':>9} {'err':>4}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = f"{name:<44} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['rps']:>9.1f} {r['peak_mem_kb']:>9.1f} {r['errors']:>4}"
+        base = (baseline or {}).get(name)
+        if base and base.get("p50_ms"):
+            delta = (r["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100
+            line += f"   p50 {delta:+.1f}% vs baseline"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark agents and API endpoints against the fake LLM backend.")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--memory-iterations", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Synthetic LLM latency per call")
+    parser.add_argument("--payload-scale", type=int, default=1, help="Multiply fixture list sizes (bigger LLM outputs)")
+    parser.add_argument("--brd", type=argparse.FileType("r", encoding="utf-8"), help="BRD text file to submit")
+    parser.add_argument("--baseline", help="Result file to compare against (default: previous run)")
+    parser.add_argument("--no-save", action="store_true", help="Do not write the results file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_suite(args))
+
+    baseline_path = args.baseline or latest_result_file()
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"Baseline: {baseline_path}")
+    print_report(results, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(RESULTS_DIR, f"{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "timestamp": stamp,
+                "python": platform.python_version(),
+                "config": {k: v for k, v in vars(args).items() if k not in ("brd", "baseline", "no_save")},
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
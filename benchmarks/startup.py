@@ -0,0 +1,136 @@
+"""
+Cold-start cost of a web worker, against the fake LLM backend.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --max-import-ms 800 --max-first-response-ms 2500 --max-rss-mb 200
+
+import:          `import src.web.app` in a fresh interpreter
+ready:           process spawn -> GET /healthz returns 200 (uvicorn, lifespan done)
+first response:  process spawn -> first successful POST /api/analyze/requirements
+rss:             resident memory of the worker right after its first response (Linux /proc)
+Medians over --runs fresh processes. Any --max-* budget that is exceeded makes the exit code 1,
+so the numbers can be tracked (and bounded) in CI.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "FLEXCUBE_LLM_BACKEND": "fake",
+        "FLEXCUBE_CACHE_DISABLED": "1",
+        "FLEXCUBE_LOG_LEVEL": "WARNING",
+        "FLEXCUBE_JOBS_DIR": os.path.join(ROOT, "benchmarks", "results", ".jobs"),
+    })
+    return env
+
+
+def measure_import() -> float:
+    code = "import time; t = time.perf_counter(); import src.web.app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=worker_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, payload: Optional[dict] = None) -> int:
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            response.read()
+            return response.status
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return 0
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def measure_boot(timeout: float = 60.0) -> Dict[str, Optional[float]]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.web.app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=worker_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready = first = None
+        while time.perf_counter() - started < timeout:
+            if ready is None:
+                if request(f"{base}/healthz") == 200:
+                    ready = time.perf_counter() - started
+                else:
+                    time.sleep(0.005)
+                    continue
+            if request(f"{base}/api/analyze/requirements", {"text": "The system shall support a new Hedge Fund type."}) == 200:
+                first = time.perf_counter() - started
+                break
+        if first is None:
+            raise RuntimeError(f"Worker did not answer within {timeout:.0f}s")
+        return {"ready": ready, "first_response": first, "rss_mb": rss_mb(proc.pid)}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure web worker cold-start cost.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-response-ms", type=float)
+    parser.add_argument("--max-rss-mb", type=float)
+    args = parser.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    boots = [measure_boot() for _ in range(args.runs)]
+    rss = [b["rss_mb"] for b in boots if b["rss_mb"] is not None]
+    results = {
+        "import_ms": statistics.median(imports) * 1000,
+        "ready_ms": statistics.median(b["ready"] for b in boots) * 1000,
+        "first_response_ms": statistics.median(b["first_response"] for b in boots) * 1000,
+        "rss_mb": statistics.median(rss) if rss else None,
+    }
+
+    print(f"median of {args.runs} fresh processes")
+    print(f"  import src.web.app   {results['import_ms']:>8.0f} ms")
+    print(f"  ready (/healthz)     {results['ready_ms']:>8.0f} ms")
+    print(f"  first response       {results['first_response_ms']:>8.0f} ms")
+    print(f"  rss after boot       {results['rss_mb']:>8.1f} MB" if results["rss_mb"] is not None else "  rss after boot            n/a")
+
+    budgets = {"import_ms": args.max_import_ms, "first_response_ms": args.max_first_response_ms, "rss_mb": args.max_rss_mb}
+    over = [f"{name} {results[name]:.0f} > {limit:g}" for name, limit in budgets.items()
+            if limit is not None and results[name] is not None and results[name] > limit]
+    for line in over:
+        print(f"OVER BUDGET: {line}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,17 +3,15 @@ import json
 import os
 
 try:
-    with open("debug_brd.txt", "r", encoding="utf-8") as f:
-        brd_text = f.read()
+    path = "debug_brd.txt"
+    print(f"Uploading BRD of size: {os.path.getsize(path)}")
 
-    print(f"Sending BRD of size: {len(brd_text)}")
-    
-    url = "http://127.0.0.1:8000/api/analyze/requirements"
-    headers = {"Content-Type": "application/json"}
-    payload = {"text": brd_text}
+    url = "http://127.0.0.1:8000/api/analyze/requirements/upload"
 
     print("POST ...")
-    response = requests.post(url, json=payload)
+    # Multipart upload streams the file from disk instead of embedding it in a JSON string
+    with open(path, "rb") as f:
+        response = requests.post(url, files={"file": (os.path.basename(path), f, "text/plain")})
     
     print(f"Status: {response.status_code}")
     print(f"Response: {response.text[:500]}") # Print first 500 chars
@@ -1,34 +1,296 @@
+import os
+import re
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple, Union
 from src.core.llm import MistralLLM
+from src.core.metrics import instrumented_stage, logger
 from src.core.models import ImpactAssessment, CodeGenerationResponse, GeneratedFile
+from src.core.prompts import PromptBuilder, clean_text
+from src.core.streaming import JsonStreamParser
+
+# Assessment fields sent to code generation; ImpactAssessment streams them first. Effort, risk and
+# mitigations do not change what gets generated and are left out
+IMPACT_FIELDS = ("affected_components", "schema_changes", "code_changes")
+
+# Dropped when the assessment does not fit the budget; components and schema changes are kept
+IMPACT_TRIM_ORDER = ("code_changes",)
+
+PARTITION_MODES = ("component", "component_type")
 
 class CodeGenerationAgent:
-    def __init__(self, llm: MistralLLM):
+    system_prompt = clean_text("""
+    You are an Expert Oracle PL/SQL Developer specialized in Oracle Flexcube Investor Services (FCIS).
+    Your task is to generate production-ready code based on the Technical Impact Assessment provided.
+    
+    Guidelines:
+    1. **Naming Conventions**: Follow strict Oracle naming conventions (e.g., packages ending in _PKG, tables in _MASTER/_EXT).
+    2. **Modularity**: Create separate files for Tables (DDL), Packages (SPC/SQL), and Data (DML).
+    3. **Safety**: Always include `CREATE OR REPLACE` for logic and `CREATE TABLE IF NOT EXISTS` patterns (or standard exception handling) for DDL.
+    4. **Comments**: Add detailed comments explaining the business logic.
+    5. **Error Handling**: Implement standard FCIS exception handling.
+    
+    Input: Impact Assessment JSON.
+    Output: A list of files with their content.
+    """)
+    input_fields = IMPACT_FIELDS
+
+    def __init__(self, llm: MistralLLM, budget_tokens: int = None, partition_by: str = "component",
+                 fanout_threshold: int = 8, max_workers: int = 4, partition_retries: int = 1):
+        if partition_by not in PARTITION_MODES:
+            raise ValueError(f"partition_by must be one of {PARTITION_MODES}")
         self.llm = llm
-        self.system_prompt = """
-        You are an Expert Oracle PL/SQL Developer specialized in Oracle Flexcube Investor Services (FCIS).
-        Your task is to generate production-ready code based on the Technical Impact Assessment provided.
-        
-        Guidelines:
-        1. **Naming Conventions**: Follow strict Oracle naming conventions (e.g., packages ending in _PKG, tables in _MASTER/_EXT).
-        2. **Modularity**: Create separate files for Tables (DDL), Packages (SPC/SQL), and Data (DML).
-        3. **Safety**: Always include `CREATE OR REPLACE` for logic and `CREATE TABLE IF NOT EXISTS` patterns (or standard exception handling) for DDL.
-        4. **Comments**: Add detailed comments explaining the business logic.
-        5. **Error Handling**: Implement standard FCIS exception handling.
-        
-        Input: Impact Assessment JSON.
-        Output: A list of files with their content.
-        """
+        self.budget_tokens = budget_tokens
+        self.partition_by = partition_by
+        self.fanout_threshold = fanout_threshold
+        self.max_workers = max_workers
+        self.partition_retries = partition_retries
 
-    def generate(self, impact: ImpactAssessment) -> CodeGenerationResponse:
-        prompt = f"""
-        {self.system_prompt}
-        
-        --- IMPACT ASSESSMENT START ---
-        {impact.model_dump_json(indent=2)}
-        --- IMPACT ASSESSMENT END ---
-        
-        Generate the required PL/SQL code, DDLs, and DMLs now.
+    def _build_prompt(self, impact: ImpactAssessment, other_components: Sequence[str] = (), record: bool = True) -> str:
+        builder = PromptBuilder("code_generation", self.budget_tokens)
+        builder.add_payload("impact_assessment", impact.model_dump(include=set(IMPACT_FIELDS), exclude_none=True),
+                            trim_order=IMPACT_TRIM_ORDER)
+        if other_components:
+            builder.add(
+                "This is one part of a larger change. Generate code ONLY for the affected_components above. "
+                f"These components are generated separately; reference them where needed but do not generate them: {', '.join(other_components)}"
+            )
+        builder.add("Generate the required PL/SQL code, DDLs, and DMLs now.")
+        return builder.build(record)
+
+    def _should_fan_out(self, impact: ImpactAssessment, fanout: Optional[bool]) -> bool:
+        if fanout is not None:
+            return fanout and len(impact.affected_components) > 1
+        return len(impact.affected_components) > self.fanout_threshold
+
+    def _partition_prompts(self, impact: ImpactAssessment, record: bool = True) -> List[Tuple[str, str]]:
+        names = [c.component_name for c in impact.affected_components]
+        prompts = []
+        for label, part in partition_impact(impact, self.partition_by):
+            own = {c.component_name for c in part.affected_components}
+            prompts.append((label, self._build_prompt(part, [n for n in names if n not in own], record)))
+        return prompts
+
+    def prompt_key(self, impact: ImpactAssessment, fanout: Optional[bool] = None) -> str:
+        """Everything generate() sends the LLM for this assessment; equal keys mean interchangeable results."""
+        if self._should_fan_out(impact, fanout):
+            return "\x1e".join(prompt for _, prompt in self._partition_prompts(impact, record=False))
+        return self._build_prompt(impact, record=False)
+
+    @instrumented_stage("code_generation")
+    def generate(self, impact: ImpactAssessment, use_cache: bool = True, fanout: Optional[bool] = None) -> CodeGenerationResponse:
+        """
+        Assessments with more than fanout_threshold components are split per component
+        (or per component_type) and generated concurrently, then merged.
+        Pass fanout=True/False to force either mode.
         """
-        
+        if self._should_fan_out(impact, fanout):
+            return self._generate_fanout(impact, use_cache)
+
+        prompt = self._build_prompt(impact)
         # We use strict JSON generation for the file list
-        return self.llm.generate_structured(prompt, CodeGenerationResponse)
+        return self.llm.generate_structured(prompt, CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt)
+
+    @instrumented_stage("code_generation")
+    async def agenerate(self, impact: ImpactAssessment, use_cache: bool = True, fanout: Optional[bool] = None) -> CodeGenerationResponse:
+        if self._should_fan_out(impact, fanout):
+            return await self._agenerate_fanout(impact, use_cache)
+
+        prompt = self._build_prompt(impact)
+        return await self.llm.agenerate_structured(prompt, CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt)
+
+    @instrumented_stage("code_generation")
+    async def astream(self, impact: ImpactAssessment, use_cache: bool = True,
+                      fanout: Optional[bool] = None) -> AsyncIterator[Tuple[str, Union[GeneratedFile, str]]]:
+        """
+        Yields ("file", GeneratedFile) as soon as each file object closes in the LLM stream,
+        then ("summary", str) once the summary field is complete.
+        Raises ValueError if the stream ends before the JSON object is closed.
+        In fan-out mode files are yielded per partition, in completion order.
+        """
+        if self._should_fan_out(impact, fanout):
+            async for item in self._astream_fanout(impact, use_cache):
+                yield item
+            return
+
+        prompt = self._build_prompt(impact)
+        parser = JsonStreamParser(lambda path: (len(path) == 2 and path[0] == "files") or path == ("summary",))
+        async for chunk in self.llm.astream_structured(prompt, CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt):
+            for path, value in parser.feed(chunk):
+                if path[0] == "files":
+                    yield "file", GeneratedFile.model_validate(value)
+                else:
+                    yield "summary", value
+        # A stream cut off midway has yielded only some of the files; that is a failure, not a short answer
+        if not parser.done:
+            raise ValueError("Code generation stream ended before the JSON response was complete")
+
+    def _generate_fanout(self, impact: ImpactAssessment, use_cache: bool) -> CodeGenerationResponse:
+        prompts = self._partition_prompts(impact)
+        results: Dict[str, CodeGenerationResponse] = {}
+        pending = prompts
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(prompts))) as pool:
+            for attempt in range(self.partition_retries + 1):
+                futures = [
+                    # A copy of the caller's context per call keeps the trace (and admission lane) in the workers
+                    (label, pool.submit(contextvars.copy_context().run, self.llm.generate_structured, prompt,
+                                        CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt))
+                    for label, prompt in pending
+                ]
+                errors = {}
+                for label, future in futures:
+                    try:
+                        results[label] = future.result()
+                    except Exception as e:
+                        errors[label] = e
+                pending = self._pending_after(pending, errors, attempt)
+                if not pending:
+                    break
+        return merge_generation_results([(label, results[label]) for label, _ in prompts])
+
+    async def _agenerate_fanout(self, impact: ImpactAssessment, use_cache: bool) -> CodeGenerationResponse:
+        prompts = self._partition_prompts(impact)
+        semaphore = asyncio.Semaphore(self.max_workers)
+        results: Dict[str, CodeGenerationResponse] = {}
+
+        async def run(prompt: str) -> CodeGenerationResponse:
+            async with semaphore:
+                return await self.llm.agenerate_structured(prompt, CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt)
+
+        pending = prompts
+        for attempt in range(self.partition_retries + 1):
+            outcomes = await asyncio.gather(*(run(prompt) for _, prompt in pending), return_exceptions=True)
+            errors = {}
+            for (label, _), outcome in zip(pending, outcomes):
+                if isinstance(outcome, BaseException):
+                    errors[label] = outcome
+                else:
+                    results[label] = outcome
+            pending = self._pending_after(pending, errors, attempt)
+            if not pending:
+                break
+        return merge_generation_results([(label, results[label]) for label, _ in prompts])
+
+    async def _astream_fanout(self, impact: ImpactAssessment, use_cache: bool) -> AsyncIterator[Tuple[str, Union[GeneratedFile, str]]]:
+        prompts = self._partition_prompts(impact)
+        semaphore = asyncio.Semaphore(self.max_workers)
+        order = [label for label, _ in prompts]
+        results: Dict[str, CodeGenerationResponse] = {}
+        taken: Set[str] = set()
+        seen: Set[Tuple[str, str]] = set()
+
+        async def run(label: str, prompt: str) -> Tuple[str, CodeGenerationResponse]:
+            async with semaphore:
+                for attempt in range(self.partition_retries + 1):
+                    try:
+                        return label, await self.llm.agenerate_structured(prompt, CodeGenerationResponse, use_cache=use_cache, system_prompt=self.system_prompt)
+                    except Exception as e:
+                        self._pending_after([(label, prompt)], {label: e}, attempt)
+
+        tasks = [asyncio.ensure_future(run(label, prompt)) for label, prompt in prompts]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                label, result = await next_done
+                results[label] = result
+                for file in result.files:
+                    file = _dedupe_file(file, taken, seen)
+                    if file is not None:
+                        yield "file", file
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield "summary", _merge_summaries([(label, results[label]) for label in order])
+
+    def _pending_after(self, pending: List[Tuple[str, str]], errors: Dict[str, BaseException], attempt: int) -> List[Tuple[str, str]]:
+        """Partitions to retry; raises once a partition has used up its retries."""
+        if not errors:
+            return []
+        if attempt >= self.partition_retries:
+            failed = ", ".join(errors)
+            raise RuntimeError(f"Code generation failed for partition(s): {failed}") from next(iter(errors.values()))
+        for label, error in errors.items():
+            logger.warning("code generation partition %s failed (%s); retrying", label, error)
+        return [(label, prompt) for label, prompt in pending if label in errors]
+
+
+def _owner(text: str, patterns: Sequence[Tuple[str, re.Pattern]]) -> Optional[str]:
+    """The longest component name that occurs in text as a whole identifier (STTM_FUND does not match STTM_FUND_EXT)."""
+    upper = text.upper()
+    matches = [name for name, pattern in patterns if pattern.search(upper)]
+    return max(matches, key=len) if matches else None
+
+
+def partition_impact(impact: ImpactAssessment, partition_by: str = "component") -> List[Tuple[str, ImpactAssessment]]:
+    """
+    Splits an assessment into (label, sub-assessment) pairs, one per component or per component_type.
+    Each part keeps the shared context (effort, risk, mitigations). Every schema/code change goes to
+    exactly one part: the one holding the longest component name it mentions as a whole identifier;
+    changes that mention no component go to the first part.
+    """
+    groups: Dict[str, List] = {}
+    for component in impact.affected_components:
+        key = component.component_name if partition_by == "component" else component.component_type
+        groups.setdefault(key, []).append(component)
+
+    group_of = {c.component_name: key for key, components in groups.items() for c in components}
+    patterns = [
+        (name, re.compile(rf"(?<![A-Z0-9_$#]){re.escape(name.upper())}(?![A-Z0-9_$#])"))
+        for name in group_of
+    ]
+    first = next(iter(groups), None)
+
+    def assign(changes: List[str]) -> Dict[str, List[str]]:
+        assigned: Dict[str, List[str]] = {}
+        for change in changes:
+            owner = _owner(change, patterns)
+            assigned.setdefault(group_of[owner] if owner else first, []).append(change)
+        return assigned
+
+    schema = assign(impact.schema_changes)
+    code = assign(impact.code_changes)
+    return [
+        (label, impact.model_copy(update={
+            "affected_components": components,
+            "schema_changes": schema.get(label, []),
+            "code_changes": code.get(label, []),
+        }))
+        for label, components in groups.items()
+    ]
+
+
+def _dedupe_file(file: GeneratedFile, taken: Set[str], seen: Set[Tuple[str, str]]) -> Optional[GeneratedFile]:
+    """Drops exact duplicates; renames a file whose name is already used by different content."""
+    if (file.file_name, file.file_content) in seen:
+        return None
+    seen.add((file.file_name, file.file_content))
+    name = file.file_name
+    if name.lower() in taken:
+        stem, ext = os.path.splitext(file.file_name)
+        n = 2
+        while f"{stem}_{n}{ext}".lower() in taken:
+            n += 1
+        name = f"{stem}_{n}{ext}"
+        file = file.model_copy(update={"file_name": name})
+    taken.add(name.lower())
+    return file
+
+
+def _merge_summaries(results: List[Tuple[str, CodeGenerationResponse]]) -> str:
+    return "\n".join(f"{label}: {r.summary}" for label, r in results if r.summary)
+
+
+def merge_generation_results(results: List[Tuple[str, CodeGenerationResponse]]) -> CodeGenerationResponse:
+    """
+    Merges per-partition responses in partition order. Identical files (same name and content)
+    are kept once; name collisions with different content get a numeric suffix (pkg.sql -> pkg_2.sql).
+    """
+    taken: Set[str] = set()
+    seen: Set[Tuple[str, str]] = set()
+    files = []
+    for _, result in results:
+        for file in result.files:
+            file = _dedupe_file(file, taken, seen)
+            if file is not None:
+                files.append(file)
+    return CodeGenerationResponse(files=files, summary=_merge_summaries(results))
@@ -1,69 +1,214 @@
-from src.core.models import AnalysisResult, ImpactAssessment, AffectedComponent, EffortEstimation
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from src.core.models import AnalysisResult, ImpactAssessment, EffortEstimation, FieldChange
 from src.core.llm import MistralLLM
+from src.core.catalog import ComponentCatalog
+from src.core.metrics import REGISTRY, instrumented_stage, logger
+from src.core.prompts import PromptBuilder, clean_text, encode_payload
+from src.core.streaming import astream_fields
+
+# Requirement fields sent to impact analysis; AnalysisResult streams them first. Client type, historical issues,
+# risk tolerance and the conversation response say nothing about which components change and are left out
+IMPACT_REQUIREMENT_FIELDS = (
+    "business_objective",
+    "regulatory_constraints",
+    "functional_requirements",
+    "non_functional_requirements",
+    "business_rules",
+    "data_requirements",
+    "interface_requirements",
+    "ui_ux_requirements",
+    "reporting_requirements",
+    "audit_and_logging",
+)
+
+# Least useful fields for impact analysis first; dropped in this order when over budget
+REQUIREMENT_TRIM_ORDER = (
+    "reporting_requirements",
+    "ui_ux_requirements",
+    "audit_and_logging",
+    "non_functional_requirements",
+)
+
+# Requirement fields that describe what the change touches; used as the catalog query
+CATALOG_QUERY_FIELDS = (
+    "business_objective",
+    "functional_requirements",
+    "business_rules",
+    "data_requirements",
+    "interface_requirements",
+    "ui_ux_requirements",
+    "reporting_requirements",
+)
+
+UNVERIFIED_COMPONENTS = REGISTRY.counter(
+    "flexcube_impact_unverified_components_total", "Existing components named by the model but missing from the catalog", ("component_type",)
+)
 
 class ImpactAnalysisAgent:
-    def __init__(self, llm: MistralLLM):
+    system_prompt = clean_text("""
+    You are a Senior Oracle Flexcube Solutions Architect.
+    Your input is a structured AnalysisResult containing functional requirements.
+    Your goal is to perform a technical Impact Analysis.
+    
+    Strict Guidelines:
+    1. Map every functional requirement to specific FCIS components (Tables, Packages, Screens).
+    2. Prefer 'Extension' tables over modifying Core tables.
+    3. Identify any new Packages or APIs needed.
+    4. Estimate complexity based on the number of touchpoints.
+    5. Flag High Risk if Core kernels are touched.
+
+    Output strictly in valid JSON matching the ImpactAssessment schema.
+    """)
+    input_fields = IMPACT_REQUIREMENT_FIELDS
+
+    def __init__(self, llm: MistralLLM, budget_tokens: int = None, catalog: Optional[ComponentCatalog] = None, top_k: int = 25):
         self.llm = llm
-        self.system_prompt = """
-        You are a Senior Oracle Flexcube Solutions Architect.
-        Your input is a structured AnalysisResult containing functional requirements.
-        Your goal is to perform a technical Impact Analysis.
-        
-        Strict Guidelines:
-        1. Map every functional requirement to specific FCIS components (Tables, Packages, Screens).
-        2. Prefer 'Extension' tables over modifying Core tables.
-        3. Identify any new Packages or APIs needed.
-        4. Estimate complexity based on the number of touchpoints.
-        5. Flag High Risk if Core kernels are touched.
-
-        Output strictly in valid JSON matching the ImpactAssessment schema.
+        self.budget_tokens = budget_tokens
+        self.catalog = catalog
+        self.top_k = top_k
+
+    def _build_prompt(self, requirements: AnalysisResult, record: bool = True) -> str:
+        builder = PromptBuilder("impact_analysis", self.budget_tokens)
+        builder.add_payload("requirements", requirements.model_dump(include=set(IMPACT_REQUIREMENT_FIELDS), exclude_none=True),
+                            trim_order=REQUIREMENT_TRIM_ORDER)
+        parts = []
+        for name in CATALOG_QUERY_FIELDS:
+            value = getattr(requirements, name)
+            parts.extend(value if isinstance(value, list) else [value])
+        catalog_block = self._catalog_block(" ".join(parts))
+        if catalog_block:
+            builder.add(catalog_block)
+        builder.add("Perform the impact analysis now.")
+        return builder.build(record)
+
+    def prompt_key(self, requirements: AnalysisResult) -> str:
+        """Everything assess() sends the LLM for these requirements; equal keys mean interchangeable results."""
+        return self._build_prompt(requirements, record=False)
+
+    def _catalog_block(self, query: str) -> Optional[str]:
+        if self.catalog is None:
+            return None
+        candidates = self._catalog_candidates(query)
+        if not candidates:
+            return None
+        return (
+            "Existing FCIS components relevant to these requirements (name|type|description). "
+            "Components with nature_of_change Modify or Deprecate MUST be taken from this list; "
+            "anything else is New and must follow FCIS naming conventions.\n"
+            f"<fcis_components>\n{candidates}\n</fcis_components>"
+        )
+
+    def _catalog_candidates(self, query: str) -> str:
+        hits = self.catalog.search(query, self.top_k)
+        return "\n".join(f"{e.name}|{e.component_type}|{e.description}".rstrip("|") for e, _ in hits)
+
+    def _build_delta_prompt(self, previous: ImpactAssessment, changes: Dict[str, FieldChange]) -> str:
+        builder = PromptBuilder("impact_analysis", self.budget_tokens)
+        builder.add(
+            "The requirements behind the previous impact assessment were revised. Update the assessment for the "
+            "requirement changes below only: add or adjust components, schema/code changes, effort and risk they "
+            "introduce, and drop entries that only existed for removed requirements. Keep everything else unchanged.\n"
+            f"<previous_assessment>\n{encode_payload(previous.model_dump(exclude={'unverified_components'}))}\n</previous_assessment>"
+        )
+        builder.add_payload("requirement_changes", {name: change.model_dump(exclude_none=True) for name, change in changes.items()})
+        parts = []
+        for name, change in changes.items():
+            if name in CATALOG_QUERY_FIELDS:
+                parts.extend(change.added + ([change.new] if change.new else []))
+        catalog_block = self._catalog_block(" ".join(parts)) if parts else None
+        if catalog_block:
+            builder.add(catalog_block)
+        builder.add("Return the complete updated impact assessment now.")
+        return builder.build()
+
+    def _verify(self, assessment: ImpactAssessment) -> ImpactAssessment:
+        """Flags existing (non-New) components that are not in the catalog."""
+        if self.catalog is None:
+            return assessment
+        unknown = [
+            c for c in assessment.affected_components
+            if not c.nature_of_change.strip().lower().startswith("new") and c.component_name not in self.catalog
+        ]
+        for component in unknown:
+            UNVERIFIED_COMPONENTS.inc(component_type=component.component_type)
+        if unknown:
+            logger.warning("Impact analysis named components missing from the catalog: %s", [c.component_name for c in unknown])
+        assessment.unverified_components = [c.component_name for c in unknown]
+        return assessment
+
+    @instrumented_stage("impact_analysis")
+    def assess(self, requirements: AnalysisResult, use_cache: bool = True) -> ImpactAssessment:
+        prompt = self._build_prompt(requirements)
+        assessment = self.llm.generate_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)
+        return self._verify(assessment)
+
+    @instrumented_stage("impact_analysis")
+    async def aassess(self, requirements: AnalysisResult, use_cache: bool = True) -> ImpactAssessment:
+        prompt = self._build_prompt(requirements)
+        assessment = await self.llm.agenerate_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)
+        return self._verify(assessment)
+
+    @instrumented_stage("impact_analysis")
+    async def astream(self, requirements: AnalysisResult, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
         """
+        Yields ("field", (name, value)) as each top-level ImpactAssessment field closes in the LLM stream,
+        then ("result", ImpactAssessment) after catalog verification.
+        If the stream does not validate, the result comes from a regular (repairing) call instead.
+        """
+        prompt = self._build_prompt(requirements)
+        fields = {}
+        try:
+            async for name, value in astream_fields(self.llm.astream_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)):
+                fields[name] = value
+                yield "field", (name, value)
+            assessment = ImpactAssessment.model_validate(fields)
+        except ValueError as e:
+            logger.warning("Streamed impact analysis is invalid (%s); retrying without streaming", e)
+            assessment = await self.llm.agenerate_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)
+        yield "result", self._verify(assessment)
 
-    def assess(self, requirements: AnalysisResult) -> ImpactAssessment:
-        prompt = f"""
-        {self.system_prompt}
-        
-        --- REQUIREMENTS START ---
-        {requirements.model_dump_json(indent=2)}
-        --- REQUIREMENTS END ---
-        
-        Perform the impact analysis now.
+    @instrumented_stage("impact_analysis")
+    def reassess(self, previous: ImpactAssessment, changes: Dict[str, FieldChange], use_cache: bool = True) -> ImpactAssessment:
+        """
+        Updates a previous assessment for a requirements delta (RevisionAnalysis.changed_fields)
+        instead of re-assessing the whole BRD. No changes to IMPACT_REQUIREMENT_FIELDS means no LLM call.
         """
-        
-        return self.llm.generate_structured(prompt, ImpactAssessment)
+        changes = {name: change for name, change in changes.items() if name in IMPACT_REQUIREMENT_FIELDS}
+        if not changes:
+            return previous
+        prompt = self._build_delta_prompt(previous, changes)
+        assessment = self.llm.generate_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)
+        return self._verify(assessment)
+
+    @instrumented_stage("impact_analysis")
+    async def areassess(self, previous: ImpactAssessment, changes: Dict[str, FieldChange], use_cache: bool = True) -> ImpactAssessment:
+        changes = {name: change for name, change in changes.items() if name in IMPACT_REQUIREMENT_FIELDS}
+        if not changes:
+            return previous
+        prompt = self._build_delta_prompt(previous, changes)
+        assessment = await self.llm.agenerate_structured(prompt, ImpactAssessment, use_cache=use_cache, system_prompt=self.system_prompt)
+        return self._verify(assessment)
 
 if __name__ == "__main__":
     import os
     import sys
     import json
     import argparse
-    from src.core.models import FunctionalRequirement
 
     # Argument parser to accept AnalysisResult JSON file
     parser = argparse.ArgumentParser(description="Run Impact Analysis on Requirements JSON.")
     parser.add_argument("file_path", nargs="?", help="Path to the AnalysisResult JSON file")
     args = parser.parse_args()
 
-    # Mock/Real LLM setup
+    # Fake/Real LLM setup
     if not os.environ.get("MISTRAL_API_KEY"):
-        print("WARNING: MISTRAL_API_KEY not set. Using mock response.")
-        class MockLLM:
-            def generate_structured(self, prompt, model):
-                return ImpactAssessment(
-                    affected_components=[
-                        AffectedComponent(component_name="STDT_PF_FUND_MASTER", component_type="Table", nature_of_change="Modify")
-                    ],
-                    schema_changes=["ALTER TABLE STDT_PF_FUND_MASTER ADD VINTAGE_YEAR DATE"],
-                    code_changes=["FCIS_PF_PKG.body"],
-                    effort_estimation=EffortEstimation(complexity="Medium", person_days=10, justification="Table change + Logic"),
-                    overall_risk="Medium",
-                    mitigation_strategies=["Backup before DDL"]
-                )
-        llm = MockLLM()
+        print("WARNING: MISTRAL_API_KEY not set. Using fake backend fixtures.", file=sys.stderr)
+        from src.core.fake_llm import FakeMistralClient
+        llm = MistralLLM(client=FakeMistralClient())
     else:
         llm = MistralLLM()
 
-    agent = ImpactAnalysisAgent(llm)
+    agent = ImpactAnalysisAgent(llm, catalog=ComponentCatalog.from_env())
 
     # Load requirements
     if args.file_path:
@@ -90,22 +235,11 @@ if __name__ == "__main__":
             print("No input file or stdin provided. Using dummy data...", file=sys.stderr)
             # create valid dummy data conforming to the 13-point schema
             requirements = AnalysisResult(
-            business_objective="Dummy Objective",
-            client_type="Dummy Client",
-            regulatory_constraints=[],
-            in_scope=[],
-            out_of_scope=[],
-            functional_rules=[
-                 FunctionalRequirement(id="FR-DUMMY", description="Dummy Req", acceptance_criteria=["AC1"], priority="Low")
-            ],
-            data_entities=[],
-            known_fcis_touchpoints=[],
-            customization_constraints=[],
-            performance_sla="N/A",
-            audit_and_logging=[],
-            historical_issues=[],
-            risk_tolerance="Low"
-        )
+                business_objective="Dummy Objective",
+                client_type="Dummy Client",
+                functional_requirements=["Dummy Req"],
+                risk_tolerance="Low"
+            )
 
     # Run assessment
     if requirements.conversation_response:
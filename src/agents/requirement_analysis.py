@@ -1,50 +1,361 @@
+import asyncio
+import hashlib
+import contextvars
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from src.core.llm import MistralLLM
-from src.core.models import AnalysisResult, FunctionalRequirement, TechnicalImplication
+from src.core.metrics import REGISTRY, instrumented_stage, logger
+from src.core.chunking import chunk_text, estimate_tokens, split_sections
+from src.core.prompts import PromptBuilder, clean_text, compact_schema
+from src.core.models import AnalysisResult, FieldChange, RevisionAnalysis
+from src.core.routing import CONVERSATIONAL, InputRouter
+from src.core.revisions import RevisionStore, block_key, fingerprint, group_sections
+from src.core.streaming import astream_fields
+
+REVISION_BLOCKS = REGISTRY.counter("flexcube_revision_blocks_total", "Revision analysis blocks by outcome", ("outcome",))
 
 class RequirementAnalysisAgent:
-    def __init__(self, llm: MistralLLM):
+    system_prompt = clean_text("""
+    You are an expert Requirement Analysis Agent specialized in Oracle Flexcube Investor Services (FCIS).
+    Your goal is to analyze Business Requirement Documents (BRD) and Change Requests (CR) to extract structured requirements.
+    However, if the user input is a GENERAL QUESTION or GREETING (e.g., "What is AI?", "Hello"), do NOT extract requirements. Instead, provide a helpful answer in the 'conversation_response' field and leave other fields empty.
+    
+    Constraints:
+    - Do NOT propose schema or code changes.
+    - Do NOT guess Flexcube behavior.
+    - Be conservative and precise.
+    
+    IF BRD/CR, extract into the following 13 specific categories:
+    1. Business Objective
+    2. Client Type
+    3. Regulatory Constraints
+    4. In-Scope
+    5. Out-of-Scope
+    6. Functional Rules (as structured items)
+    7. Data Entities
+    8. Known FCIS Touchpoints
+    9. Customization Constraints
+    10. Performance SLA
+    11. Audit & Logging
+    12. Historical Issues
+    13. Risk Tolerance
+
+    Analyze the provided BRD text and output the result in the specified JSON format.
+    """)
+
+    chat_prompt = clean_text("""
+    You are Flexcube Copilot, an assistant for Oracle Flexcube Investor Services (FCIS) analysis.
+    The user sent a general message rather than a requirements document. Answer briefly and helpfully.
+    If relevant, mention that pasting a BRD or Change Request will produce a requirement and impact analysis.
+    """)
+
+    def __init__(self, llm: MistralLLM, chunk_tokens: int = 6000, overlap_tokens: int = 200, max_workers: int = 4,
+                 router: Optional[InputRouter] = None, chat_llm: Optional[MistralLLM] = None,
+                 revision_store: Optional[RevisionStore] = None):
         self.llm = llm
-        self.system_prompt = """
-        You are an expert Requirement Analysis Agent specialized in Oracle Flexcube Investor Services (FCIS).
-        Your goal is to analyze Business Requirement Documents (BRD) and Change Requests (CR) to extract structured requirements.
-        However, if the user input is a GENERAL QUESTION or GREETING (e.g., "What is AI?", "Hello"), do NOT extract requirements. Instead, provide a helpful answer in the 'conversation_response' field and leave other fields empty.
-        
-        Constraints:
-        - Do NOT propose schema or code changes.
-        - Do NOT guess Flexcube behavior.
-        - Be conservative and precise.
-        
-        IF BRD/CR, extract into the following 13 specific categories:
-        1. Business Objective
-        2. Client Type
-        3. Regulatory Constraints
-        4. In-Scope
-        5. Out-of-Scope
-        6. Functional Rules (as structured items)
-        7. Data Entities
-        8. Known FCIS Touchpoints
-        9. Customization Constraints
-        10. Performance SLA
-        11. Audit & Logging
-        12. Historical Issues
-        13. Risk Tolerance
-
-        Analyze the provided BRD text and output the result in the specified JSON format.
+        # Per-block results of earlier revisions; analyze_revision only re-runs changed sections
+        self.revision_store = revision_store
+        # Tiered routing: conversational input is answered by chat_llm (a small model) as plain text
+        self.router = router
+        self.chat_llm = chat_llm or llm
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_workers = max_workers
+
+    def _build_prompt(self, brd_text: str, part: int = None, total_parts: int = None, excerpt: bool = False,
+                      record: bool = True) -> str:
+        builder = PromptBuilder("requirement_analysis")
+        if part is not None:
+            builder.add(
+                f"This is PART {part} of {total_parts} of a larger BRD. Extract only what is stated in this part. "
+                "Leave fields empty when this part does not mention them. Do NOT treat this part as a general conversation."
+            )
+        elif excerpt:
+            # Position-free wording, so a block's prompt (and stored result) survives edits elsewhere in the BRD
+            builder.add(
+                "This is an excerpt (one or more sections) of a larger BRD. Extract only what is stated in this excerpt. "
+                "Leave fields empty when it does not mention them. Do NOT treat it as a general conversation."
+            )
+        builder.add(f"<brd>\n{brd_text}\n</brd>")
+        builder.add("Extract the requirements now.")
+        return builder.build(record)
+
+    def _should_chunk(self, brd_text: str, chunked: Optional[bool]) -> bool:
+        if chunked is not None:
+            return chunked
+        return estimate_tokens(brd_text) > self.chunk_tokens
+
+    @instrumented_stage("requirement_analysis")
+    def analyze(self, brd_text: str, use_cache: bool = True, chunked: Optional[bool] = None) -> AnalysisResult:
+        """
+        With a router, conversational input is answered by chat_llm and returned as conversation_response.
+        Large BRDs (over chunk_tokens) are split on section boundaries and analyzed
+        concurrently, then merged. Pass chunked=True/False to force either mode.
         """
+        if self.router is not None and self.router.route(brd_text).route == CONVERSATIONAL:
+            answer = self.chat_llm.generate_text(brd_text, use_cache=use_cache, system_prompt=self.chat_prompt)
+            return AnalysisResult(conversation_response=answer)
 
-    def analyze(self, brd_text: str) -> AnalysisResult:
-        prompt = f"""
-        {self.system_prompt}
-        
-        --- BRD CONTENT START ---
-        {brd_text}
-        --- BRD CONTENT END ---
-        
-        Extract the requirements now.
+        if self._should_chunk(brd_text, chunked):
+            return self._analyze_chunked(brd_text, use_cache)
+
+        prompt = self._build_prompt(brd_text)
+        return self.llm.generate_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)
+
+    @instrumented_stage("requirement_analysis")
+    async def aanalyze(self, brd_text: str, use_cache: bool = True, chunked: Optional[bool] = None) -> AnalysisResult:
+        if self.router is not None and (await self.router.aroute(brd_text)).route == CONVERSATIONAL:
+            answer = await self.chat_llm.agenerate_text(brd_text, use_cache=use_cache, system_prompt=self.chat_prompt)
+            return AnalysisResult(conversation_response=answer)
+
+        if self._should_chunk(brd_text, chunked):
+            return await self._aanalyze_chunked(brd_text, use_cache)
+
+        prompt = self._build_prompt(brd_text)
+        return await self.llm.agenerate_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)
+
+    @instrumented_stage("requirement_analysis")
+    async def astream(self, brd_text: str, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
         """
-        
-        # In a real scenario, we might want to chunk large BRDs, but for now we assume it fits in context.
-        return self.llm.generate_structured(prompt, AnalysisResult)
+        Yields ("field", (name, value)) as each top-level AnalysisResult field closes in the LLM stream,
+        then ("result", AnalysisResult). Conversational and chunked inputs only yield the result.
+        If the stream does not validate, the result comes from a regular (repairing) call instead.
+        """
+        if self.router is not None and (await self.router.aroute(brd_text)).route == CONVERSATIONAL:
+            answer = await self.chat_llm.agenerate_text(brd_text, use_cache=use_cache, system_prompt=self.chat_prompt)
+            yield "result", AnalysisResult(conversation_response=answer)
+            return
+        if self._should_chunk(brd_text, None):
+            yield "result", await self._aanalyze_chunked(brd_text, use_cache)
+            return
+
+        prompt = self._build_prompt(brd_text)
+        fields = {}
+        try:
+            async for name, value in astream_fields(self.llm.astream_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)):
+                fields[name] = value
+                yield "field", (name, value)
+            result = AnalysisResult.model_validate(fields)
+        except ValueError as e:
+            logger.warning("Streamed requirement analysis is invalid (%s); retrying without streaming", e)
+            result = await self.llm.agenerate_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)
+        yield "result", result
+
+    def _analyze_chunked(self, brd_text: str, use_cache: bool) -> AnalysisResult:
+        chunks = chunk_text(brd_text, self.chunk_tokens, self.overlap_tokens)
+        if not chunks:
+            # Empty or whitespace-only input: nothing to send
+            return merge_analysis_results([])
+        prompts = [self._build_prompt(chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(prompts))) as pool:
+            # Each call runs in a copy of the caller's context, so its spans land in the request trace
+            futures = [
+                pool.submit(contextvars.copy_context().run, self.llm.generate_structured, prompt, AnalysisResult,
+                            use_cache=use_cache, system_prompt=self.system_prompt)
+                for prompt in prompts
+            ]
+            partials = [future.result() for future in futures]
+        return merge_analysis_results(partials)
+
+    async def _aanalyze_chunked(self, brd_text: str, use_cache: bool) -> AnalysisResult:
+        chunks = chunk_text(brd_text, self.chunk_tokens, self.overlap_tokens)
+        if not chunks:
+            return merge_analysis_results([])
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(i: int, chunk: str) -> AnalysisResult:
+            async with semaphore:
+                prompt = self._build_prompt(chunk, i + 1, len(chunks))
+                return await self.llm.agenerate_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)
+
+        partials = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+        return merge_analysis_results(list(partials))
+
+
+    # --- Incremental re-analysis of revised BRDs ---------------------------------------------
+
+    @cached_property
+    def _revision_salt(self) -> str:
+        # Stored block results are only reused under the same model, prompts and schema
+        raw = "\x1f".join([self.llm.model, self.system_prompt, self._build_prompt("", excerpt=True, record=False), compact_schema(AnalysisResult)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _plan_revision(self, brd_text: str, use_cache: bool):
+        if self.revision_store is None:
+            raise RuntimeError("analyze_revision requires a revision_store")
+        sections = split_sections(brd_text)
+        fingerprints = [fingerprint(s) for s in sections]
+        groups = group_sections(fingerprints, [len(s) for s in sections], self.chunk_tokens)
+        salt = self._revision_salt
+        blocks = [(block_key(salt, [fingerprints[i] for i in g]), "".join(sections[i] for i in g)) for g in groups]
+        stored = {key: self.revision_store.get_block(key) if use_cache else None for key, _ in blocks}
+        missing = [(key, text) for key, text in blocks if stored[key] is None]
+        return fingerprints, blocks, stored, missing
+
+    def _finish_revision(self, document_id: str, fingerprints: List[str], blocks, stored: Dict[str, AnalysisResult]) -> RevisionAnalysis:
+        analysis = merge_analysis_results([stored[key] for key, _ in blocks])
+        # Concurrent revisions of one document must not read the same previous revision
+        with self.revision_store.document_lock(document_id):
+            return self._store_revision(document_id, fingerprints, blocks, analysis)
+
+    def _store_revision(self, document_id: str, fingerprints: List[str], blocks, analysis: AnalysisResult) -> RevisionAnalysis:
+        previous = self.revision_store.get_document(document_id)
+        if previous:
+            old_analysis = AnalysisResult.model_validate(previous["analysis"])
+            old_sections = set(previous["sections"])
+        else:
+            old_analysis, old_sections = AnalysisResult(), set()
+        result = RevisionAnalysis(
+            document_id=document_id,
+            revision=previous["revision"] + 1 if previous else 1,
+            analysis=analysis,
+            changed_fields=diff_analysis(old_analysis, analysis),
+            sections_total=len(fingerprints),
+            sections_changed=sum(1 for fp in fingerprints if fp not in old_sections),
+            blocks_total=len(blocks),
+        )
+        self.revision_store.put_document(document_id, {
+            "revision": result.revision,
+            "sections": fingerprints,
+            "blocks": [key for key, _ in blocks],
+            "analysis": analysis.model_dump(),
+        })
+        return result
+
+    def _record_revision(self, result: RevisionAnalysis, analyzed: int) -> RevisionAnalysis:
+        result.blocks_analyzed = analyzed
+        REVISION_BLOCKS.inc(analyzed, outcome="analyzed")
+        REVISION_BLOCKS.inc(result.blocks_total - analyzed, outcome="reused")
+        logger.info(
+            "Revision %d of %s: %d/%d sections changed, %d/%d blocks analyzed, fields changed: %s",
+            result.revision, result.document_id, result.sections_changed, result.sections_total,
+            analyzed, result.blocks_total, sorted(result.changed_fields),
+        )
+        return result
+
+    @instrumented_stage("requirement_analysis")
+    def analyze_revision(self, document_id: str, brd_text: str, use_cache: bool = True) -> RevisionAnalysis:
+        """
+        Analyzes a new revision of a BRD, re-running the LLM only for blocks of sections that are new
+        or changed since any earlier analysis. The result is merged in document order and diffed against
+        the previous revision of document_id; changed_fields lists what moved, so impact analysis can be
+        limited to the delta. use_cache=False re-analyzes every block.
+        """
+        fingerprints, blocks, stored, missing = self._plan_revision(brd_text, use_cache)
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self.llm.generate_structured,
+                                self._build_prompt(text, excerpt=True), AnalysisResult,
+                                use_cache=use_cache, system_prompt=self.system_prompt)
+                    for _, text in missing
+                ]
+                partials = [future.result() for future in futures]
+            for (key, _), partial in zip(missing, partials):
+                self.revision_store.put_block(key, partial)
+                stored[key] = partial
+        return self._record_revision(self._finish_revision(document_id, fingerprints, blocks, stored), len(missing))
+
+    @instrumented_stage("requirement_analysis")
+    async def aanalyze_revision(self, document_id: str, brd_text: str, use_cache: bool = True) -> RevisionAnalysis:
+        # Block reads and writes (and the pruning a write may trigger) are file I/O; keep them off the event loop
+        fingerprints, blocks, stored, missing = await asyncio.to_thread(self._plan_revision, brd_text, use_cache)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(key: str, text: str) -> None:
+            async with semaphore:
+                prompt = self._build_prompt(text, excerpt=True)
+                partial = await self.llm.agenerate_structured(prompt, AnalysisResult, use_cache=use_cache, system_prompt=self.system_prompt)
+            await asyncio.to_thread(self.revision_store.put_block, key, partial)
+            stored[key] = partial
+
+        await asyncio.gather(*(run(key, text) for key, text in missing))
+        # The document lock may wait on another worker; keep it off the event loop
+        result = await asyncio.to_thread(self._finish_revision, document_id, fingerprints, blocks, stored)
+        return self._record_revision(result, len(missing))
+
+
+def _normalize_item(item: str) -> str:
+    return " ".join(item.split()).rstrip(".;,").casefold()
+
+
+def _is_empty_scalar(value: Optional[str]) -> bool:
+    return not value or value.strip().upper() in ("N/A", "NA", "NONE", "UNKNOWN", "")
+
+
+_RISK_ORDER = {"low": 0, "medium": 1, "moderate": 1, "high": 2}
+
+
+def _risk_rank(value: str) -> int:
+    words = value.strip().lower().replace(":", " ").split()
+    return _RISK_ORDER.get(words[0], len(_RISK_ORDER)) if words else len(_RISK_ORDER)
+
+
+def merge_analysis_results(results: List[AnalysisResult]) -> AnalysisResult:
+    """
+    Deterministically merges partial results (in document order).
+    List fields: order-preserving union, deduplicated ignoring case/whitespace/trailing punctuation.
+    business_objective: earliest non-empty value. client_type: distinct values joined with '; '.
+    risk_tolerance: most conservative (lowest) tolerance stated; earliest wins on ties.
+    """
+    merged = {}
+    for name, field in AnalysisResult.model_fields.items():
+        if name == "conversation_response":
+            continue
+        values = [getattr(r, name) for r in results]
+        if field.annotation == List[str]:
+            seen = set()
+            items = []
+            for value in values:
+                for item in value:
+                    key = _normalize_item(item)
+                    if key and key not in seen:
+                        seen.add(key)
+                        items.append(item)
+            merged[name] = items
+
+    scalars = {
+        name: [getattr(r, name) for r in results if not _is_empty_scalar(getattr(r, name))]
+        for name in ("business_objective", "client_type", "risk_tolerance")
+    }
+
+    if scalars["business_objective"]:
+        merged["business_objective"] = scalars["business_objective"][0]
+
+    client_types = []
+    for value in scalars["client_type"]:
+        if _normalize_item(value) not in {_normalize_item(v) for v in client_types}:
+            client_types.append(value)
+    if client_types:
+        merged["client_type"] = "; ".join(client_types)
+
+    if scalars["risk_tolerance"]:
+        merged["risk_tolerance"] = min(scalars["risk_tolerance"], key=_risk_rank)
+
+    return AnalysisResult(**merged)
+
+
+def diff_analysis(old: AnalysisResult, new: AnalysisResult) -> Dict[str, FieldChange]:
+    """
+    Requirement fields that differ between two results. List items are compared with the same
+    normalization as merge_analysis_results; scalars report old/new. Unchanged fields are omitted.
+    """
+    changes: Dict[str, FieldChange] = {}
+    for name, field in AnalysisResult.model_fields.items():
+        if name == "conversation_response":
+            continue
+        before, after = getattr(old, name), getattr(new, name)
+        if field.annotation == List[str]:
+            old_keys = {_normalize_item(i) for i in before}
+            new_keys = {_normalize_item(i) for i in after}
+            added = [i for i in after if _normalize_item(i) not in old_keys]
+            removed = [i for i in before if _normalize_item(i) not in new_keys]
+            if added or removed:
+                changes[name] = FieldChange(added=added, removed=removed)
+        elif _normalize_item(before or "") != _normalize_item(after or ""):
+            changes[name] = FieldChange(old=before, new=after)
+    return changes
 
 if __name__ == "__main__":
     import os
@@ -56,31 +367,11 @@ if __name__ == "__main__":
     parser.add_argument("file_path", nargs="?", help="Path to the BRD text file")
     args = parser.parse_args()
 
-    # Mock LLM for testing if no key provided
+    # Fake backend for testing if no key provided
     if not os.environ.get("MISTRAL_API_KEY"):
-        print("WARNING: MISTRAL_API_KEY not set. Using mock response.")
-        
-        class MockLLM:
-            def generate_structured(self, prompt, model):
-                return AnalysisResult(
-                    business_objective="Mock Objective",
-                    client_type="Mock Client",
-                    regulatory_constraints=[],
-                    in_scope=[],
-                    out_of_scope=[],
-                    functional_rules=[
-                        FunctionalRequirement(id="FR-001", description="Mock functionality", acceptance_criteria=["Criteria 1"], priority="High")
-                    ],
-                    data_entities=[],
-                    known_fcis_touchpoints=[],
-                    customization_constraints=[],
-                    performance_sla="N/A",
-                    audit_and_logging=[],
-                    historical_issues=[],
-                    risk_tolerance="Low"
-                )
-        
-        llm = MockLLM()
+        print("WARNING: MISTRAL_API_KEY not set. Using fake backend fixtures.", file=sys.stderr)
+        from src.core.fake_llm import FakeMistralClient
+        llm = MistralLLM(client=FakeMistralClient())
     else:
         llm = MistralLLM()
         
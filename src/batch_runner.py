@@ -0,0 +1,161 @@
+"""
+Bulk BRD/CR runner: requirement -> impact -> code generation for every input file.
+
+    python -m src.batch_runner "brds/*.txt" --output results.jsonl --concurrency 4 --rpm 60 --tpm 500000
+
+Results are appended to a JSONL file (one line per input). Re-running with the same output
+file skips inputs that already succeeded and retries the ones that failed, so an interrupted
+batch resumes where it stopped.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from src.core.llm import MistralLLM
+from src.core.cache import ResponseCache
+from src.core.catalog import ComponentCatalog
+from src.core.jobs import STAGES, run_stage
+from src.core.ratelimit import RateLimiter
+from src.agents.requirement_analysis import RequirementAnalysisAgent
+from src.agents.impact_analysis import ImpactAnalysisAgent
+from src.agents.code_generation import CodeGenerationAgent
+
+INPUT_EXTENSIONS = (".txt", ".md")
+
+
+def collect_inputs(source: str) -> List[str]:
+    """A directory (all .txt/.md files inside, recursively) or a glob pattern."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(INPUT_EXTENSIONS))
+    else:
+        paths = [p for p in glob.glob(source, recursive=True) if os.path.isfile(p)]
+    return sorted(os.path.abspath(p) for p in paths)
+
+
+def load_completed(output_path: str) -> Dict[str, str]:
+    """source path -> status of the last record written for it."""
+    completed: Dict[str, str] = {}
+    if not os.path.isfile(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted run
+            completed[record["source"]] = record["status"]
+    return completed
+
+
+class BatchRunner:
+    def __init__(self, req_agent, impact_agent, code_agent, output_path: str, concurrency: int = 4):
+        self.agents = (req_agent, impact_agent, code_agent)
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self._write_lock = threading.Lock()
+
+    def process(self, path: str) -> dict:
+        started = time.time()
+        record = {"source": path, "status": "ok", "error": None}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                brd_text = f.read()
+            previous = None
+            for stage, _ in STAGES:
+                previous = run_stage(stage, *self.agents, brd_text, previous)
+                record[stage] = previous.model_dump()
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+        record["elapsed_seconds"] = round(time.time() - started, 3)
+        record["finished_at"] = time.time()
+        self._append(record)
+        return record
+
+    def _append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def run(self, paths: List[str]) -> List[dict]:
+        records = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.process, path): path for path in paths}
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                marker = "OK " if record["status"] == "ok" else "ERR"
+                print(f"[{len(records)}/{len(paths)}] {marker} {record['source']} ({record['elapsed_seconds']}s)", file=sys.stderr)
+        return records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the full Flexcube Copilot pipeline over a batch of BRD/CR files.")
+    parser.add_argument("source", help="Directory of BRD files or a glob pattern (quote it)")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Append-only JSONL results file")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents processed in parallel")
+    parser.add_argument("--rpm", type=float, default=None, help="Max LLM requests per minute")
+    parser.add_argument("--tpm", type=float, default=None, help="Max LLM tokens per minute")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per LLM call on 429/5xx")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not re-run inputs whose last record failed")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the LLM response cache")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.source)
+    if not paths:
+        print(f"No input files matched {args.source}", file=sys.stderr)
+        return 1
+
+    completed = load_completed(args.output)
+    skip = {"ok", "failed"} if args.skip_failed else {"ok"}
+    pending = [p for p in paths if completed.get(p) not in skip]
+    print(f"{len(paths)} inputs, {len(paths) - len(pending)} already done, {len(pending)} to process", file=sys.stderr)
+    if not pending:
+        return 0
+
+    limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    llm = MistralLLM(
+        cache=None if args.no_cache else ResponseCache.from_env(),
+        rate_limiter=limiter,
+        max_retries=args.max_retries,
+        max_connections=max(args.concurrency, 1),
+    )
+    runner = BatchRunner(
+        RequirementAnalysisAgent(llm),
+        ImpactAnalysisAgent(llm, catalog=ComponentCatalog.from_env()),
+        CodeGenerationAgent(llm),
+        output_path=args.output,
+        concurrency=args.concurrency,
+    )
+
+    started = time.time()
+    try:
+        records = runner.run(pending)
+    finally:
+        llm.close()
+    elapsed = time.time() - started
+
+    ok = sum(1 for r in records if r["status"] == "ok")
+    usage = limiter.stats()
+    print("\n--- Batch summary ---", file=sys.stderr)
+    print(f"Documents:      {len(records)} ({ok} ok, {len(records) - ok} failed)", file=sys.stderr)
+    print(f"Wall time:      {elapsed:.1f}s", file=sys.stderr)
+    print(f"Throughput:     {len(records) / elapsed * 60:.2f} docs/min", file=sys.stderr)
+    print(f"LLM requests:   {usage['requests']} ({usage['requests'] / elapsed * 60:.1f}/min)", file=sys.stderr)
+    print(f"LLM tokens:     ~{usage['tokens']} ({usage['tokens'] / elapsed * 60:.0f}/min)", file=sys.stderr)
+    print(f"Throttled for:  {usage['wait_seconds']}s (summed across workers)", file=sys.stderr)
+    return 0 if ok == len(records) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=None)
+def schema_hash(response_model: Type[BaseModel]) -> str:
+    """Stable hash of a Pydantic model's JSON schema."""
+    schema = json.dumps(response_model.model_json_schema(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], response_model: Optional[Type[BaseModel]] = None) -> str:
+    """
+    Content-addressed key: model name + full message list + schema hash.
+    Any change to the prompt, the model or the response schema produces a new key.
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "schema": schema_hash(response_model) if response_model else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for raw LLM responses.
+    Tier 1 is an in-memory LRU, tier 2 is a SQLite file with TTL and size-based eviction.
+    Async callers use aget/aset, which keep only the in-memory tier on the event loop.
+    Only responses that parsed and validated successfully should be stored.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 256,
+                 max_disk_entries: int = 5000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """
+        Builds the cache from environment variables.
+        FLEXCUBE_CACHE_DISABLED=1 turns it off, FLEXCUBE_CACHE_PATH sets the SQLite file
+        (empty string keeps it memory-only), FLEXCUBE_CACHE_TTL is in seconds.
+        """
+        if os.environ.get("FLEXCUBE_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+            return None
+        path = os.environ.get("FLEXCUBE_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite"))
+        ttl = float(os.environ.get("FLEXCUBE_CACHE_TTL", 7 * 24 * 3600))
+        max_disk = int(os.environ.get("FLEXCUBE_CACHE_MAX_ENTRIES", 5000))
+        return cls(path=path or None, ttl_seconds=ttl or None, max_disk_entries=max_disk)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop: the in-memory lookup runs inline, the SQLite tier in a worker thread."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        if self._db is None:
+            return self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        self._set_memory(key, value, now)
+        self._set_disk(key, value, now)
+
+    async def aset(self, key: str, value: str) -> None:
+        """set() for the event loop: the SQLite write (and its eviction pass) runs in a worker thread."""
+        now = time.time()
+        self._set_memory(key, value, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, now)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at, now):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        # SQLite has its own lock, so a slow disk lookup never blocks the in-memory tier
+        with self._db_lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        with self._lock:
+                            self._remember(key, value, created_at)
+                            self.hits += 1
+                            self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _set_memory(self, key: str, value: str, now: float) -> None:
+        with self._lock:
+            self._remember(key, value, now)
+
+    def _set_disk(self, key: str, value: str, now: float) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self, now: float) -> None:
+        if self.ttl_seconds:
+            cur = self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._count_evictions(cur.rowcount)
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            cur = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._count_evictions(cur.rowcount)
+
+    def _count_evictions(self, rowcount: int) -> None:
+        with self._lock:
+            self.evictions += max(rowcount, 0)
+
+    def clear(self) -> None:
+        with self._db_lock, self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock, self._lock:
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
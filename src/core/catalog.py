@@ -0,0 +1,343 @@
+"""
+Local catalog of real FCIS components (tables, packages, screens, ...) with a BM25 index.
+
+Sources are CSV or JSON exports with a name, a type and an optional description per component.
+The index is persisted in a compact binary file (string blobs + uint32 arrays) that is
+memory-mapped on load, so startup cost does not grow with the posting lists.
+
+    python -m src.core.catalog build exports/*.csv --index .cache/catalog.idx
+    python -m src.core.catalog search "capital call fee calculation" -k 10
+"""
+import os
+import re
+import csv
+import sys
+import json
+import math
+import heapq
+import mmap
+import array
+import struct
+import hashlib
+import argparse
+from collections import Counter as TermCounter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+MAGIC = b"FCXCAT2\n"
+K1 = 1.2
+B = 0.75
+NAME_KEYS = ("component_name", "name", "object_name", "table_name")
+TYPE_KEYS = ("component_type", "type", "object_type")
+DESCRIPTION_KEYS = ("description", "comments", "remarks")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or should shall must that the this to will with".split()
+)
+
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+class CatalogEntry(NamedTuple):
+    name: str
+    component_type: str
+    description: str = ""
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words; identifiers like STTM_PE_FUND_EXT yield the full name and each part."""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        parts = [p for p in word.split("_") if p]
+        if len(parts) > 1:
+            tokens.append(word.strip("_"))
+        tokens.extend(p for p in parts if p not in STOPWORDS and len(p) > 1)
+    return tokens
+
+
+def _pick(row: Dict[str, str], keys: Sequence[str]) -> str:
+    lowered = {k.strip().lower(): v for k, v in row.items() if k}
+    for key in keys:
+        if lowered.get(key):
+            return str(lowered[key]).strip()
+    return ""
+
+
+def load_entries(path: str) -> List[CatalogEntry]:
+    """Reads one CSV or JSON export (a list of objects, or {"components": [...]})."""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8-sig") as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get("components", [])
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    entries = []
+    for row in rows:
+        name = _pick(row, NAME_KEYS)
+        if name:
+            entries.append(CatalogEntry(name.upper(), _pick(row, TYPE_KEYS), _pick(row, DESCRIPTION_KEYS)))
+    return entries
+
+
+def expand_sources(sources: Iterable[str]) -> List[str]:
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith((".csv", ".json"))
+            ))
+        elif source:
+            paths.append(source)
+    return paths
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_sources(paths: Sequence[str]) -> List[Dict[str, Any]]:
+    """Absolute path, size, mtime and SHA-256 of each source file, as recorded in the index."""
+    described = []
+    for p in paths:
+        stat = os.stat(p)
+        described.append({"path": os.path.abspath(p), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                          "sha256": file_sha256(p)})
+    return described
+
+
+def sources_unchanged(recorded: Sequence[Dict[str, Any]], paths: Sequence[str]) -> bool:
+    """
+    True when paths are exactly the recorded sources. Sizes are compared first, so most changes skip hashing;
+    a file whose mtime also matches is taken as unchanged, so a restart hashes only files that were touched.
+    """
+    stats = [os.stat(p) for p in paths]
+    current = [(os.path.abspath(p), st.st_size) for p, st in zip(paths, stats)]
+    if current != [(s.get("path"), s.get("size")) for s in recorded]:
+        return False
+    return all(s.get("mtime_ns") == st.st_mtime_ns or s.get("sha256") == file_sha256(p)
+               for s, st, p in zip(recorded, stats, paths))
+
+
+class ComponentCatalog:
+    """
+    BM25 search over catalog entries plus an exact-name set for validation.
+    Build with from_entries()/from_sources(), persist with save(), reopen with load().
+    Entries are stored column-wise (names, types, descriptions) so loading is a few string splits.
+    """
+
+    def __init__(self, names: List[str], types: List[str], descriptions: List[str], terms: List[str],
+                 offsets: Sequence[int], dfs: Sequence[int], doc_lengths: Sequence[int], postings: Sequence[int],
+                 mapped: Optional[mmap.mmap] = None, sources: Optional[List[Dict[str, Any]]] = None):
+        self._names = names
+        self._types = types
+        self._descriptions = descriptions
+        self._terms = terms
+        self._term_ids = dict(zip(terms, range(len(terms))))
+        self._offsets = offsets          # per term: first (doc_id, tf) pair in postings
+        self._dfs = dfs                  # per term: number of documents
+        self._doc_lengths = doc_lengths
+        self._postings = postings        # flat (doc_id, term_frequency) pairs
+        self._name_set: Set[str] = set(names)
+        self._norms: Optional[List[float]] = None  # BM25 length normalization per document, computed on first search
+        self._mapped = mapped
+        self.sources = sources or []     # describe_sources() of the files the index was built from
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[CatalogEntry], sources: Optional[List[Dict[str, Any]]] = None) -> "ComponentCatalog":
+        unique: Dict[str, CatalogEntry] = {}
+        for entry in entries:
+            unique.setdefault(entry.name, entry)  # first source wins on duplicate names
+        docs = list(unique.values())
+
+        index: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = array.array("I")
+        for doc_id, entry in enumerate(docs):
+            terms = TermCounter(tokenize(f"{entry.name} {entry.component_type} {entry.description}"))
+            doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                index.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(index)
+        offsets, dfs, postings = array.array("I"), array.array("I"), array.array("I")
+        for term in terms:
+            offsets.append(len(postings) // 2)
+            dfs.append(len(index[term]))
+            for doc_id, tf in index[term]:
+                postings.extend((doc_id, tf))
+        # Tabs/newlines are the on-disk separators, so fields are whitespace-normalized up front
+        columns = [[" ".join(field.split()) for field in column] for column in zip(*docs)] if docs else [[], [], []]
+        return cls(columns[0], columns[1], columns[2], terms, offsets, dfs, doc_lengths, postings, sources=sources)
+
+    @classmethod
+    def from_sources(cls, sources: Iterable[str], index_path: Optional[str] = None) -> "ComponentCatalog":
+        """
+        Loads index_path when it was built from exactly these source files (same paths, sizes and
+        content hashes), otherwise rebuilds and saves it. Timestamps are not trusted: copies and
+        checkouts can leave an edited export older than the index.
+        """
+        paths = expand_sources(sources)
+        if index_path and os.path.exists(index_path):
+            try:
+                catalog = cls.load(index_path)
+            except ValueError:
+                catalog = None  # an older index format; rebuilt below
+            if catalog is not None and sources_unchanged(catalog.sources, paths):
+                return catalog
+        entries = [entry for path in paths for entry in load_entries(path)]
+        catalog = cls.from_entries(entries, describe_sources(paths))
+        if index_path:
+            catalog.save(index_path)
+        return catalog
+
+    @classmethod
+    def from_env(cls) -> Optional["ComponentCatalog"]:
+        """
+        FLEXCUBE_CATALOG lists catalog files or directories (separated by os.pathsep);
+        FLEXCUBE_CATALOG_INDEX is where the compiled index is kept. Returns None when unset.
+        """
+        sources = [s for s in os.environ.get("FLEXCUBE_CATALOG", "").split(os.pathsep) if s]
+        if not sources:
+            return None
+        index_path = os.environ.get("FLEXCUBE_CATALOG_INDEX", os.path.join(".cache", "catalog.idx"))
+        return cls.from_sources(sources, index_path or None)
+
+    def save(self, path: str) -> None:
+        """
+        Layout: MAGIC, seven uint64 (entry count, term count, posting count, then the byte lengths
+        of the names, types+descriptions and terms blobs and of the sources JSON), the newline-separated
+        blobs, the sources JSON, padding, then uint32 arrays: term offsets, term document frequencies, document lengths and the
+        (doc_id, tf) postings. All integers are little-endian.
+        """
+        names_blob = "\n".join(self._names).encode("utf-8")
+        details_blob = "\n".join(self._types + self._descriptions).encode("utf-8")
+        terms_blob = "\n".join(self._terms).encode("utf-8")
+        sources_blob = json.dumps(self.sources, separators=(",", ":")).encode("utf-8")
+        arrays = [array.array("I", values) for values in (self._offsets, self._dfs, self._doc_lengths, self._postings)]
+        if sys.byteorder != "little":
+            for values in arrays:
+                values.byteswap()
+        header = struct.pack("<7Q", len(self._names), len(self._terms), len(self._postings),
+                             len(names_blob), len(details_blob), len(terms_blob), len(sources_blob))
+        padding = -(len(MAGIC) + len(header) + len(names_blob) + len(details_blob) + len(terms_blob) + len(sources_blob)) % 4
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(header)
+            f.write(names_blob)
+            f.write(details_blob)
+            f.write(terms_blob)
+            f.write(sources_blob)
+            f.write(b"\0" * padding)
+            for values in arrays:
+                f.write(values.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ComponentCatalog":
+        """Memory-maps an index written by save(); only the string blobs are decoded up front."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a component catalog index")
+        pos = len(MAGIC)
+        n_entries, n_terms, n_postings, names_len, details_len, terms_len, sources_len = struct.unpack("<7Q", mapped[pos:pos + 56])
+        pos += 56
+
+        def strings(length: int) -> List[str]:
+            nonlocal pos
+            blob = mapped[pos:pos + length].decode("utf-8")
+            pos += length
+            return blob.split("\n") if blob else []
+
+        def uint32s(count: int) -> Sequence[int]:
+            nonlocal pos
+            view = memoryview(mapped)[pos:pos + count * 4]
+            pos += count * 4
+            if sys.byteorder == "little":
+                return view.cast("I")
+            values = array.array("I", view.tobytes())
+            values.byteswap()
+            return values
+
+        names = strings(names_len)
+        details = strings(details_len) if n_entries else []
+        terms = strings(terms_len)
+        sources = json.loads(mapped[pos:pos + sources_len].decode("utf-8"))
+        pos += sources_len
+        pos += -pos % 4
+        offsets, dfs, doc_lengths, postings = uint32s(n_terms), uint32s(n_terms), uint32s(n_entries), uint32s(n_postings)
+        return cls(names, details[:n_entries], details[n_entries:], terms, offsets, dfs, doc_lengths, postings, mapped, sources)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name.strip().upper() in self._name_set
+
+    def entry(self, doc_id: int) -> CatalogEntry:
+        return CatalogEntry(self._names[doc_id], self._types[doc_id], self._descriptions[doc_id])
+
+    def unknown(self, names: Iterable[str]) -> List[str]:
+        """Names that are not in the catalog (set lookups, no index scan)."""
+        return [n for n in names if n.strip().upper() not in self._name_set]
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[CatalogEntry, float]]:
+        """Top-k entries for the query by BM25 score."""
+        n_docs = len(self._names)
+        if not n_docs:
+            return []
+        if self._norms is None:
+            avg_length = sum(self._doc_lengths) / n_docs
+            self._norms = [K1 * (1 - B + B * length / avg_length) for length in self._doc_lengths]
+        norms = self._norms
+        postings = self._postings
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            offset, df = self._offsets[term_id], self._dfs[term_id]
+            weight = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * (K1 + 1)
+            doc_ids = postings[offset * 2:(offset + df) * 2:2]
+            tfs = postings[offset * 2 + 1:(offset + df) * 2:2]
+            for doc_id, tf in zip(doc_ids, tfs):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf / (tf + norms[doc_id])
+        best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.entry(doc_id), score) for doc_id, score in best]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the FCIS component catalog index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Compile CSV/JSON exports into an index file")
+    build.add_argument("sources", nargs="+")
+    build.add_argument("--index", default=os.path.join(".cache", "catalog.idx"))
+    search = sub.add_parser("search", help="Query an index file")
+    search.add_argument("query")
+    search.add_argument("--index", default=os.path.join(".cache", "catalog.idx"))
+    search.add_argument("-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        paths = expand_sources(args.sources)
+        entries = [entry for path in paths for entry in load_entries(path)]
+        catalog = ComponentCatalog.from_entries(entries, describe_sources(paths))
+        catalog.save(args.index)
+        print(f"Indexed {len(catalog)} components -> {args.index}")
+    else:
+        catalog = ComponentCatalog.load(args.index)
+        for entry, score in catalog.search(args.query, args.k):
+            print(f"{score:7.3f}  {entry.name:<32} {entry.component_type:<10} {entry.description}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
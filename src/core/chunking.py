@@ -0,0 +1,111 @@
+import re
+from typing import List
+
+# Rough heuristic for Mistral tokenizers on English business prose
+CHARS_PER_TOKEN = 4
+
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^\s*(\d+(\.\d+)*)[.)]?\s+[A-Z][^\n]{0,100}$")
+_KEYWORD_HEADING = re.compile(r"^\s*(section|chapter|appendix|annex)\s+[\w.]+", re.IGNORECASE)
+_CAPS_HEADING = re.compile(r"^\s*[A-Z][A-Z0-9 &/()\-]{3,80}:?\s*$")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_heading(line: str) -> bool:
+    if not line.strip() or len(line) > 120:
+        return False
+    return bool(
+        _MARKDOWN_HEADING.match(line)
+        or _NUMBERED_HEADING.match(line)
+        or _KEYWORD_HEADING.match(line)
+        or _CAPS_HEADING.match(line)
+    )
+
+
+def split_sections(text: str) -> List[str]:
+    """
+    Splits a document into sections, each starting at a heading line.
+    Text before the first heading becomes its own section.
+    """
+    sections: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines(keepends=True):
+        if is_heading(line) and any(l.strip() for l in current):
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append("".join(current))
+    return sections
+
+
+def _split_oversized(section: str, max_chars: int) -> List[str]:
+    """Breaks a single section that is larger than the budget on paragraph, then line, then hard boundaries."""
+    if len(section) <= max_chars:
+        return [section]
+
+    for separator in ("\n\n", "\n"):
+        split = section.split(separator)
+        # Separators go back between the parts only, so the pieces concatenate to the original section
+        parts = [p for p in [p + separator for p in split[:-1]] + [split[-1]] if p]
+        if len(parts) > 1:
+            pieces: List[str] = []
+            buffer = ""
+            for part in parts:
+                if buffer and len(buffer) + len(part) > max_chars:
+                    pieces.append(buffer)
+                    buffer = ""
+                buffer += part
+            if buffer:
+                pieces.append(buffer)
+            result: List[str] = []
+            for piece in pieces:
+                result.extend(_split_oversized(piece, max_chars) if len(piece) > max_chars else [piece])
+            return result
+
+    return [section[i:i + max_chars] for i in range(0, len(section), max_chars)]
+
+
+def _overlap_tail(chunk: str, overlap_chars: int) -> str:
+    """Last overlap_chars of a chunk, starting at a line boundary where possible."""
+    if overlap_chars <= 0 or not chunk:
+        return ""
+    tail = chunk[-overlap_chars:]
+    newline = tail.find("\n")
+    if 0 <= newline < len(tail) - 1:
+        tail = tail[newline + 1:]
+    return tail
+
+
+def chunk_text(text: str, max_tokens: int = 6000, overlap_tokens: int = 200) -> List[str]:
+    """
+    Packs heading-delimited sections into chunks of at most ~max_tokens.
+    Each chunk after the first is prefixed with ~overlap_tokens of the previous chunk's tail
+    so requirements that straddle a boundary are seen whole by at least one chunk.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 4)
+    budget = max_chars - overlap_chars
+
+    pieces: List[str] = []
+    for section in split_sections(text):
+        pieces.extend(_split_oversized(section, budget))
+
+    chunks: List[str] = []
+    buffer = ""
+    for piece in pieces:
+        if buffer and len(buffer) + len(piece) > budget:
+            chunks.append(buffer)
+            buffer = ""
+        buffer += piece
+    if buffer:
+        chunks.append(buffer)
+
+    if overlap_chars:
+        chunks = [chunks[0]] + [
+            _overlap_tail(chunks[i - 1], overlap_chars) + chunks[i] for i in range(1, len(chunks))
+        ] if chunks else chunks
+    return chunks
@@ -0,0 +1,258 @@
+import os
+import re
+import asyncio
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from xml.etree import ElementTree
+from src.core.chunking import is_heading
+from src.core.metrics import REGISTRY, LATENCY_BUCKETS, logger
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# .pdf is only offered when the optional pypdf package is installed
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".docx") + ((".pdf",) if PdfReader is not None else ())
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOT_LEADER = re.compile(r"^\s*\S.{0,150}?(\.\s*){4,}\s*\d+\s*$")
+_TOC_TITLE = re.compile(r"^\s*(table of contents|contents)\s*$", re.IGNORECASE)
+_PAGE_NUMBER = re.compile(r"^\s*(page\s+)?\d+(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+# Lines this close to the top/bottom of a page are header/footer candidates
+EDGE_LINES = 3
+# Paragraphs at least this long are dropped when they repeat at page edges (disclaimers, confidentiality notices)
+DUPLICATE_PARAGRAPH_CHARS = 80
+
+EXTRACTION_SECONDS = REGISTRY.histogram("flexcube_extraction_seconds", "Document text extraction time", ("extension",), LATENCY_BUCKETS)
+
+
+class UnsupportedDocumentError(ValueError):
+    """The upload is not a readable .txt/.md/.docx/.pdf document."""
+
+
+# --- Readers (run in worker processes) -----------------------------------------------------
+
+def _read_text(path: str) -> List[str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = raw.decode("cp1252", errors="replace")
+    # Form feeds mark page breaks in text exports
+    return text.replace("\r\n", "\n").split("\f")
+
+
+def _docx_paragraph(p: ElementTree.Element) -> str:
+    parts = []
+    for node in p.iter():
+        if node.tag == f"{_W}t" and node.text:
+            parts.append(node.text)
+        elif node.tag == f"{_W}tab":
+            parts.append("\t")
+        elif node.tag in (f"{_W}br", f"{_W}cr") and node.get(f"{_W}type") != "page":
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _docx_style(p: ElementTree.Element) -> str:
+    style = p.find(f"{_W}pPr/{_W}pStyle")
+    return style.get(f"{_W}val", "") if style is not None else ""
+
+
+def _read_docx(path: str) -> List[str]:
+    """
+    Body text of word/document.xml only: headers, footers and footnotes live in separate parts
+    and are never read. Heading styles become markdown headings so section splitting finds them;
+    TOC-styled paragraphs are dropped; table rows are rendered as ' | '-separated cells.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as f:
+            root = ElementTree.parse(f).getroot()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise UnsupportedDocumentError(f"Not a readable .docx file: {e}") from e
+
+    body = root.find(f"{_W}body")
+    lines: List[str] = []
+    for block in (body if body is not None else []):
+        if block.tag == f"{_W}p":
+            style = _docx_style(block)
+            if style.upper().startswith("TOC"):
+                continue
+            text = _docx_paragraph(block)
+            level = style[len("Heading"):] if style.startswith("Heading") else ""
+            if level.isdigit() and text.strip():
+                text = f"{'#' * min(int(level), 6)} {text.strip()}"
+            lines.append(text)
+        elif block.tag == f"{_W}tbl":
+            for row in block.iter(f"{_W}tr"):
+                cells = [" ".join(_docx_paragraph(p) for p in tc.iter(f"{_W}p")).strip() for tc in row.iter(f"{_W}tc")]
+                lines.append(" | ".join(cells))
+            lines.append("")
+    return ["\n".join(lines)]
+
+
+def _read_pdf(path: str) -> List[str]:
+    try:
+        reader = PdfReader(path)
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        raise UnsupportedDocumentError(f"Not a readable .pdf file: {e}") from e
+
+
+_READERS = {".txt": _read_text, ".md": _read_text, ".docx": _read_docx}
+if PdfReader is not None:
+    _READERS[".pdf"] = _read_pdf
+
+
+# --- Normalization --------------------------------------------------------------------------
+
+def _line_key(line: str) -> str:
+    # Page numbers and dates vary from page to page; the rest of a running header does not.
+    # Headings keep their digits, so numbered section titles are never mistaken for one another.
+    key = " ".join(line.split()).casefold()
+    return key if is_heading(line) else _DIGITS.sub("#", key)
+
+
+def _repeated_edges(pages: List[List[str]]) -> set:
+    """
+    Keys of lines that sit at the top/bottom of at least half of the pages and never inside a page
+    body (running headers/footers). A line the body also uses is content, even at a page edge.
+    """
+    if len(pages) < 3:
+        return set()
+    counts: Counter = Counter()
+    body = set()
+    for lines in pages:
+        content = [_line_key(line) for line in lines if line.strip()]
+        counts.update(set(content[:EDGE_LINES] + content[-EDGE_LINES:]))
+        body.update(content[EDGE_LINES:-EDGE_LINES])
+    threshold = max(2, len(pages) // 2)
+    return {key for key, n in counts.items() if n >= threshold and key not in body}
+
+
+def _paragraph_key(paragraph: str) -> str:
+    return " ".join(paragraph.split()).casefold()
+
+
+def _repeated_edge_paragraphs(pages: List[List[str]]) -> set:
+    """
+    Keys of long paragraphs that open or close at least half of the pages and never occur inside a
+    page body (multi-line disclaimers, confidentiality notices).
+    """
+    if len(pages) < 3:
+        return set()
+    counts: Counter = Counter()
+    body = set()
+    for paragraphs in pages:
+        content = [_paragraph_key(p) for p in paragraphs if p.strip()]
+        counts.update({key for key in content[:1] + content[-1:] if len(key) >= DUPLICATE_PARAGRAPH_CHARS})
+        body.update(content[1:-1])
+    threshold = max(2, len(pages) // 2)
+    return {key for key, n in counts.items() if n >= threshold and key not in body}
+
+
+def _strip_edge_paragraphs(pages: List[List[str]]) -> List[List[str]]:
+    """Drops boilerplate paragraphs from the first/last paragraph position of each page."""
+    paragraphs = [page.split("\n\n") for page in ("\n".join(lines) for lines in pages)]
+    boilerplate = _repeated_edge_paragraphs(paragraphs)
+    if not boilerplate:
+        return pages
+    stripped = []
+    for page in paragraphs:
+        content = [i for i, p in enumerate(page) if p.strip()]
+        edges = set(content[:1] + content[-1:])
+        kept = [p for i, p in enumerate(page) if not (i in edges and _paragraph_key(p) in boilerplate)]
+        stripped.append("\n\n".join(kept).split("\n"))
+    return stripped
+
+
+def normalize_pages(pages: List[str]) -> str:
+    """
+    Joins extracted pages into one BRD text and strips layout boilerplate: long paragraphs and
+    lines repeated at the top/bottom of pages (headers, footers, disclaimers), bare page numbers
+    at page edges, tables of contents (title and dot-leader entries), back-to-back duplicate
+    paragraphs and runs of blank lines. Text the body repeats elsewhere (e.g. the same rule
+    under two products) is kept.
+    """
+    split = [page.replace("\r\n", "\n").replace("\xa0", " ").split("\n") for page in pages]
+    split = _strip_edge_paragraphs(split)
+    repeated = _repeated_edges(split)
+
+    kept: List[str] = []
+    for lines in split:
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+        for i, line in enumerate(lines):
+            if i in edges and (_line_key(line) in repeated or _PAGE_NUMBER.match(line)):
+                continue
+            if _TOC_TITLE.match(line) or _DOT_LEADER.match(line):
+                continue
+            kept.append(line.rstrip())
+        kept.append("")
+
+    paragraphs: List[str] = []
+    previous = None
+    for paragraph in "\n".join(kept).split("\n\n"):
+        key = _paragraph_key(paragraph)
+        if not key:
+            paragraphs.append("")
+            continue
+        if key == previous:
+            continue
+        previous = key
+        paragraphs.append(paragraph)
+    return _BLANK_RUNS.sub("\n\n", "\n\n".join(paragraphs)).strip() + "\n"
+
+
+def extract_text(path: str, filename: str) -> str:
+    """Reads and normalizes one document; the extension of filename picks the reader."""
+    extension = os.path.splitext(filename)[1].lower()
+    reader = _READERS.get(extension)
+    if reader is None:
+        hint = " (.pdf requires the optional 'pypdf' package)" if extension == ".pdf" else ""
+        raise UnsupportedDocumentError(
+            f"Unsupported file type {extension or '(none)'}; expected one of {', '.join(SUPPORTED_EXTENSIONS)}{hint}"
+        )
+    return normalize_pages(reader(path))
+
+
+class DocumentExtractor:
+    """
+    Runs extract_text in a process pool so parsing large .docx/.pdf files (CPU-bound, GIL-holding)
+    never blocks the event loop. The pool is created on first use.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "DocumentExtractor":
+        return cls(max_workers=int(os.environ.get("FLEXCUBE_EXTRACT_WORKERS", 2)))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def aextract(self, path: str, filename: str) -> str:
+        extension = os.path.splitext(filename)[1].lower()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        text = await loop.run_in_executor(self._executor(), extract_text, path, filename)
+        elapsed = loop.time() - started
+        EXTRACTION_SECONDS.observe(elapsed, extension=extension)
+        logger.info("Extracted %d chars from %s in %.2fs", len(text), filename, elapsed)
+        return text
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
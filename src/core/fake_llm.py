@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+from src.core.chunking import estimate_tokens
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+_TITLE_RE = re.compile(r'"title":\s*"(\w+)"')
+
+
+class _Message:
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content: str):
+        self.index = 0
+        self.message = _Message(content)
+        self.delta = self.message
+        self.finish_reason = "stop"
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class _Response:
+    """Shaped like mistralai's ChatCompletionResponse / CompletionChunk for the attributes we read."""
+
+    def __init__(self, model: str, content: str, usage: Optional[_Usage] = None):
+        self.id = "fake-" + format(random.getrandbits(48), "x")
+        self.model = model
+        self.choices = [_Choice(content)]
+        self.usage = usage
+
+
+class _Event:
+    def __init__(self, data: _Response):
+        self.data = data
+
+
+class _EventStream:
+    """Minimal stand-in for the SDK's EventStream / EventStreamAsync."""
+
+    def __init__(self, chunks: List[str], model: str, delay: float):
+        self._chunks = chunks
+        self._model = model
+        self._delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self._delay:
+                time.sleep(self._delay)
+            yield _Event(_Response(self._model, chunk))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            if self._delay:
+                await asyncio.sleep(self._delay)
+            yield _Event(_Response(self._model, chunk))
+
+
+class _FakeChat:
+    def __init__(self, owner: "FakeMistralClient"):
+        self._owner = owner
+
+    def complete(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> _Response:
+        content, usage = self._owner.respond(messages)
+        time.sleep(self._owner.latency_for(usage))
+        return _Response(model, content, usage)
+
+    async def complete_async(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> _Response:
+        content, usage = self._owner.respond(messages)
+        await asyncio.sleep(self._owner.latency_for(usage))
+        return _Response(model, content, usage)
+
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> _EventStream:
+        content, usage = self._owner.respond(messages)
+        chunks, delay = self._owner.split_stream(content, usage)
+        return _EventStream(chunks, model, delay)
+
+    async def stream_async(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> _EventStream:
+        content, usage = self._owner.respond(messages)
+        chunks, delay = self._owner.split_stream(content, usage)
+        return _EventStream(chunks, model, delay)
+
+
+class FakeMistralClient:
+    """
+    Deterministic stand-in for `mistralai.Mistral`, plugged into MistralLLM(client=...).
+    Structured calls are answered with fixtures/<ResponseModel>.json (picked from the schema title
+    in the system prompt); plain text calls with fixtures/text.json.
+
+    latency_ms / jitter_ms:   synthetic time-to-response (jitter is seeded, so runs are reproducible)
+    ms_per_token:             extra latency per completion token, to model long generations
+    payload_scale:            repeats top-level list items N times to simulate larger outputs
+    """
+
+    def __init__(self, fixtures_dir: str = DEFAULT_FIXTURES_DIR, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 ms_per_token: float = 0.0, payload_scale: int = 1, stream_chunk_chars: int = 64, seed: int = 0):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_token = ms_per_token
+        self.payload_scale = max(1, payload_scale)
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._fixtures: Dict[str, str] = {}
+        self.calls = 0
+        self.chat = _FakeChat(self)
+
+    @classmethod
+    def from_env(cls) -> "FakeMistralClient":
+        return cls(
+            fixtures_dir=os.environ.get("FLEXCUBE_FAKE_FIXTURES", DEFAULT_FIXTURES_DIR),
+            latency_ms=float(os.environ.get("FLEXCUBE_FAKE_LATENCY_MS", 0)),
+            jitter_ms=float(os.environ.get("FLEXCUBE_FAKE_JITTER_MS", 0)),
+            ms_per_token=float(os.environ.get("FLEXCUBE_FAKE_MS_PER_TOKEN", 0)),
+            payload_scale=int(os.environ.get("FLEXCUBE_FAKE_PAYLOAD_SCALE", 1)),
+        )
+
+    def _fixture_names(self) -> List[str]:
+        return [name[:-5] for name in sorted(os.listdir(self.fixtures_dir)) if name.endswith(".json")]
+
+    def _fixture_for(self, messages: List[Dict[str, Any]]) -> str:
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        titles = _TITLE_RE.findall(system)
+        names = self._fixture_names()
+        # The response model's own title is listed last in a Pydantic schema; $defs titles come first
+        for title in reversed(titles):
+            if title in names:
+                return title
+        if titles:
+            raise ValueError(f"No fake fixture for response schema(s): {sorted(set(titles))}")
+        return "text"
+
+    def _load(self, name: str) -> str:
+        if name not in self._fixtures:
+            with open(os.path.join(self.fixtures_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if name == "text":
+                self._fixtures[name] = data["content"]
+            else:
+                self._fixtures[name] = json.dumps(self._scale(data))
+        return self._fixtures[name]
+
+    def _scale(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.payload_scale == 1:
+            return data
+        scaled = {}
+        for key, value in data.items():
+            if isinstance(value, list) and value:
+                items = []
+                for copy in range(self.payload_scale):
+                    for item in value:
+                        if copy and isinstance(item, dict):
+                            # Keep *_name fields unique so scaled outputs look like distinct objects
+                            item = {k: (f"{v}_{copy}" if k.endswith("_name") and isinstance(v, str) else v)
+                                    for k, v in item.items()}
+                        items.append(item)
+                value = items
+            scaled[key] = value
+        return scaled
+
+    def respond(self, messages: List[Dict[str, Any]]):
+        self.calls += 1
+        content = self._load(self._fixture_for(messages))
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        return content, _Usage(prompt_tokens, estimate_tokens(content))
+
+    def latency_for(self, usage: _Usage) -> float:
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        total_ms = self.latency_ms + jitter + self.ms_per_token * usage.completion_tokens
+        return max(total_ms, 0.0) / 1000.0
+
+    def split_stream(self, content: str, usage: _Usage):
+        """Chunks of the content plus the per-chunk delay that spreads the total latency across them."""
+        size = self.stream_chunk_chars
+        chunks = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+        return chunks, self.latency_for(usage) / len(chunks)
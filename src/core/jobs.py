@@ -0,0 +1,464 @@
+import os
+import json
+import shutil
+import time
+import uuid
+import socket
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from src.core.models import AnalysisResult, ImpactAssessment, CodeGenerationResponse, EffortEstimation
+from src.core.llm import llm_lane
+from src.core.metrics import logger
+from src.core.speculation import Speculation
+
+# Stage name -> checkpoint model, in execution order
+STAGES = [
+    ("requirements", AnalysisResult),
+    ("impact", ImpactAssessment),
+    ("code", CodeGenerationResponse),
+]
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobRunningError(RuntimeError):
+    """The job is already running in this process or holds a live lease in another worker."""
+
+
+def conversational_impact() -> ImpactAssessment:
+    return ImpactAssessment(
+        affected_components=[], schema_changes=[], code_changes=[],
+        effort_estimation=EffortEstimation(complexity="N/A", person_days=0, justification="Conversational Input"),
+        overall_risk="Low", mitigation_strategies=[]
+    )
+
+
+def needs_code(impact: ImpactAssessment) -> bool:
+    # An empty assessment with N/A complexity is the conversational bypass
+    return bool(impact.affected_components) or impact.effort_estimation.complexity != "N/A"
+
+
+NO_CODE = "No code needed for conversational input."
+
+
+def run_stage(stage: str, req_agent, impact_agent, code_agent, brd_text: str, previous):
+    """Runs one pipeline stage given the previous stage's output, applying the conversational bypasses."""
+    if stage == "requirements":
+        return req_agent.analyze(brd_text)
+    if stage == "impact":
+        # Check for conversation response bypass
+        if previous.conversation_response:
+            return conversational_impact()
+        return impact_agent.assess(previous)
+    # Check for conversational bypass
+    if not needs_code(previous):
+        return CodeGenerationResponse(files=[], summary=NO_CODE)
+    return code_agent.generate(previous)
+
+
+def partial_impact(fields: Dict[str, Any]) -> ImpactAssessment:
+    """ImpactAssessment from the fields streamed so far; missing fields get N/A placeholders."""
+    return ImpactAssessment.model_validate({
+        "affected_components": [], "schema_changes": [], "code_changes": [], "mitigation_strategies": [],
+        "overall_risk": "N/A", "effort_estimation": {"complexity": "N/A", "person_days": 0, "justification": "N/A"},
+        **fields,
+    })
+
+
+async def arun_pipelined(req_agent, impact_agent, code_agent, brd_text: str, use_cache: bool = True
+                         ) -> Tuple[AnalysisResult, ImpactAssessment, CodeGenerationResponse]:
+    """
+    Runs the three stages overlapped instead of back to back: requirement analysis is streamed and
+    impact analysis starts as soon as the requirement fields it uses (its agent's input_fields) close;
+    impact analysis is streamed in turn and code generation starts once its own input fields close.
+    Those fields lead the upstream schema and are all the downstream prompt uses, so a speculative run
+    normally sent the LLM exactly the prompt the final upstream result gives and is kept: the output is
+    what the sequential pipeline would produce, and each stage saves the upstream tail (the remaining
+    fields and the catalog verification). A run whose prompt turns out different is redone on the
+    final result; in the worst case that is the sequential latency.
+    """
+    code = Speculation(
+        "code", lambda impact: code_agent.agenerate(impact, use_cache=use_cache), partial_impact,
+        code_agent.input_fields, code_agent.prompt_key,
+    )
+
+    async def run_impact(requirements: AnalysisResult) -> ImpactAssessment:
+        code.reset()
+        async for kind, value in impact_agent.astream(requirements, use_cache=use_cache):
+            if kind == "field":
+                code.offer(*value)
+            else:
+                return value
+
+    impact = Speculation("impact", run_impact, AnalysisResult.model_validate, impact_agent.input_fields,
+                         impact_agent.prompt_key)
+    try:
+        requirements = None
+        async for kind, value in req_agent.astream(brd_text, use_cache=use_cache):
+            if kind == "field":
+                impact.offer(*value)
+            else:
+                requirements = value
+        if requirements.conversation_response:
+            return requirements, conversational_impact(), CodeGenerationResponse(files=[], summary=NO_CODE)
+
+        assessment = await impact.resolve(requirements)
+        if not needs_code(assessment):
+            return requirements, assessment, CodeGenerationResponse(files=[], summary=NO_CODE)
+        return requirements, assessment, await code.resolve(assessment)
+    finally:
+        impact.cancel()
+        code.cancel()
+
+
+class JobStore:
+    """
+    File-backed job state. Each job is a directory holding job.json (status),
+    input.txt (the BRD) and one <stage>.json checkpoint per completed stage.
+    .active/ holds an empty marker per job that is not completed or failed, so finding unfinished
+    jobs does not read every job ever run.
+    Writes go through a temp file + os.replace so a crash never leaves a half-written checkpoint.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        if not os.path.isdir(self._active_dir()):
+            self._build_active_index()
+
+    def _active_dir(self) -> str:
+        return os.path.join(self.root, ".active")
+
+    def _build_active_index(self) -> None:
+        # One-off scan for stores created before the index; built aside and renamed into place,
+        # so an interrupted build is never mistaken for a complete one
+        tmp = f"{self._active_dir()}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp)
+        for job_id in self.job_ids():
+            if self.load_state(job_id)["status"] not in TERMINAL_STATUSES:
+                open(os.path.join(tmp, job_id), "w").close()
+        try:
+            os.rename(tmp, self._active_dir())
+        except OSError:
+            # Another worker built it first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def _write(self, path: str, content: str) -> None:
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def create(self, brd_text: str) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._dir(job_id))
+        self._write(os.path.join(self._dir(job_id), "input.txt"), brd_text)
+        now = time.time()
+        state = {
+            "job_id": job_id,
+            "status": "queued",
+            "stage": None,
+            "completed_stages": [],
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.save_state(state)
+        return state
+
+    def exists(self, job_id: str) -> bool:
+        return os.path.isfile(os.path.join(self._dir(job_id), "job.json"))
+
+    def load_state(self, job_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self._dir(job_id), "job.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        state["updated_at"] = time.time()
+        marker = os.path.join(self._active_dir(), state["job_id"])
+        # The marker is added before and removed after the state write, so a crash in between
+        # leaves at most a stale marker (skipped by readers), never an unfinished job without one
+        if state["status"] not in TERMINAL_STATUSES and not os.path.exists(marker):
+            open(marker, "w").close()
+        self._write(os.path.join(self._dir(state["job_id"]), "job.json"), json.dumps(state))
+        if state["status"] in TERMINAL_STATUSES:
+            try:
+                os.unlink(marker)
+            except FileNotFoundError:
+                pass
+
+    def load_input(self, job_id: str) -> str:
+        with open(os.path.join(self._dir(job_id), "input.txt"), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def save_checkpoint(self, job_id: str, stage: str, result) -> None:
+        self._write(os.path.join(self._dir(job_id), f"{stage}.json"), result.model_dump_json())
+
+    def load_checkpoint(self, job_id: str, stage: str):
+        model = dict(STAGES)[stage]
+        path = os.path.join(self._dir(job_id), f"{stage}.json")
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return model.model_validate_json(f.read())
+
+    def job_ids(self) -> List[str]:
+        return [name for name in os.listdir(self.root) if self.exists(name)]
+
+    def unfinished_job_ids(self) -> List[str]:
+        """Jobs that were not completed or failed when last saved, from the .active index."""
+        return [name for name in os.listdir(self._active_dir()) if self.exists(name)]
+
+    # --- Leases ------------------------------------------------------------------------------
+    # lease.json names the worker running a job and when its claim expires. It is created with
+    # os.link (fails if the file exists), so at most one worker holds a job at a time.
+
+    def _lease_path(self, job_id: str) -> str:
+        return os.path.join(self._dir(job_id), "lease.json")
+
+    def read_lease(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._lease_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def acquire_lease(self, job_id: str, owner: str, ttl: float) -> bool:
+        """Claims the job for owner unless another worker holds a live lease. Expired leases and leases of dead processes are taken over."""
+        path = self._lease_path(job_id)
+        for _ in range(3):
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"owner": owner, "expires_at": time.time() + ttl}, f)
+            try:
+                os.link(tmp, path)
+                return True
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(tmp)
+
+            lease = self.read_lease(job_id)
+            if lease is None:
+                continue
+            if lease["owner"] == owner:
+                self.renew_lease(job_id, owner, ttl)
+                return True
+            if lease["expires_at"] > time.time() and _owner_alive(lease["owner"]):
+                return False
+            # Move the stale lease aside; only one contender's rename succeeds
+            stale = f"{path}.{uuid.uuid4().hex}.stale"
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                continue
+            with open(stale, "r", encoding="utf-8") as f:
+                taken = json.load(f)
+            if taken != lease:
+                # Another worker took the job over in between: put its lease back
+                try:
+                    os.link(stale, path)
+                except FileExistsError:
+                    pass
+                os.unlink(stale)
+                return False
+            os.unlink(stale)
+        return False
+
+    def renew_lease(self, job_id: str, owner: str, ttl: float) -> bool:
+        lease = self.read_lease(job_id)
+        if lease is None or lease["owner"] != owner:
+            return False
+        self._write(self._lease_path(job_id), json.dumps({"owner": owner, "expires_at": time.time() + ttl}))
+        return True
+
+    def release_lease(self, job_id: str, owner: str) -> None:
+        lease = self.read_lease(job_id)
+        if lease is not None and lease["owner"] == owner:
+            try:
+                os.unlink(self._lease_path(job_id))
+            except FileNotFoundError:
+                pass
+
+
+# Distinguishes this process from an earlier one that had the same pid (e.g. a restarted container)
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def _new_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_alive(holder: str) -> bool:
+    """False when the lease holder is known to be dead: a vanished process, or an earlier incarnation of this pid, on this host."""
+    parts = holder.split(":")
+    if len(parts) < 3 or parts[0] != socket.gethostname() or not parts[1].isdigit():
+        return True
+    if int(parts[1]) == os.getpid():
+        return parts[2] == _PROCESS_TOKEN
+    try:
+        os.kill(int(parts[1]), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class PipelineJobManager:
+    """
+    Runs requirement -> impact -> code generation jobs on a background thread pool.
+    Every stage result is checkpointed, so resume() on a failed or interrupted job
+    skips the stages that already completed.
+    A job runs only in the worker holding its lease; the lease is renewed while the job runs,
+    and jobs whose lease expired (their worker died) are adopted by the next worker that checks.
+    """
+
+    def __init__(self, store: JobStore, req_agent, impact_agent, code_agent, max_workers: int = 2,
+                 lease_seconds: float = 60.0):
+        self.store = store
+        self.req_agent = req_agent
+        self.impact_agent = impact_agent
+        self.code_agent = code_agent
+        self.lease_seconds = lease_seconds
+        self.owner = _new_owner()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._lock = threading.Lock()
+        self._active = set()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="pipeline-leases", daemon=True)
+        self._heartbeat.start()
+
+    def submit(self, brd_text: str) -> Dict[str, Any]:
+        state = self.store.create(brd_text)
+        if self._claim(state["job_id"]):
+            self._pool.submit(self._run, state["job_id"])
+        return state
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """Re-runs a failed or interrupted job; raises JobRunningError while it is running here or in another worker."""
+        state = self.store.load_state(job_id)
+        if state["status"] == "completed":
+            return state
+        if not self._claim(job_id):
+            raise JobRunningError(f"Job {job_id} is already running")
+        state["status"] = "queued"
+        state["error"] = None
+        self.store.save_state(state)
+        self._pool.submit(self._run, job_id)
+        return state
+
+    def resume_incomplete(self) -> List[str]:
+        """Re-queues jobs left queued/running by a worker that is gone (expired lease), e.g. after a restart."""
+        resumed = []
+        for job_id in self.store.unfinished_job_ids():
+            if self.store.load_state(job_id)["status"] in TERMINAL_STATUSES:
+                continue
+            try:
+                self.resume(job_id)
+                resumed.append(job_id)
+            except JobRunningError:
+                pass
+        return resumed
+
+    def status(self, job_id: str, include_results: bool = True) -> Dict[str, Any]:
+        state = self.store.load_state(job_id)
+        if include_results:
+            state["results"] = {}
+            for stage in state["completed_stages"]:
+                checkpoint = self.store.load_checkpoint(job_id, stage)
+                if checkpoint is not None:
+                    state["results"][stage] = checkpoint.model_dump()
+        return state
+
+    def _claim(self, job_id: str) -> bool:
+        with self._lock:
+            if job_id in self._active:
+                return False
+            self._active.add(job_id)
+        if self.store.acquire_lease(job_id, self.owner, self.lease_seconds):
+            return True
+        with self._lock:
+            self._active.discard(job_id)
+        return False
+
+    def _renew_leases(self) -> None:
+        """Heartbeat: keeps the leases of running jobs alive and adopts jobs orphaned by dead workers."""
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                active = list(self._active)
+            for job_id in active:
+                if not self.store.renew_lease(job_id, self.owner, self.lease_seconds):
+                    logger.warning("Lost the lease of pipeline job %s", job_id)
+            try:
+                adopted = self.resume_incomplete()
+                if adopted:
+                    logger.info("Adopted %d pipeline job(s) with expired leases", len(adopted))
+            except Exception:
+                logger.exception("Checking for orphaned pipeline jobs failed")
+
+    def _run(self, job_id: str) -> None:
+        # Background work queues behind interactive requests for LLM slots
+        llm_lane.set("batch")
+        state = self.store.load_state(job_id)
+        try:
+            brd_text = self.store.load_input(job_id)
+            previous = None
+            state["status"] = "running"
+            for stage, _ in STAGES:
+                if stage in state["completed_stages"]:
+                    previous = self.store.load_checkpoint(job_id, stage)
+                    if previous is not None:
+                        continue
+                    state["completed_stages"].remove(stage)
+
+                state["stage"] = stage
+                self._update(state)
+                previous = run_stage(stage, self.req_agent, self.impact_agent, self.code_agent, brd_text, previous)
+                self.store.save_checkpoint(job_id, stage, previous)
+                state["completed_stages"].append(stage)
+
+            state["status"] = "completed"
+            state["stage"] = None
+            self._update(state)
+        except Exception as e:
+            logger.exception("Pipeline job %s failed", job_id)
+            state["status"] = "failed"
+            state["error"] = str(e)
+            self._update(state)
+        finally:
+            self.store.release_lease(job_id, self.owner)
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _update(self, state: Dict[str, Any]) -> None:
+        self.store.save_state(state)
+        with self._lock:
+            subscribers = list(self._subscribers.get(state["job_id"], []))
+        snapshot = dict(state, completed_stages=list(state["completed_stages"]))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, snapshot)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue receiving a state snapshot on every status change. Must be called from the event loop."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            self._subscribers[job_id] = [(l, q) for l, q in subscribers if q is not queue]
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._stopped.set()
+        self._pool.shutdown(wait=wait)
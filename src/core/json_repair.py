@@ -0,0 +1,300 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from pydantic import BaseModel, Field, ValidationError
+from src.core.prompts import compact_schema
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = ("true", "false", "null")
+_ELIDE_CHARS = 160
+_ELIDE_ITEMS = 5
+
+
+class InvalidJsonError(ValueError):
+    """The response is not JSON, even after local repair."""
+
+    def __init__(self, message: str, raw: str, repaired: str):
+        super().__init__(message)
+        self.raw = raw
+        self.repaired = repaired
+
+
+class SchemaValidationError(ValueError):
+    """The response is JSON but does not validate against the response model."""
+
+    def __init__(self, message: str, raw: str, data: Any, error: ValidationError):
+        super().__init__(message)
+        self.raw = raw
+        self.data = data
+        self.error = error
+
+
+def json_span(text: str) -> str:
+    """
+    Fast bounds for the JSON value in text: first '{' or '[' to the last matching closer.
+    Index-based (str.find/rfind), so a clean response is returned as-is without any copy.
+    """
+    start = text.find("{")
+    bracket = text.find("[")
+    if start < 0 or 0 <= bracket < start:
+        start = bracket
+    if start < 0:
+        return text
+    end = text.rfind("}" if text[start] == "{" else "]")
+    if end < start:
+        return text[start:]
+    if start == 0 and end == len(text) - 1:
+        return text
+    return text[start:end + 1]
+
+
+def is_json_error(error: ValidationError) -> bool:
+    """True when validate_json failed because the text is not JSON (rather than the wrong shape)."""
+    return any(e["type"] == "json_invalid" for e in error.errors(include_url=False, include_context=False, include_input=False))
+
+
+def extract_json_span(text: str) -> str:
+    """
+    Returns the first top-level JSON object/array in text, ignoring prose and code fences around it.
+    If the value never closes (truncated output), everything from its start is returned.
+    """
+    start = -1
+    for i, ch in enumerate(text):
+        if ch in "{[":
+            start = i
+            break
+    if start < 0:
+        return text.strip()
+
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:].rstrip().rstrip("`").rstrip()
+
+
+def remove_trailing_commas(text: str) -> str:
+    """Drops commas directly before a closing bracket (outside strings)."""
+    out: List[str] = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in "}]":
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        elif ch == '"':
+            in_string = True
+        out.append(ch)
+    return "".join(out)
+
+
+def close_truncated(text: str) -> str:
+    """
+    Completes JSON that was cut off mid-value: closes an open string, drops a dangling comma
+    or partial literal, fills a missing value with null and appends the missing closing brackets.
+    """
+    # Each open container is [bracket, state]; objects go key -> colon -> value -> comma, arrays value -> comma
+    stack: List[List[str]] = []
+    in_string = escaped = False
+    token_start = -1  # start of the bare scalar being read, if any
+
+    def value_done():
+        if stack:
+            stack[-1][1] = "comma"
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if stack and stack[-1][0] == "{" and stack[-1][1] == "key":
+                    stack[-1][1] = "colon"
+                else:
+                    value_done()
+            continue
+        if token_start >= 0 and (ch.isspace() or ch in ",:]}"):
+            token_start = -1
+            value_done()
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append([ch, "key" if ch == "{" else "value"])
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            value_done()
+        elif ch == ":":
+            if stack:
+                stack[-1][1] = "value"
+        elif ch == ",":
+            if stack:
+                stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+        elif not ch.isspace() and token_start < 0:
+            token_start = i
+
+    if not stack and not in_string:
+        return text
+
+    out = text
+    if in_string:
+        if escaped:
+            out = out[:-1]
+        out += '"'
+        if stack and stack[-1][0] == "{" and stack[-1][1] == "key":
+            stack[-1][1] = "colon"
+        else:
+            value_done()
+    elif token_start >= 0:
+        token = out[token_start:]
+        if token in _LITERALS or _is_number(token):
+            value_done()
+        else:
+            out = out[:token_start]
+
+    out = out.rstrip()
+    if stack:
+        state = stack[-1][1]
+        if state == "colon":
+            out += ":null"
+        elif out.endswith(":"):
+            out += "null"
+        elif out.endswith(","):
+            out = out[:-1]
+    return out + "".join(_CLOSERS[bracket] for bracket, _ in reversed(stack))
+
+
+def _is_number(token: str) -> bool:
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def repair_json(text: str) -> str:
+    """Local, model-free repair: extract the JSON span, close truncated brackets, drop trailing commas."""
+    return remove_trailing_commas(close_truncated(extract_json_span(text)))
+
+
+# --- Targeted follow-up -------------------------------------------------------------------
+
+class JsonPatch(BaseModel):
+    path: List[Union[int, str]] = Field(description="Location to set, as a list of keys/indices from the root")
+    value: Any = Field(description="Corrected JSON value for that location")
+
+
+class RepairResponse(BaseModel):
+    patches: List[JsonPatch]
+
+
+def _elide(value: Any) -> Any:
+    # Keeps fragments small: long strings and lists are shortened, the structure stays visible
+    if isinstance(value, str) and len(value) > _ELIDE_CHARS:
+        return value[:_ELIDE_CHARS] + "..."
+    if isinstance(value, list):
+        items = [_elide(v) for v in value[:_ELIDE_ITEMS]]
+        if len(value) > _ELIDE_ITEMS:
+            items.append(f"... {len(value) - _ELIDE_ITEMS} more items")
+        return items
+    if isinstance(value, dict):
+        return {k: _elide(v) for k, v in value.items()}
+    return value
+
+
+def _resolve(data: Any, path: Sequence[Union[int, str]]) -> Tuple[Any, bool]:
+    node = data
+    for key in path:
+        try:
+            node = node[key]
+        except (KeyError, IndexError, TypeError):
+            return None, False
+    return node, True
+
+
+def validation_fragments(data: Any, error: ValidationError) -> List[Dict[str, Any]]:
+    """
+    One entry per Pydantic error: its location, message and the smallest enclosing fragment
+    of the invalid document (the parent object for missing fields, the value itself otherwise).
+    """
+    fragments = []
+    for err in error.errors():
+        loc = list(err["loc"])
+        frag_path = loc[:-1] if err["type"] == "missing" else loc
+        node, found = _resolve(data, frag_path)
+        while not found and frag_path:
+            frag_path = frag_path[:-1]
+            node, found = _resolve(data, frag_path)
+        fragments.append({"loc": loc, "error": err["msg"], "fragment_path": frag_path, "fragment": _elide(node)})
+    return fragments
+
+
+def repair_messages(fragments: List[Dict[str, Any]], schema: str) -> List[Dict[str, Any]]:
+    """Small follow-up request: only the error locations and the invalid fragments, never the original prompt."""
+    system = (
+        "You fix JSON documents that failed schema validation. For every error, return a patch that sets "
+        "the value at `path` (list of keys/indices from the root) so that the document validates. "
+        "Use the fragments only as context; keep existing content where possible.\n\n"
+        f"Document schema:\n{schema}\n\n"
+        f"Respond ONLY with a JSON object that validates against this JSON schema:\n{compact_schema(RepairResponse)}"
+    )
+    user = "\n".join(
+        f"- error at {json.dumps(f['loc'])}: {f['error']}\n"
+        f"  fragment at {json.dumps(f['fragment_path'])}: {json.dumps(f['fragment'], ensure_ascii=False, default=str)}"
+        for f in fragments
+    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+def apply_patches(data: Any, patches: List[JsonPatch]) -> Any:
+    """Sets each patch value in place; missing object keys are created and index len(list) appends."""
+    for patch in patches:
+        if not patch.path:
+            data = patch.value
+            continue
+        parent, found = _resolve(data, patch.path[:-1])
+        key = patch.path[-1]
+        if not found:
+            continue
+        if isinstance(parent, dict):
+            parent[str(key)] = patch.value
+        elif isinstance(parent, list) and isinstance(key, int):
+            if key < len(parent):
+                parent[key] = patch.value
+            elif key == len(parent):
+                parent.append(patch.value)
+    return data
+
+
+def parse_repair_response(content: str) -> Optional[RepairResponse]:
+    try:
+        return RepairResponse.model_validate_json(repair_json(content))
+    except ValueError:
+        return None
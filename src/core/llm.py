@@ -1,81 +1,453 @@
 import os
-import sys
 import json
-from typing import Any, Dict, Type
-from pydantic import BaseModel
+import time
+import uuid
+import asyncio
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from src.core.cache import ResponseCache, make_cache_key
+from src.core.chunking import estimate_tokens
+from src.core.prompts import compact_schema
+from src.core.json_repair import (
+    InvalidJsonError, SchemaValidationError, json_span, is_json_error, repair_json,
+    validation_fragments, repair_messages, parse_repair_response, apply_patches,
+)
+from src.core.ratelimit import RateLimiter, is_retryable, retry_delay
+from src.core.metrics import (
+    logger, span, record_span, LLM_REQUESTS, LLM_LATENCY, LLM_PROMPT_CHARS, LLM_TOKENS,
+    LLM_RETRIES, LLM_CACHE, LLM_PARSE_SECONDS, current_trace,
+)
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant."
+
+# Priority lane of the LLM calls made in this context ("interactive" or "batch"), read by the admission gate
+llm_lane: ContextVar[str] = ContextVar("flexcube_llm_lane", default="interactive")
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_model: Type[BaseModel]) -> TypeAdapter:
+    """One TypeAdapter (and its compiled validator/serializer) per response model."""
+    return TypeAdapter(response_model)
 
-try:
-    from mistralai import Mistral
-except ImportError:
-    Mistral = None
 
 class MistralLLM:
-    def __init__(self, api_key: str = None, model: str = "mistral-large-latest"):
+    def __init__(self, api_key: str = None, model: str = "mistral-large-latest", cache: Optional[ResponseCache] = None,
+                 max_connections: int = 20, timeout: float = 300.0,
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 0, client: Any = None,
+                 repair_followups: int = 1, failures_dir: Optional[str] = None, admission: Any = None):
         self.api_key = api_key or os.environ.get("MISTRAL_API_KEY")
         self.model = model
-        
-        self.client = None
-        if Mistral and self.api_key:
-            self.client = Mistral(api_key=self.api_key)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        # Optional gate bounding concurrent calls across all callers (slot() for async, hold() for sync)
+        self.admission = admission
+        # Follow-up requests that patch schema errors before giving up on a response
+        self.repair_followups = repair_followups
+        self.failures_dir = failures_dir or os.environ.get("FLEXCUBE_FAILURES_DIR", ".failures")
 
-    def generate_structured(self, prompt: str, response_model: Type[BaseModel]) -> BaseModel:
-        """
-        Generates a structured response using Mistral JSON mode.
-        """
-        if not self.client:
-             raise ValueError("Mistral Client not initialized. Please set MISTRAL_API_KEY env var and install `mistralai`.")
+        # `client` lets callers plug in an SDK-compatible backend (e.g. FakeMistralClient)
+        self.client = client
+        self._http_client = None
+        self._async_http_client = None
+        if client is None and self.api_key:
+            self._build_client(max_connections, timeout)
 
-        system_prompt = f"""
-        You are a helpful AI assistant.
-        Output your response strictly in valid JSON format matching the following schema id:
-        {json.dumps(response_model.model_json_schema(), indent=2)}
-        """
+    def _build_client(self, max_connections: int, timeout: float) -> None:
+        # The SDK is imported here, not at module level: it dominates import time and is never
+        # needed when a client is injected (fake backend, tests, benchmarks)
+        try:
+            import httpx
+            from mistralai import Mistral
+        except ImportError:
+            return
+        # One pooled, keep-alive connection set per MistralLLM (sync and async)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._http_client = httpx.Client(limits=limits, timeout=timeout)
+        self._async_http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self.client = Mistral(api_key=self.api_key, client=self._http_client, async_client=self._async_http_client)
 
-        messages = [
-            {"role": "system", "content": system_prompt},
+    def _structured_messages(self, prompt: str, response_model: Type[BaseModel], system_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        # The agent's instructions and the (cached, minified) schema go in the system message exactly once
+        system = (
+            f"{system_prompt or DEFAULT_SYSTEM_PROMPT}\n\n"
+            f"Respond ONLY with a JSON object that validates against this JSON schema:\n{compact_schema(response_model)}"
+        )
+        return [
+            {"role": "system", "content": system},
             {"role": "user", "content": prompt}
         ]
 
-        chat_response = self.client.chat.complete(
-            model=self.model,
-            messages=messages
-        )
+    def _cache_lookup(self, messages: List[Dict[str, Any]], response_model: Optional[Type[BaseModel]], use_cache: bool):
+        """Returns (cache_key, cached_value); both None when caching is off for this call."""
+        if self.cache is None or not use_cache:
+            return None, None
+        cache_key = make_cache_key(self.model, messages, response_model)
+        return cache_key, self._cache_result(self.cache.get(cache_key), response_model)
+
+    async def _acache_lookup(self, messages: List[Dict[str, Any]], response_model: Optional[Type[BaseModel]], use_cache: bool):
+        """_cache_lookup for async callers; the SQLite tier is read off the event loop."""
+        if self.cache is None or not use_cache:
+            return None, None
+        cache_key = make_cache_key(self.model, messages, response_model)
+        return cache_key, self._cache_result(await self.cache.aget(cache_key), response_model)
+
+    def _cache_result(self, cached: Optional[str], response_model: Optional[Type[BaseModel]]) -> Optional[str]:
+        LLM_CACHE.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            label = response_model.__name__ if response_model else "text"
+            LLM_REQUESTS.inc(call="cache", model=self.model, response_model=label, outcome="cache_hit")
+            record_span("llm.cache_hit", 0.0, response_model=label)
+        return cached
+
+    def _require_client(self):
+        if not self.client:
+             raise ValueError("Mistral Client not initialized. Please set MISTRAL_API_KEY env var and install `mistralai`.")
 
-        import re
-        response_content = chat_response.choices[0].message.content
-        
-        # Strip markdown code fencing if present
-        if "```" in response_content:
-            response_content = re.sub(r"```json\s*", "", response_content)
-            response_content = re.sub(r"```\s*", "", response_content)
-            response_content = response_content.strip()
-        
+    def _prompt_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(estimate_tokens(m["content"]) for m in messages)
+
+    def _observe_response(self, chat_response, estimated_prompt_tokens: int, elapsed: float, label: str, call: str) -> None:
+        LLM_LATENCY.observe(elapsed, call=call, model=self.model)
+        usage = getattr(chat_response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        LLM_TOKENS.inc(prompt_tokens, model=self.model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=self.model, kind="completion")
+        record_span("llm.call", elapsed, response_model=label, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if self.rate_limiter is not None and usage is not None:
+            self.rate_limiter.record_usage((prompt_tokens + completion_tokens) - estimated_prompt_tokens)
+
+    def _before_call(self, messages: List[Dict[str, Any]], label: str) -> int:
+        self._require_client()
+        LLM_PROMPT_CHARS.observe(sum(len(m["content"]) for m in messages), response_model=label)
+        return self._prompt_tokens(messages)
+
+    def _on_call_error(self, e: Exception, attempt: int, label: str, call: str) -> float:
+        """Re-raises if the error is final, otherwise returns the backoff delay before the next attempt."""
+        if attempt >= self.max_retries or not is_retryable(e):
+            LLM_REQUESTS.inc(call=call, model=self.model, response_model=label, outcome="error")
+            raise e
+        delay = retry_delay(e, attempt)
+        LLM_RETRIES.inc(model=self.model)
+        logger.warning("LLM call failed (%s); retry %d/%d in %.1fs", e, attempt + 1, self.max_retries, delay)
+        return delay
+
+    def _slot(self):
+        return self.admission.slot(llm_lane.get()) if self.admission is not None else nullcontext()
+
+    def _hold(self):
+        return self.admission.hold(llm_lane.get()) if self.admission is not None else nullcontext()
+
+    def _complete(self, messages: List[Dict[str, Any]], label: str = "text"):
+        """chat.complete behind the rate limiter, retried with jittered backoff on 429/5xx."""
+        estimated = self._before_call(messages, label)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(estimated)
+            started = time.perf_counter()
+            try:
+                with self._hold():
+                    chat_response = self.client.chat.complete(
+                        model=self.model,
+                        messages=messages
+                    )
+            except Exception as e:
+                time.sleep(self._on_call_error(e, attempt, label, "complete"))
+                attempt += 1
+                continue
+            self._observe_response(chat_response, estimated, time.perf_counter() - started, label, "complete")
+            return chat_response
+
+    async def _acomplete(self, messages: List[Dict[str, Any]], label: str = "text"):
+        estimated = self._before_call(messages, label)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire(estimated)
+            started = time.perf_counter()
+            try:
+                async with self._slot():
+                    chat_response = await self.client.chat.complete_async(
+                        model=self.model,
+                        messages=messages
+                    )
+            except Exception as e:
+                await asyncio.sleep(self._on_call_error(e, attempt, label, "complete_async"))
+                attempt += 1
+                continue
+            self._observe_response(chat_response, estimated, time.perf_counter() - started, label, "complete_async")
+            return chat_response
+
+    def _parse_structured(self, response_content: str, response_model: Type[BaseModel]) -> Tuple[BaseModel, str]:
+        """
+        Parses and validates a response, returning (result, outcome).
+        Fast path: validate the JSON span straight from the string (no intermediate dict).
+        Falls back to local repair (truncation, trailing commas, stray brackets in prose)
+        before giving up. Raises InvalidJsonError or SchemaValidationError.
+        """
+        label = response_model.__name__
+        text = json_span(response_content)
+        with span("llm.parse", response_model=label, chars=len(response_content)):
+            started = time.perf_counter()
+            try:
+                result = type_adapter(response_model).validate_json(text)
+            except ValidationError as e:
+                if not is_json_error(e):
+                    # Valid JSON with the wrong shape: decode it once more so the repair request can point at the errors
+                    raise SchemaValidationError(f"Validation failed: {e}", response_content, json.loads(text), e)
+                result = None
+            LLM_PARSE_SECONDS.observe(time.perf_counter() - started, phase="validate_json", response_model=label)
+        if result is not None:
+            return result, "ok"
+
+        with span("llm.repair", response_model=label):
+            started = time.perf_counter()
+            repaired = repair_json(response_content)
+            try:
+                data = json.loads(repaired)
+            except json.JSONDecodeError as e:
+                raise InvalidJsonError(f"Failed to decode JSON from LLM response: {e}", response_content, repaired)
+            LLM_PARSE_SECONDS.observe(time.perf_counter() - started, phase="repair", response_model=label)
+        try:
+            return response_model.model_validate(data), "repaired_local"
+        except ValidationError as e:
+            raise SchemaValidationError(f"Validation failed: {e}", response_content, data, e)
+
+    def _apply_repair(self, error: SchemaValidationError, repair_content: str, response_model: Type[BaseModel]) -> BaseModel:
+        repair = parse_repair_response(repair_content)
+        if repair is None:
+            raise error
+        data = apply_patches(json.loads(json.dumps(error.data)), repair.patches)
         try:
-            # Parse JSON and validate with Pydantic
-            data = json.loads(response_content)
             return response_model.model_validate(data)
-        except json.JSONDecodeError:
-            with open("bad_json.txt", "w", encoding="utf-8") as f:
-                f.write(response_content)
-            print(f"DEBUG: Failed Raw Response: {response_content}", file=sys.stderr)
-            raise ValueError(f"Failed to decode JSON from LLM response. Content saved to bad_json.txt")
-        except Exception as e:
-             with open("bad_json.txt", "w", encoding="utf-8") as f:
-                f.write(response_content)
-             print(f"DEBUG: Validation Error: {e}\nRaw: {response_content[:200]}...", file=sys.stderr)
-             raise ValueError(f"Validation failed: {e}")
+        except ValidationError as e:
+            raise SchemaValidationError(f"Validation failed after repair: {e}", error.raw, data, e)
 
-    def generate_text(self, prompt: str) -> str:
-        if not self.client:
-             raise ValueError("Mistral Client not initialized. Please set MISTRAL_API_KEY env var.")
+    def _save_failure(self, error: ValueError, response_model: Type[BaseModel], call: str) -> Optional[str]:
+        """Writes one artifact per failed response (never shared between requests)."""
+        trace = current_trace() or {}
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}_{response_model.__name__}_{uuid.uuid4().hex[:8]}.json"
+        path = os.path.join(self.failures_dir, name)
+        artifact = {
+            "model": self.model,
+            "response_model": response_model.__name__,
+            "call": call,
+            "trace_id": trace.get("trace_id"),
+            "error": str(error),
+            "raw": getattr(error, "raw", None),
+            "repaired": getattr(error, "repaired", None),
+            "data": getattr(error, "data", None),
+        }
+        try:
+            os.makedirs(self.failures_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(artifact, f, indent=2, ensure_ascii=False, default=str)
+        except OSError:
+            logger.exception("Could not save failure artifact to %s", path)
+            return None
+        return path
 
-        messages = [
-            {"role": "user", "content": prompt}
-        ]
+    def _invalid(self, error: ValueError, response_model: Type[BaseModel], call: str) -> ValueError:
+        label = response_model.__name__
+        LLM_REQUESTS.inc(call=call, model=self.model, response_model=label, outcome="invalid")
+        path = self._save_failure(error, response_model, call)
+        logger.error("Invalid %s response (%s). Raw: %.200s", label, error, getattr(error, "raw", ""))
+        return ValueError(f"{error}. Response saved to {path}" if path else str(error))
 
-        chat_response = self.client.chat.complete(
-            model=self.model,
-            messages=messages
-        )
+    def _parse_with_outcome(self, chat_response, response_model: Type[BaseModel], call: str) -> BaseModel:
+        label = response_model.__name__
+        try:
+            result, outcome = self._parse_structured(chat_response.choices[0].message.content, response_model)
+        except SchemaValidationError as e:
+            result, outcome = self._repair_remote(e, response_model, call), "repaired_remote"
+        except ValueError as e:
+            raise self._invalid(e, response_model, call) from e
+        LLM_REQUESTS.inc(call=call, model=self.model, response_model=label, outcome=outcome)
+        return result
+
+    async def _aparse_with_outcome(self, chat_response, response_model: Type[BaseModel], call: str) -> BaseModel:
+        label = response_model.__name__
+        try:
+            result, outcome = self._parse_structured(chat_response.choices[0].message.content, response_model)
+        except SchemaValidationError as e:
+            result, outcome = await self._arepair_remote(e, response_model, call), "repaired_remote"
+        except ValueError as e:
+            raise self._invalid(e, response_model, call) from e
+        LLM_REQUESTS.inc(call=call, model=self.model, response_model=label, outcome=outcome)
+        return result
+
+    def _repair_remote(self, error: SchemaValidationError, response_model: Type[BaseModel], call: str) -> BaseModel:
+        """Asks for patches to the invalid fields only, instead of regenerating the whole response."""
+        for _ in range(self.repair_followups):
+            messages = repair_messages(validation_fragments(error.data, error.error), compact_schema(response_model))
+            repair_response = self._complete(messages, "repair")
+            try:
+                return self._apply_repair(error, repair_response.choices[0].message.content, response_model)
+            except SchemaValidationError as e:
+                error = e
+        raise self._invalid(error, response_model, call) from error
+
+    async def _arepair_remote(self, error: SchemaValidationError, response_model: Type[BaseModel], call: str) -> BaseModel:
+        for _ in range(self.repair_followups):
+            messages = repair_messages(validation_fragments(error.data, error.error), compact_schema(response_model))
+            repair_response = await self._acomplete(messages, "repair")
+            try:
+                return self._apply_repair(error, repair_response.choices[0].message.content, response_model)
+            except SchemaValidationError as e:
+                error = e
+        raise self._invalid(error, response_model, call) from error
+
+    def generate_structured(self, prompt: str, response_model: Type[BaseModel], use_cache: bool = True,
+                            system_prompt: Optional[str] = None) -> BaseModel:
+        """
+        Generates a structured response using Mistral JSON mode.
+        Set use_cache=False to bypass the response cache for this call.
+        """
+        messages = self._structured_messages(prompt, response_model, system_prompt)
+        cache_key, cached = self._cache_lookup(messages, response_model, use_cache)
+        if cached is not None:
+            return type_adapter(response_model).validate_json(cached)
+
+        chat_response = self._complete(messages, response_model.__name__)
+        result = self._parse_with_outcome(chat_response, response_model, "complete")
+        if cache_key is not None:
+            self.cache.set(cache_key, result.model_dump_json())
+        return result
+
+    async def agenerate_structured(self, prompt: str, response_model: Type[BaseModel], use_cache: bool = True,
+                                   system_prompt: Optional[str] = None) -> BaseModel:
+        """
+        Async variant of generate_structured. Does not block the event loop while waiting on Mistral.
+        """
+        messages = self._structured_messages(prompt, response_model, system_prompt)
+        cache_key, cached = await self._acache_lookup(messages, response_model, use_cache)
+        if cached is not None:
+            return type_adapter(response_model).validate_json(cached)
+
+        chat_response = await self._acomplete(messages, response_model.__name__)
+        result = await self._aparse_with_outcome(chat_response, response_model, "complete_async")
+        if cache_key is not None:
+            await self.cache.aset(cache_key, result.model_dump_json())
+        return result
+
+    async def astream_structured(self, prompt: str, response_model: Type[BaseModel], use_cache: bool = True,
+                                 system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Streams the raw JSON text of a structured response as Mistral generates it.
+        A cache hit is replayed as a single chunk. Streamed responses are not written back
+        to the cache, since that would mean buffering the whole body.
+        Failures before the first chunk are retried like _acomplete; a stream that breaks
+        after text was yielded raises (outcome "error").
+        """
+        messages = self._structured_messages(prompt, response_model, system_prompt)
+        _, cached = await self._acache_lookup(messages, response_model, use_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        label = response_model.__name__
+        estimated = self._before_call(messages, label)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire(estimated)
+            started = time.perf_counter()
+            first_chunk_at = None
+            last_event = None
+            try:
+                # The slot is held until the stream is fully read
+                async with self._slot():
+                    stream = await self.client.chat.stream_async(
+                        model=self.model,
+                        messages=messages
+                    )
+                    async with stream as events:
+                        async for event in events:
+                            last_event = event
+                            if not event.data.choices:
+                                continue
+                            content = event.data.choices[0].delta.content
+                            if isinstance(content, list):
+                                content = "".join(getattr(part, "text", "") or "" for part in content)
+                            if content:
+                                if first_chunk_at is None:
+                                    first_chunk_at = time.perf_counter()
+                                    record_span("llm.first_chunk", first_chunk_at - started, response_model=label)
+                                yield content
+            except Exception as e:
+                # Once text has been handed to the caller the stream cannot be replayed, only failed
+                if first_chunk_at is not None:
+                    LLM_REQUESTS.inc(call="stream_async", model=self.model, response_model=label, outcome="error")
+                    raise
+                await asyncio.sleep(self._on_call_error(e, attempt, label, "stream_async"))
+                attempt += 1
+                continue
+            break
+
+        # The final chunk carries token usage for the whole stream
+        self._observe_response(last_event.data if last_event else None, estimated, time.perf_counter() - started, label, "stream_async")
+        LLM_REQUESTS.inc(call="stream_async", model=self.model, response_model=label, outcome="ok")
+
+    def _text_messages(self, prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def generate_text(self, prompt: str, use_cache: bool = True, system_prompt: Optional[str] = None) -> str:
+        messages = self._text_messages(prompt, system_prompt)
+
+        cache_key, cached = self._cache_lookup(messages, None, use_cache)
+        if cached is not None:
+            return cached
+
+        chat_response = self._complete(messages)
+        LLM_REQUESTS.inc(call="complete", model=self.model, response_model="text", outcome="ok")
+        content = chat_response.choices[0].message.content
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+
+    async def agenerate_text(self, prompt: str, use_cache: bool = True, system_prompt: Optional[str] = None) -> str:
+        messages = self._text_messages(prompt, system_prompt)
+
+        cache_key, cached = await self._acache_lookup(messages, None, use_cache)
+        if cached is not None:
+            return cached
+
+        chat_response = await self._acomplete(messages)
+        LLM_REQUESTS.inc(call="complete_async", model=self.model, response_model="text", outcome="ok")
+        content = chat_response.choices[0].message.content
+        if cache_key is not None:
+            await self.cache.aset(cache_key, content)
+        return content
+
+    async def awarm_up(self, timeout: float = 5.0) -> bool:
+        """
+        Opens (TLS handshake included) a pooled keep-alive connection to the API with a cheap,
+        token-free models.list call, so the first user request does not pay for it.
+        Returns False, without raising, when there is no real client or the call fails.
+        """
+        if self._async_http_client is None:
+            return False
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.client.models.list_async(), timeout)
+        except Exception as e:
+            logger.warning("LLM connection warm-up failed: %s", e)
+            return False
+        record_span("llm.warm_up", time.perf_counter() - started, model=self.model)
+        return True
+
+    def close(self):
+        if self._http_client is not None:
+            self._http_client.close()
 
-        return chat_response.choices[0].message.content
+    async def aclose(self):
+        if self._async_http_client is not None:
+            await self._async_http_client.aclose()
+        self.close()
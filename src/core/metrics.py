@@ -0,0 +1,277 @@
+import json
+import time
+import uuid
+import bisect
+import inspect
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("flexcube")
+trace_logger = logging.getLogger("flexcube.trace")
+
+# Seconds; LLM round-trips range from ~100ms (cache/fake) to a few minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+LLM_REQUESTS = REGISTRY.counter("flexcube_llm_requests_total", "LLM calls by outcome", ("call", "model", "response_model", "outcome"))
+LLM_LATENCY = REGISTRY.histogram("flexcube_llm_latency_seconds", "Wall time of the Mistral round-trip", ("call", "model"))
+LLM_PROMPT_CHARS = REGISTRY.histogram("flexcube_llm_prompt_chars", "Size of the messages sent to the LLM", ("response_model",), SIZE_BUCKETS)
+LLM_TOKENS = REGISTRY.counter("flexcube_llm_tokens_total", "Token usage reported by the LLM", ("model", "kind"))
+LLM_RETRIES = REGISTRY.counter("flexcube_llm_retries_total", "LLM calls retried after a 429/5xx", ("model",))
+LLM_CACHE = REGISTRY.counter("flexcube_llm_cache_total", "Response cache lookups", ("result",))
+LLM_PARSE_SECONDS = REGISTRY.histogram("flexcube_llm_parse_seconds", "Post-processing of LLM output", ("phase", "response_model"))
+AGENT_STAGE_SECONDS = REGISTRY.histogram("flexcube_agent_stage_seconds", "Agent method wall time", ("stage", "outcome"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("flexcube_http_request_seconds", "HTTP request wall time", ("method", "route", "status"))
+
+
+# --- Per-request tracing ---------------------------------------------------------------
+
+_current_trace: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("flexcube_trace", default=None)
+
+
+def start_trace(**attrs) -> contextvars.Token:
+    trace = {"trace_id": uuid.uuid4().hex[:16], "started": time.perf_counter(), "spans": [], **attrs}
+    return _current_trace.set(trace)
+
+
+def current_trace() -> Optional[Dict[str, Any]]:
+    return _current_trace.get()
+
+
+def detach_trace(token: contextvars.Token) -> Optional[Dict[str, Any]]:
+    """
+    Clears the current trace without emitting it, for work that outlives the caller's context
+    (a streamed response body). Tasks that copied the context keep recording into it.
+    """
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    return trace
+
+
+def finish_trace(token: contextvars.Token, **attrs) -> Optional[Dict[str, Any]]:
+    """Emits the collected spans as a single JSON log line and clears the trace."""
+    return emit_trace(detach_trace(token), **attrs)
+
+
+def emit_trace(trace: Optional[Dict[str, Any]], **attrs) -> Optional[Dict[str, Any]]:
+    """Emits a detached trace as a single JSON log line."""
+    if trace is None:
+        return None
+    trace.update(attrs)
+    trace["duration_ms"] = round((time.perf_counter() - trace.pop("started")) * 1000, 3)
+    trace_logger.info(json.dumps(trace, default=str))
+    return trace
+
+
+def record_span(name: str, seconds: float, **attrs) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["spans"].append({"name": name, "ms": round(seconds * 1000, 3), **attrs})
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times a block into the current trace. Attributes can be added to the yielded dict."""
+    started = time.perf_counter()
+    data = dict(attrs)
+    try:
+        yield data
+    finally:
+        record_span(name, time.perf_counter() - started, **data)
+
+
+def instrumented_stage(stage: str):
+    """Records wall time and outcome of an agent method (sync, async or async generator)."""
+    def observe(started: float, outcome: str) -> None:
+        elapsed = time.perf_counter() - started
+        AGENT_STAGE_SECONDS.observe(elapsed, stage=stage, outcome=outcome)
+        record_span(f"agent.{stage}", elapsed, outcome=outcome)
+
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                    outcome = "ok"
+                finally:
+                    observe(started, outcome)
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    observe(started, outcome)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                observe(started, outcome)
+        return wrapper
+
+    return decorator
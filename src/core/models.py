@@ -1,5 +1,6 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
 
 class FunctionalRequirement(BaseModel):
     id: str = Field(description="Unique identifier for the requirement (e.g., FR-001)")
@@ -13,8 +14,9 @@ class TechnicalImplication(BaseModel):
     risk_level: str = Field(default="Low", description="Risk level associated with this technical change")
 
 class AnalysisResult(BaseModel):
+    # Fields the impact analysis uses come first: the LLM answers in schema order, so a pipelined run can
+    # start impact analysis as soon as they close (see IMPACT_REQUIREMENT_FIELDS)
     business_objective: str = Field(default="N/A", description="1. Business Objective")
-    client_type: str = Field(default="N/A", description="2. Client Type")
     regulatory_constraints: List[str] = Field(default_factory=list, description="3. Regulatory Constraints")
     functional_requirements: List[str] = Field(default_factory=list, description="4. Functional Requirements")
     non_functional_requirements: List[str] = Field(default_factory=list, description="5. Non-Functional Requirements")
@@ -24,6 +26,7 @@ class AnalysisResult(BaseModel):
     ui_ux_requirements: List[str] = Field(default_factory=list, description="9. UI/UX Requirements")
     reporting_requirements: List[str] = Field(default_factory=list, description="10. Reporting Requirements")
     audit_and_logging: List[str] = Field(default_factory=list, description="11. Audit & Logging")
+    client_type: str = Field(default="N/A", description="2. Client Type")
     historical_issues: List[str] = Field(default_factory=list, description="12. Historical Issues")
     risk_tolerance: str = Field(default="N/A", description="13. Risk Tolerance")
     conversation_response: Optional[str] = Field(default=None, description="Response if input is a general conversation/question, not a BRD")
@@ -54,3 +57,27 @@ class ImpactAssessment(BaseModel):
     effort_estimation: EffortEstimation
     overall_risk: str = Field(description="High/Medium/Low risk score")
     mitigation_strategies: List[str] = Field(description="Technical mitigations for identified risks")
+    # Filled in by the service, not the model: existing components missing from the FCIS catalog
+    unverified_components: SkipJsonSchema[List[str]] = Field(default_factory=list)
+
+class FieldChange(BaseModel):
+    # List fields use added/removed; scalar fields use old/new
+    added: List[str] = Field(default_factory=list)
+    removed: List[str] = Field(default_factory=list)
+    old: Optional[str] = None
+    new: Optional[str] = None
+
+class RevisionAnalysis(BaseModel):
+    document_id: str
+    revision: int
+    analysis: AnalysisResult
+    changed_fields: Dict[str, FieldChange] = Field(default_factory=dict)
+    sections_total: int = 0
+    sections_changed: int = 0
+    blocks_total: int = 0
+    blocks_analyzed: int = 0
+
+class PipelineResult(BaseModel):
+    requirements: AnalysisResult
+    impact: ImpactAssessment
+    code: CodeGenerationResponse
@@ -0,0 +1,153 @@
+import json
+import textwrap
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from pydantic import BaseModel
+from src.core.chunking import estimate_tokens
+from src.core.metrics import REGISTRY, SIZE_BUCKETS, logger
+
+# Input-token budgets per stage (the BRD stage is normally kept under budget by chunking instead)
+DEFAULT_BUDGETS = {
+    "requirement_analysis": 24000,
+    "impact_analysis": 8000,
+    "code_generation": 8000,
+}
+
+EMPTY_MARKERS = {"", "N/A", "NA", "NONE", "NULL", "UNKNOWN", "NOT SPECIFIED"}
+
+PROMPT_TOKENS = REGISTRY.histogram("flexcube_prompt_tokens", "Estimated input tokens per prompt", ("stage",), SIZE_BUCKETS)
+PROMPT_TRIMMED = REGISTRY.counter("flexcube_prompt_trimmed_total", "Payload fields dropped or shortened to fit the budget", ("stage", "field"))
+
+
+def clean_text(text: str) -> str:
+    """Dedents and strips a triple-quoted prompt so indentation does not cost tokens."""
+    return textwrap.dedent(text).strip()
+
+
+def _strip_property_titles(node: Any) -> Any:
+    # Pydantic derives property titles from field names ("business_objective" -> "Business Objective");
+    # they add tokens and no information. Model titles (top-level and $defs) are kept.
+    if isinstance(node, dict):
+        result = {}
+        for key, value in node.items():
+            if key == "properties" and isinstance(value, dict):
+                result[key] = {
+                    name: _strip_property_titles({k: v for k, v in prop.items() if k != "title"})
+                    for name, prop in value.items()
+                }
+            else:
+                result[key] = _strip_property_titles(value)
+        return result
+    if isinstance(node, list):
+        return [_strip_property_titles(item) for item in node]
+    return node
+
+
+@lru_cache(maxsize=None)
+def compact_schema(response_model: Type[BaseModel]) -> str:
+    """Minified JSON schema for a response model, computed once per class."""
+    schema = _strip_property_titles(response_model.model_json_schema())
+    return json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+
+
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().upper() in EMPTY_MARKERS
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def prune_empty(value: Any) -> Any:
+    """Recursively drops None, empty collections and 'N/A'-style placeholders."""
+    if isinstance(value, dict):
+        pruned = {k: prune_empty(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if not _is_empty(v)}
+    if isinstance(value, list):
+        pruned = [prune_empty(v) for v in value]
+        return [v for v in pruned if not _is_empty(v)]
+    return value
+
+
+def encode_payload(data: Any) -> str:
+    """Compact JSON for embedding model data in a prompt."""
+    if isinstance(data, BaseModel):
+        data = data.model_dump(exclude_none=True)
+    return json.dumps(prune_empty(data), separators=(",", ":"), ensure_ascii=False)
+
+
+class PromptBuilder:
+    """
+    Assembles a user prompt from fixed text blocks and at most one structured payload,
+    then enforces the stage's token budget by trimming the payload in a defined order:
+      1. drop the fields listed in trim_order, in that order
+      2. halve the longest remaining list field until the prompt fits
+    Fixed text is never trimmed. `trimmed` lists what was removed.
+    """
+
+    def __init__(self, stage: str, budget_tokens: Optional[int] = None):
+        self.stage = stage
+        self.budget_tokens = budget_tokens or DEFAULT_BUDGETS.get(stage)
+        self._parts: List[Tuple[str, Any]] = []
+        self._payload: Optional[Dict[str, Any]] = None
+        self._trim_order: Sequence[str] = ()
+        self.trimmed: List[str] = []
+        self.tokens = 0
+
+    def add(self, text: str) -> "PromptBuilder":
+        self._parts.append(("text", text))
+        return self
+
+    def add_payload(self, label: str, data: Any, trim_order: Sequence[str] = ()) -> "PromptBuilder":
+        if isinstance(data, BaseModel):
+            data = data.model_dump(exclude_none=True)
+        self._payload = prune_empty(data)
+        self._trim_order = trim_order
+        self._parts.append(("payload", label))
+        return self
+
+    def _render(self) -> str:
+        blocks = []
+        for kind, value in self._parts:
+            if kind == "text":
+                blocks.append(value)
+            else:
+                blocks.append(f"<{value}>\n{json.dumps(self._payload, separators=(',', ':'), ensure_ascii=False)}\n</{value}>")
+        return "\n\n".join(blocks)
+
+    def _trim_step(self) -> bool:
+        for field in self._trim_order:
+            if field in self._payload:
+                del self._payload[field]
+                self.trimmed.append(field)
+                return True
+        lists = [(len(json.dumps(v)), k) for k, v in self._payload.items() if isinstance(v, list) and len(v) > 1]
+        if lists:
+            _, field = max(lists)
+            items = self._payload[field]
+            self._payload[field] = items[: len(items) // 2]
+            self.trimmed.append(f"{field}[{len(items) // 2}:]")
+            return True
+        return False
+
+    def build(self, record: bool = True) -> str:
+        """
+        Renders the prompt, trimming it to the budget. record=False skips the prompt metrics and the
+        trim warning, for prompts that are only compared (cache and speculation keys), never sent.
+        """
+        prompt = self._render()
+        self.tokens = estimate_tokens(prompt)
+        if self.budget_tokens and self._payload is not None:
+            while self.tokens > self.budget_tokens and self._trim_step():
+                prompt = self._render()
+                self.tokens = estimate_tokens(prompt)
+        if not record:
+            return prompt
+        for field in self.trimmed:
+            PROMPT_TRIMMED.inc(stage=self.stage, field=field.split("[")[0])
+        if self.trimmed:
+            logger.warning("%s prompt over budget (%d tokens); trimmed %s", self.stage, self.budget_tokens, self.trimmed)
+        PROMPT_TOKENS.observe(self.tokens, stage=self.stage)
+        return prompt
@@ -0,0 +1,118 @@
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate` per second, up to `capacity`.
+    reserve() always succeeds and returns how long the caller must wait; the balance may go
+    negative so concurrent callers queue up fairly behind each other.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def charge(self, amount: float) -> None:
+        """Deducts tokens after the fact (e.g. completion tokens known only from the response)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by every caller of one MistralLLM."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait_seconds = 0.0
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            self.total_requests += 1
+            self.total_tokens += estimated_tokens
+            self.total_wait_seconds += delay
+        return delay
+
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        delay = self._reserve(estimated_tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self, estimated_tokens: int = 0) -> None:
+        delay = self._reserve(estimated_tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def record_usage(self, extra_tokens: int) -> None:
+        """Charges tokens that were not part of the up-front estimate (typically the completion)."""
+        if extra_tokens <= 0:
+            return
+        if self.tokens:
+            self.tokens.charge(extra_tokens)
+        with self._lock:
+            self.total_tokens += extra_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.total_requests,
+                "tokens": self.total_tokens,
+                "wait_seconds": round(self.total_wait_seconds, 3),
+            }
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    return code
+
+
+def is_retryable(error: Exception) -> bool:
+    code = status_code_of(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    # Connection resets / timeouts from the HTTP layer carry no status code
+    return type(error).__name__ in ("ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError", "PoolTimeout")
+
+
+def retry_delay(error: Exception, attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Honours Retry-After when the server sends one, otherwise exponential backoff with full jitter."""
+    response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay) + random.uniform(0, base_delay)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
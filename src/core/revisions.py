@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+from src.core.chunking import CHARS_PER_TOKEN
+from src.core.metrics import logger
+from src.core.models import AnalysisResult
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# A block may close after a section whose fingerprint falls on this boundary pattern (~1 in BOUNDARY_EVERY)
+BOUNDARY_EVERY = 4
+# Smallest block minimum for short documents (~200 tokens), so they are not analyzed one section per call
+MIN_BLOCK_CHARS = 800
+# The block store is pruned (expired and least recently used blocks) after this many writes
+PRUNE_EVERY = 64
+
+
+def normalize_section(text: str) -> str:
+    return " ".join(text.split())
+
+
+def fingerprint(text: str) -> str:
+    """Content hash of a section; whitespace-only edits (reflowed lines, trailing spaces) do not change it."""
+    return hashlib.sha256(normalize_section(text).encode("utf-8")).hexdigest()
+
+
+def _block_minimum(total_chars: int, max_chars: int) -> int:
+    # A quarter of the document, rounded down to a power of two so that ordinary edits do not move it
+    # (and with it every boundary); capped at a quarter of the budget for long documents
+    quarter = max(total_chars // 4, 1)
+    return max(MIN_BLOCK_CHARS, min(max_chars // 4, 1 << (quarter.bit_length() - 1)))
+
+
+def group_sections(fingerprints: Sequence[str], sizes: Sequence[int], max_tokens: int) -> List[List[int]]:
+    """
+    Groups consecutive sections (by index) into analysis blocks of at most ~max_tokens.
+    Boundaries are content-defined: once a block holds its minimum size (a quarter of the budget, or
+    of a short document), it closes after any section whose fingerprint hits the boundary pattern,
+    and always before it would overflow. An edited section therefore only changes its own block
+    (and at most the next one) instead of shifting every later boundary, as fixed-size packing would.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    min_chars = _block_minimum(sum(sizes), max_chars)
+    blocks: List[List[int]] = []
+    current: List[int] = []
+    chars = 0
+    for i, (fp, size) in enumerate(zip(fingerprints, sizes)):
+        if current and chars + size > max_chars:
+            blocks.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += size
+        if chars >= min_chars and int(fp[:8], 16) % BOUNDARY_EVERY == 0:
+            blocks.append(current)
+            current, chars = [], 0
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def block_key(salt: str, section_fingerprints: Sequence[str]) -> str:
+    """Identity of a block's extraction: the analysis configuration (model, prompt, schema) + its sections."""
+    return hashlib.sha256("\x1f".join([salt, *section_fingerprints]).encode("utf-8")).hexdigest()
+
+
+class RevisionStore:
+    """
+    File-backed state for incremental re-analysis:
+      blocks/<key>.json           extraction result of one block of sections
+      documents/<sha256(id)>.json latest revision of a document (section fingerprints, blocks, merged result)
+    Writes go through a temp file + os.replace, like the job store. Blocks expire after ttl_seconds
+    and at most max_blocks are kept (least recently used go first); an evicted block is simply
+    re-analyzed the next time a revision needs it.
+    """
+
+    def __init__(self, root: str, ttl_seconds: Optional[float] = 30 * 24 * 3600, max_blocks: int = 20000):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_blocks = max_blocks
+        self._lock = threading.Lock()
+        self._document_locks: Dict[str, List[Any]] = {}  # document_id -> [lock, holders and waiters]
+        self._writes = 0
+        os.makedirs(os.path.join(root, "blocks"), exist_ok=True)
+        os.makedirs(os.path.join(root, "documents"), exist_ok=True)
+        self.prune()
+
+    @classmethod
+    def from_env(cls) -> "RevisionStore":
+        ttl = float(os.environ.get("FLEXCUBE_REVISIONS_TTL", 30 * 24 * 3600))
+        return cls(
+            os.environ.get("FLEXCUBE_REVISIONS_DIR", ".revisions"),
+            ttl_seconds=ttl if ttl > 0 else None,
+            max_blocks=int(os.environ.get("FLEXCUBE_REVISIONS_MAX_BLOCKS", 20000)),
+        )
+
+    def _write(self, path: str, content: str) -> None:
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _block_path(self, key: str) -> str:
+        return os.path.join(self.root, "blocks", f"{key}.json")
+
+    def _document_path(self, document_id: str) -> str:
+        name = hashlib.sha256(document_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "documents", f"{name}.json")
+
+    def _expired(self, mtime: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - mtime > self.ttl_seconds
+
+    def get_block(self, key: str) -> Optional[AnalysisResult]:
+        path = self._block_path(key)
+        try:
+            now = time.time()
+            if self._expired(os.path.getmtime(path), now):
+                return None
+            # The modification time doubles as last access time for LRU eviction
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            return None
+        raw = self._read(path)
+        return AnalysisResult.model_validate_json(raw) if raw is not None else None
+
+    def put_block(self, key: str, result: AnalysisResult) -> None:
+        self._write(self._block_path(key), result.model_dump_json())
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Deletes expired blocks, then the least recently used ones beyond max_blocks. Returns the number deleted."""
+        directory = os.path.join(self.root, "blocks")
+        now = time.time()
+        blocks = []
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                blocks.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        blocks.sort()
+        expired = [path for mtime, path in blocks if self._expired(mtime, now)]
+        live = [path for mtime, path in blocks if not self._expired(mtime, now)]
+        doomed = expired + live[:max(0, len(live) - self.max_blocks)]
+        for path in doomed:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        if doomed:
+            logger.info("Pruned %d revision block(s) from %s", len(doomed), directory)
+        return len(doomed)
+
+    @contextmanager
+    def document_lock(self, document_id: str):
+        """
+        Serializes read-modify-write of one document's record: a lock per document within the process,
+        plus an flock on documents/<sha256(id)>.lock across workers where fcntl is available.
+        Both are dropped when the last holder is done, so neither the lock table nor the lock files grow.
+        """
+        with self._lock:
+            entry = self._document_locks.setdefault(document_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if fcntl is None:
+                    yield
+                else:
+                    with self._file_lock(self._document_path(document_id)[:-len(".json")] + ".lock"):
+                        yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._document_locks[document_id]
+
+    @contextmanager
+    def _file_lock(self, path: str):
+        while True:
+            f = open(path, "a")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # The previous holder may have deleted the file while we waited; then lock a fresh one
+                if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        try:
+            yield
+        finally:
+            # Deleted while still locked, so a waiter on this file sees it gone and retries
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._read(self._document_path(document_id))
+        return json.loads(raw) if raw is not None else None
+
+    def put_document(self, document_id: str, record: Dict[str, Any]) -> None:
+        self._write(self._document_path(document_id), json.dumps({"document_id": document_id, **record}))
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+from typing import Any, Dict, NamedTuple, Optional
+from src.core.chunking import is_heading
+from src.core.metrics import REGISTRY, logger, record_span
+
+CONVERSATIONAL = "conversational"
+DOCUMENT = "document"
+UNCERTAIN = "uncertain"
+
+# Vocabulary that shows up in BRDs/CRs but rarely in small talk
+DOCUMENT_KEYWORDS = (
+    "requirement", "shall", "must", "scope", "objective", "brd", "change request", "acceptance criteria",
+    "business rule", "stakeholder", "regulatory", "compliance", "workflow", "interface", "validation",
+    "fund", "investor", "unit holder", "transaction", "subscription", "redemption", "nav", "fee",
+    "table", "screen", "report", "field", "batch", "eod", "audit", "sla", "approval", "maker", "checker",
+)
+GREETINGS = ("hi", "hello", "hey", "thanks", "thank you", "good morning", "good afternoon", "good evening", "who are you")
+
+_WORD = re.compile(r"\w+")
+_KEYWORDS = re.compile(r"\b(" + "|".join(re.escape(k) for k in DOCUMENT_KEYWORDS) + r")s?\b")
+_GREETING = re.compile(r"^\W*(" + "|".join(re.escape(g) for g in GREETINGS) + r")\b")
+_BULLET = re.compile(r"^\s*([-*•]|\d+[.)]|[a-z][.)])\s+")
+
+ROUTING_DECISIONS = REGISTRY.counter("flexcube_routing_decisions_total", "Input classification results", ("route", "method"))
+
+CLASSIFIER_PROMPT = """Classify the user input below. Reply with exactly one word:
+DOCUMENT if it is (part of) a business requirement document, change request or feature specification,
+CONVERSATION if it is a greeting, a general question or chit-chat.
+
+<input>
+{text}
+</input>"""
+
+
+class RoutingDecision(NamedTuple):
+    route: str
+    method: str
+    reason: str
+    features: Dict[str, Any]
+
+
+def input_features(text: str) -> Dict[str, Any]:
+    lowered = text.lower()
+    lines = [line for line in text.splitlines() if line.strip()]
+    words = _WORD.findall(lowered)
+    return {
+        "chars": len(text),
+        "words": len(words),
+        "lines": len(lines),
+        "headings": sum(1 for line in lines if is_heading(line)),
+        "bullets": sum(1 for line in lines if _BULLET.match(line)),
+        "keywords": len({m.group(1) for m in _KEYWORDS.finditer(lowered)}),
+        "question": text.rstrip().endswith("?"),
+        "greeting": bool(_GREETING.match(lowered)),
+    }
+
+
+class InputRouter:
+    """
+    Decides whether input is conversational or a BRD/CR before the large model sees it.
+    The heuristic is cheap and conservative: anything it is unsure about goes to the large
+    structured path, unless a small classifier model is configured to break the tie.
+    """
+
+    def __init__(self, classifier_llm=None, max_chat_words: int = 40, min_document_words: int = 150):
+        self.classifier_llm = classifier_llm
+        self.max_chat_words = max_chat_words
+        self.min_document_words = min_document_words
+
+    @classmethod
+    def from_env(cls, classifier_llm=None) -> Optional["InputRouter"]:
+        """FLEXCUBE_ROUTING=off disables routing; FLEXCUBE_ROUTING_CLASSIFIER=1 enables the model tie-breaker."""
+        if os.environ.get("FLEXCUBE_ROUTING", "on").lower() in ("0", "off", "false", "no"):
+            return None
+        use_classifier = os.environ.get("FLEXCUBE_ROUTING_CLASSIFIER", "").lower() in ("1", "true", "yes", "on")
+        return cls(
+            classifier_llm=classifier_llm if use_classifier else None,
+            max_chat_words=int(os.environ.get("FLEXCUBE_ROUTING_MAX_CHAT_WORDS", 40)),
+            min_document_words=int(os.environ.get("FLEXCUBE_ROUTING_MIN_DOCUMENT_WORDS", 150)),
+        )
+
+    def classify(self, text: str) -> RoutingDecision:
+        f = input_features(text)
+        if f["words"] == 0:
+            return RoutingDecision(CONVERSATIONAL, "heuristic", "empty input", f)
+        if f["words"] >= self.min_document_words:
+            return RoutingDecision(DOCUMENT, "heuristic", "long input", f)
+        if f["headings"] >= 2 or f["bullets"] >= 3 or f["keywords"] >= 3:
+            return RoutingDecision(DOCUMENT, "heuristic", "document structure or vocabulary", f)
+        # Only a greeting or a question makes short input conversational; a terse instruction
+        # ("Enable capital calls on committed capital") is still a requirement
+        if f["words"] <= self.max_chat_words and f["lines"] <= 2 and f["keywords"] == 0 and (f["greeting"] or f["question"]):
+            return RoutingDecision(CONVERSATIONAL, "heuristic", "short greeting or question without requirement vocabulary", f)
+        return RoutingDecision(UNCERTAIN, "heuristic", "no strong signal", f)
+
+    def _from_classifier(self, decision: RoutingDecision, answer: str) -> RoutingDecision:
+        route = CONVERSATIONAL if "CONVERSATION" in answer.upper() else DOCUMENT
+        return decision._replace(route=route, method="classifier", reason=f"classifier answered {answer.strip()[:20]!r}")
+
+    def route(self, text: str) -> RoutingDecision:
+        decision = self.classify(text)
+        if decision.route == UNCERTAIN and self.classifier_llm is not None:
+            decision = self._from_classifier(decision, self.classifier_llm.generate_text(CLASSIFIER_PROMPT.format(text=text[:2000])))
+        return self._log(decision)
+
+    async def aroute(self, text: str) -> RoutingDecision:
+        decision = self.classify(text)
+        if decision.route == UNCERTAIN and self.classifier_llm is not None:
+            answer = await self.classifier_llm.agenerate_text(CLASSIFIER_PROMPT.format(text=text[:2000]))
+            decision = self._from_classifier(decision, answer)
+        return self._log(decision)
+
+    def _log(self, decision: RoutingDecision) -> RoutingDecision:
+        # Uncertain inputs take the large path, which can still answer conversationally
+        if decision.route == UNCERTAIN:
+            decision = decision._replace(route=DOCUMENT, reason=f"{decision.reason}; defaulting to document")
+        ROUTING_DECISIONS.inc(route=decision.route, method=decision.method)
+        record_span("routing", 0.0, route=decision.route, method=decision.method)
+        logger.info("routing %s", json.dumps({
+            "route": decision.route, "method": decision.method, "reason": decision.reason, **decision.features,
+        }))
+        return decision
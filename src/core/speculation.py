@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence
+from pydantic import BaseModel
+from src.core.metrics import REGISTRY, logger
+
+SPECULATION = REGISTRY.counter("flexcube_speculation_total", "Speculative stage runs by outcome", ("stage", "outcome"))
+
+
+class Speculation:
+    """
+    A downstream stage started on a partial upstream result while the upstream stage is still streaming.
+    - offer() receives upstream fields as they close; the run starts once every `ready` field is in.
+    - `key` maps an input to everything the stage sends the LLM (its prompt). A later field that changes
+      the key of the current input cancels the run and starts over on the new input (at most
+      max_restarts times; after that the final result decides).
+    - resolve(final) keeps the run only when key(final) equals the key it was started with, i.e. when it
+      sent exactly what a sequential run on `final` would send; otherwise it cancels it and runs the
+      stage on `final`.
+    """
+
+    def __init__(self, stage: str, run: Callable[[BaseModel], Awaitable[Any]], build: Callable[[Dict[str, Any]], BaseModel],
+                 ready: Sequence[str], key: Callable[[BaseModel], Hashable], max_restarts: int = 2):
+        self.stage = stage
+        self.run = run
+        self.build = build
+        self.ready = ready
+        self.key = key
+        self.max_restarts = max_restarts
+        self.fields: Dict[str, Any] = {}
+        self.input_key: Optional[Hashable] = None
+        self.task: Optional[asyncio.Task] = None
+        self.restarts = 0
+
+    def _start(self, value: BaseModel, key: Hashable) -> None:
+        self.cancel()
+        self.input_key = key
+        self.task = asyncio.ensure_future(self.run(value))
+        # Retrieve the outcome of abandoned runs so they are never reported as unhandled
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def offer(self, name: str, value: Any) -> None:
+        self.fields[name] = value
+        if self.task is None:
+            if all(field in self.fields for field in self.ready):
+                SPECULATION.inc(stage=self.stage, outcome="started")
+                candidate = self.build(self.fields)
+                self._start(candidate, self.key(candidate))
+            return
+        if self.restarts < self.max_restarts:
+            candidate = self.build(self.fields)
+            key = self.key(candidate)
+            if key != self.input_key:
+                self.restarts += 1
+                SPECULATION.inc(stage=self.stage, outcome="restarted")
+                logger.info("Restarting speculative %s: %s changed its input", self.stage, name)
+                self._start(candidate, key)
+
+    async def resolve(self, final: BaseModel) -> Any:
+        key = self.key(final)
+        if self.task is not None and key == self.input_key:
+            try:
+                result = await self.task
+                SPECULATION.inc(stage=self.stage, outcome="kept")
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Speculative %s failed (%s); running it on the final input", self.stage, e)
+                SPECULATION.inc(stage=self.stage, outcome="failed")
+        elif self.task is not None:
+            SPECULATION.inc(stage=self.stage, outcome="discarded")
+            logger.info("Discarding speculative %s: it was started on a different input", self.stage)
+        self._start(final, key)
+        return await self.task
+
+    def reset(self) -> None:
+        """Forgets the upstream fields, e.g. because the upstream run itself was restarted."""
+        self.cancel()
+        self.fields = {}
+        self.input_key = None
+        self.restarts = 0
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.task = None
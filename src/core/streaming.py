@@ -0,0 +1,178 @@
+import json
+from typing import Any, AsyncIterator, Callable, List, Tuple
+
+Path = Tuple[Any, ...]
+
+
+class _Frame:
+    __slots__ = ("kind", "cur", "expect", "captured")
+
+    def __init__(self, kind: str, captured: bool):
+        self.kind = kind            # "{" or "["
+        self.cur = 0 if kind == "[" else None
+        self.expect = "value" if kind == "[" else "key"
+        self.captured = captured    # whether this container's own text is being captured
+
+
+class JsonStreamParser:
+    """
+    Incremental JSON scanner for LLM output that arrives in pieces.
+    feed() returns (path, value) for every value whose path satisfies `want` as soon as it closes,
+    e.g. ("files", 3) for the 4th element of the top-level "files" array.
+    Only text belonging to a wanted value is buffered; everything else is discarded as it is scanned.
+    Leading prose or markdown fences before the first '{' / '[' are skipped.
+    """
+
+    def __init__(self, want: Callable[[Path], bool]):
+        self.want = want
+        self.done = False
+        self._started = False
+        self._stack: List[_Frame] = []
+        self._buf: List[str] = []
+        self._captures: List[Tuple[Path, int]] = []
+
+        self._in_string = False
+        self._string_role = None    # "key" or "value"
+        self._string_captured = False
+        self._escape = False
+        self._key: List[str] = []
+
+        self._in_scalar = False
+        self._scalar_captured = False
+
+    def _path(self) -> Path:
+        return tuple(frame.cur for frame in self._stack)
+
+    def _begin_capture(self, path: Path) -> bool:
+        if path and self.want(path):
+            self._captures.append((path, len(self._buf)))
+            return True
+        return False
+
+    def _end_capture(self, events: list) -> None:
+        path, start = self._captures.pop()
+        text = "".join(self._buf[start:])
+        events.append((path, json.loads(text)))
+        if not self._captures:
+            self._buf.clear()
+
+    def _value_done(self) -> None:
+        if self._stack:
+            self._stack[-1].expect = "comma"
+        else:
+            self.done = True
+
+    def _finish_scalar(self, events: list) -> None:
+        self._in_scalar = False
+        if self._scalar_captured:
+            self._end_capture(events)
+        self._value_done()
+
+    def _begin_value(self, ch: str) -> None:
+        captured = self._begin_capture(self._path())
+        if ch in "{[":
+            self._stack.append(_Frame(ch, captured))
+        elif ch == '"':
+            self._in_string = True
+            self._string_role = "value"
+            self._string_captured = captured
+        else:
+            self._in_scalar = True
+            self._scalar_captured = captured
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        events: List[Tuple[Path, Any]] = []
+        for ch in chunk:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._captures:
+                    self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                    if self._string_role == "key":
+                        self._key.append("\\" + ch)
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_role == "key":
+                        frame = self._stack[-1]
+                        frame.cur = json.loads('"' + "".join(self._key) + '"')
+                        frame.expect = "colon"
+                        self._key = []
+                    else:
+                        if self._string_captured:
+                            self._end_capture(events)
+                        self._value_done()
+                elif self._string_role == "key":
+                    self._key.append(ch)
+                continue
+
+            if self._in_scalar:
+                if ch in ",}] \t\r\n":
+                    self._finish_scalar(events)
+                else:
+                    if self._captures:
+                        self._buf.append(ch)
+                    continue
+
+            if not self._started:
+                if ch in "{[":
+                    self._started = True
+                    self._begin_value(ch)
+                continue
+
+            if ch in " \t\r\n":
+                if self._captures:
+                    self._buf.append(ch)
+                continue
+
+            frame = self._stack[-1] if self._stack else None
+            if frame is None:
+                self.done = True
+                break
+
+            if ch in "}]":
+                if self._captures:
+                    self._buf.append(ch)
+                self._stack.pop()
+                if frame.captured:
+                    self._end_capture(events)
+                self._value_done()
+            elif ch == ",":
+                if self._captures:
+                    self._buf.append(ch)
+                if frame.kind == "[":
+                    frame.cur += 1
+                    frame.expect = "value"
+                else:
+                    frame.expect = "key"
+            elif ch == ":":
+                if self._captures:
+                    self._buf.append(ch)
+                frame.expect = "value"
+            elif frame.kind == "{" and frame.expect == "key" and ch == '"':
+                if self._captures:
+                    self._buf.append(ch)
+                self._in_string = True
+                self._string_role = "key"
+            else:
+                self._begin_value(ch)
+                if self._captures:
+                    self._buf.append(ch)
+        return events
+
+
+async def astream_fields(chunks: AsyncIterator[str]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Yields (name, value) for each top-level field of a streamed JSON object as soon as it closes.
+    Raises ValueError if a value is not valid JSON or the stream ends before the object is closed.
+    """
+    parser = JsonStreamParser(lambda path: len(path) == 1)
+    async for chunk in chunks:
+        for path, value in parser.feed(chunk):
+            yield path[0], value
+    if not parser.done:
+        raise ValueError("Stream ended before the JSON object was complete")
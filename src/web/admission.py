@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from fastapi import HTTPException
+from src.core.llm import llm_lane
+from src.core.metrics import REGISTRY, LATENCY_BUCKETS, logger
+
+# Highest priority first; a free slot always goes to the first non-empty lane
+LANES = ("interactive", "batch")
+DEFAULT_LANE = "interactive"
+
+ADMISSION = REGISTRY.counter("flexcube_admission_total", "Admission decisions", ("lane", "outcome"))
+ADMISSION_WAIT = REGISTRY.histogram("flexcube_admission_wait_seconds", "Time spent queued for an LLM slot", ("lane",), LATENCY_BUCKETS)
+ADMISSION_ACTIVE = REGISTRY.gauge("flexcube_admission_active", "LLM calls holding a slot")
+ADMISSION_QUEUED = REGISTRY.gauge("flexcube_admission_queued", "LLM calls waiting for a slot", ("lane",))
+
+
+class Overloaded(HTTPException):
+    """429 with a Retry-After hint; raised when a lane's queue is full."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail=f"Server busy ({lane} queue full); retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def lane_from_header(priority: Optional[str]) -> str:
+    lane = (priority or DEFAULT_LANE).strip().lower()
+    return lane if lane in LANES else DEFAULT_LANE
+
+
+def request_key(route: str, body: str, *extra: Any) -> str:
+    """Identity of a request for coalescing: route + canonical body + options that change the result."""
+    raw = "\x1f".join([route, body, *map(str, extra)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AdmissionController:
+    """
+    Per-worker gate on LLM calls, shared by every MistralLLM of the worker (sync and async callers).
+    - At most max_concurrency LLM calls are in flight at once, however many a request fans out to
+      (chunked analysis, code partitions, revision blocks, speculative pipeline stages, background jobs).
+    - Other calls wait in a FIFO queue per lane; interactive is always served before batch.
+      The lane of a call is the llm_lane of its context, set per request from X-Priority.
+    - When a lane already has max_queue waiters, new requests are shed with 429 + Retry-After.
+    - Identical concurrent requests (same key) share one in-flight call, which is cancelled
+      once the last request waiting for it goes away.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        # Waiters are concurrent futures so threads (sync calls) and the event loop can share one queue
+        self._queues: Dict[str, Deque[Future]] = {lane: deque() for lane in LANES}
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._service_seconds = 5.0  # moving average of slot hold time, for Retry-After
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=int(os.environ.get("FLEXCUBE_MAX_CONCURRENCY", 8)),
+            max_queue=int(os.environ.get("FLEXCUBE_MAX_QUEUE", 32)),
+        )
+
+    def _retry_after(self) -> int:
+        queued = sum(len(q) for q in self._queues.values())
+        waves = (queued + self._active) / max(self.max_concurrency, 1)
+        return max(1, int(waves * self._service_seconds + 0.999))
+
+    def check(self, lane: str) -> None:
+        """Raises Overloaded if a request on this lane would be shed right now."""
+        if self._active >= self.max_concurrency and len(self._queues[lane]) >= self.max_queue:
+            ADMISSION.inc(lane=lane, outcome="rejected")
+            retry_after = self._retry_after()
+            logger.warning("Shedding %s request: %d active, %d queued", lane, self._active, len(self._queues[lane]))
+            raise Overloaded(lane, retry_after)
+
+    def _grant_next(self) -> None:
+        # Caller holds self._lock
+        while self._active < self.max_concurrency:
+            waiter = next((q.popleft() for q in self._queues.values() if q), None)
+            if waiter is None:
+                return
+            # False if the waiter was cancelled; once running it can no longer be cancelled
+            if waiter.set_running_or_notify_cancel():
+                self._active += 1
+                waiter.set_result(None)
+
+    def _update_gauges(self) -> None:
+        ADMISSION_ACTIVE.set(self._active)
+        for lane, queue in self._queues.items():
+            ADMISSION_QUEUED.set(len(queue), lane=lane)
+
+    def _enter(self, lane: str) -> Optional[Future]:
+        """Takes a slot right away (returns None) or enqueues and returns the waiter to block on."""
+        lane = lane if lane in self._queues else DEFAULT_LANE
+        with self._lock:
+            if self._active < self.max_concurrency and not any(self._queues.values()):
+                self._active += 1
+                ADMISSION.inc(lane=lane, outcome="admitted")
+                self._update_gauges()
+                return None
+            waiter: Future = Future()
+            self._queues[lane].append(waiter)
+            ADMISSION.inc(lane=lane, outcome="queued")
+            self._grant_next()
+            self._update_gauges()
+            return waiter
+
+    def _abandon(self, lane: str, waiter: Future) -> None:
+        with self._lock:
+            if waiter.cancel():
+                queue = self._queues[lane if lane in self._queues else DEFAULT_LANE]
+                if waiter in queue:
+                    queue.remove(waiter)
+            else:
+                self._active -= 1  # slot was granted just as we gave up; pass it on
+                self._grant_next()
+            self._update_gauges()
+
+    def _exit(self, held_seconds: float) -> None:
+        with self._lock:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+            self._active -= 1
+            self._grant_next()
+            self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, lane: str = DEFAULT_LANE):
+        """Holds one LLM slot for the duration of the block (async callers), queueing as needed."""
+        started = time.perf_counter()
+        waiter = self._enter(lane)
+        if waiter is not None:
+            try:
+                await asyncio.wrap_future(waiter)
+            except asyncio.CancelledError:
+                self._abandon(lane, waiter)
+                raise
+        ADMISSION_WAIT.observe(time.perf_counter() - started, lane=lane)
+        held_since = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._exit(time.perf_counter() - held_since)
+
+    @contextmanager
+    def hold(self, lane: str = DEFAULT_LANE):
+        """Blocking variant of slot() for sync callers on worker threads (background jobs, thread pools)."""
+        started = time.perf_counter()
+        waiter = self._enter(lane)
+        if waiter is not None:
+            try:
+                waiter.result()
+            except BaseException:
+                self._abandon(lane, waiter)
+                raise
+        ADMISSION_WAIT.observe(time.perf_counter() - started, lane=lane)
+        held_since = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._exit(time.perf_counter() - held_since)
+
+    async def run(self, key: str, lane: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs call() with its LLM calls on `lane`, or joins an identical call already in flight.
+        The shared task is shielded, so one waiter disconnecting does not cancel it for the others;
+        it is cancelled when the last one goes.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            ADMISSION.inc(lane=lane, outcome="coalesced")
+        else:
+            self.check(lane)
+
+            async def leader():
+                llm_lane.set(lane)
+                try:
+                    return await call()
+                finally:
+                    self._inflight.pop(key, None)
+
+            task = asyncio.ensure_future(leader())
+            # Retrieve the outcome even if every waiter has gone away, so it is never reported as unhandled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    logger.info("Cancelling shared call %s: no request is waiting for it", key[:12])
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": {lane: len(q) for lane, q in self._queues.items()},
+            "inflight_keys": len(self._inflight),
+            "avg_service_seconds": round(self._service_seconds, 3),
+        }
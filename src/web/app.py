@@ -1,81 +1,380 @@
 import os
 import sys
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import logging
+from typing import Dict, Tuple
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Header, Request
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from src.core.llm import MistralLLM
-from src.agents.requirement_analysis import RequirementAnalysisAgent
-from src.agents.impact_analysis import ImpactAnalysisAgent
-from src.core.models import AnalysisResult, ImpactAssessment
-from src.agents.code_generation import CodeGenerationAgent
-from src.core.models import AnalysisResult, ImpactAssessment, CodeGenerationResponse
-
-app = FastAPI(title="Flexcube Copilot")
-
-# Initialize Agents (Global for now, assuming stateless)
-api_key = os.environ.get("MISTRAL_API_KEY")
-if not api_key:
-    print("WARNING: MISTRAL_API_KEY not found. Operations might fail or mock.", file=sys.stderr)
-
-# Helper to get agents (simulating dependency injection)
-def get_agents():
-    llm = MistralLLM() # Falls back to mock/error inside if no key
-    req_agent = RequirementAnalysisAgent(llm)
-    impact_agent = ImpactAnalysisAgent(llm)
-    code_agent = CodeGenerationAgent(llm)
-    return req_agent, impact_agent, code_agent
+from src.core.extraction import UnsupportedDocumentError
+from src.core.jobs import TERMINAL_STATUSES, NO_CODE, JobRunningError, arun_pipelined, conversational_impact, needs_code
+from src.core.llm import llm_lane
+from src.web.responses import ModelJSONResponse
+from src.web.uploads import receive_upload
+from src.web.services import Services
+from src.web.admission import lane_from_header, request_key
+from src.core.metrics import REGISTRY, HTTP_REQUEST_SECONDS, logger, start_trace, detach_trace, emit_trace
+from src.core.models import AnalysisResult, ImpactAssessment, CodeGenerationResponse, FieldChange, RevisionAnalysis, PipelineResult
+
+# Structured logs (incl. one JSON trace line per API request) go to stderr
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get("FLEXCUBE_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+def use_cache_from_header(cache_control: str = None) -> bool:
+    return not (cache_control and "no-cache" in cache_control.lower())
+
+async def instrument_requests(request: Request, call_next):
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    started = time.perf_counter()
+    token = start_trace(method=request.method, path=request.url.path)
+
+    def finish(trace, status: int) -> None:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", request.url.path)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route_path, status=status)
+        emit_trace(trace, status=status)
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish(detach_trace(token), 500)
+        raise
+    trace = detach_trace(token)
+    body = getattr(response, "body_iterator", None)
+    if body is None:
+        finish(trace, response.status_code)
+        return response
+
+    # The request is only done once its body is sent: a StreamingResponse does its work while
+    # streaming, long after call_next returned
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(trace, response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
+
+def get_services(request: Request) -> Services:
+    """Singletons built by the lifespan; 503 if the app has not finished starting."""
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        raise HTTPException(status_code=503, detail="Service is starting")
+    return services
+
+def require_text(text: str) -> str:
+    """400 for blank input, which would otherwise reach the LLM as an empty message."""
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
+    return text
 
 class TextRequest(BaseModel):
     text: str
 
-@app.post("/api/analyze/requirements", response_model=AnalysisResult)
-async def analyze_requirements(request: TextRequest):
-    req_agent, _ = get_agents()
+class RevisionRequest(BaseModel):
+    document_id: str
+    text: str
+
+class ImpactDeltaRequest(BaseModel):
+    previous: ImpactAssessment
+    changed_fields: Dict[str, FieldChange]
+
+router = APIRouter()
+
+@router.post("/api/analyze/requirements", response_model=AnalysisResult)
+async def analyze_requirements(request: TextRequest, cache_control: str = Header(default=None),
+                               x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    require_text(request.text)
+    req_agent = services.req_agent
+    use_cache = use_cache_from_header(cache_control)
     try:
-        result = req_agent.analyze(request.text)
-        return result
+        key = request_key("requirements", request.text, use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority), lambda: req_agent.aanalyze(request.text, use_cache=use_cache))
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"WEB ERROR: {e}", file=sys.stderr)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/analyze/impact", response_model=ImpactAssessment)
-async def analyze_impact(requirements: AnalysisResult):
-    _, impact_agent = get_agents()
+async def extract_upload(request: Request, services: Services) -> Tuple[str, Dict[str, str]]:
+    """Streams the uploaded `file` to disk, extracts its text in the process pool and deletes it."""
+    upload = await receive_upload(request)
+    try:
+        text = await services.document_extractor.aextract(upload.path, upload.filename)
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    finally:
+        os.unlink(upload.path)
+    if not text.strip():
+        raise HTTPException(status_code=422, detail=f"No text could be extracted from {upload.filename}")
+    return text, upload.fields
+
+@router.post("/api/analyze/requirements/upload")
+async def analyze_requirements_upload(request: Request, cache_control: str = Header(default=None),
+                                      x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    """
+    multipart/form-data with a `file` (.txt/.md/.docx/.pdf). Returns an AnalysisResult, or a
+    RevisionAnalysis when a `document_id` field is sent (incremental re-analysis of a revised BRD).
+    """
+    text, fields = await extract_upload(request, services)
+    document_id = fields.get("document_id")
+    req_agent = services.req_agent
+    use_cache = use_cache_from_header(cache_control)
+    try:
+        if document_id:
+            key = request_key("revision", document_id, text, use_cache)
+            call = lambda: req_agent.aanalyze_revision(document_id, text, use_cache=use_cache)
+        else:
+            key = request_key("requirements", text, use_cache)
+            call = lambda: req_agent.aanalyze(text, use_cache=use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority), call)
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/analyze/impact", response_model=ImpactAssessment)
+async def analyze_impact(requirements: AnalysisResult, cache_control: str = Header(default=None),
+                         x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    impact_agent = services.impact_agent
     try:
         # Check for conversation response bypass
         if requirements.conversation_response:
-             from src.core.models import ImpactAssessment, EffortEstimation
-             return ImpactAssessment(
-                affected_components=[], schema_changes=[], code_changes=[], 
-                effort_estimation=EffortEstimation(complexity="N/A", person_days=0, justification="Conversational Input"),
-                overall_risk="Low", mitigation_strategies=[]
-            )
-
-        result = impact_agent.assess(requirements)
-        return result
+            return ModelJSONResponse(conversational_impact())
+
+        use_cache = use_cache_from_header(cache_control)
+        key = request_key("impact", requirements.model_dump_json(), use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority), lambda: impact_agent.aassess(requirements, use_cache=use_cache))
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/analyze/requirements/revision", response_model=RevisionAnalysis)
+async def analyze_requirements_revision(request: RevisionRequest, cache_control: str = Header(default=None),
+                                        x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    """Re-analyzes only the sections of document_id that changed since its last revision."""
+    require_text(request.text)
+    req_agent = services.req_agent
+    use_cache = use_cache_from_header(cache_control)
+    try:
+        key = request_key("revision", request.model_dump_json(), use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority),
+                                     lambda: req_agent.aanalyze_revision(request.document_id, request.text, use_cache=use_cache))
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/analyze/impact/delta", response_model=ImpactAssessment)
+async def analyze_impact_delta(request: ImpactDeltaRequest, cache_control: str = Header(default=None),
+                               x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    """Updates a previous impact assessment for the changed_fields of a requirements revision."""
+    impact_agent = services.impact_agent
+    use_cache = use_cache_from_header(cache_control)
+    try:
+        key = request_key("impact_delta", request.model_dump_json(), use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority),
+                                     lambda: impact_agent.areassess(request.previous, request.changed_fields, use_cache=use_cache))
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"WEB ERROR: {e}", file=sys.stderr)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate/code", response_model=CodeGenerationResponse)
-async def generate_code(impact: ImpactAssessment):
-    _, _, code_agent = get_agents()
+@router.post("/api/generate/code", response_model=CodeGenerationResponse)
+async def generate_code(impact: ImpactAssessment, cache_control: str = Header(default=None),
+                        x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    code_agent = services.code_agent
     try:
         # Check for conversational bypass
-        if not impact.affected_components and impact.effort_estimation.complexity == "N/A":
-             return CodeGenerationResponse(files=[], summary="No code needed for conversational input.")
-             
-        result = code_agent.generate(impact)
-        return result
+        if not needs_code(impact):
+            return ModelJSONResponse(CodeGenerationResponse(files=[], summary=NO_CODE))
+
+        use_cache = use_cache_from_header(cache_control)
+        key = request_key("code", impact.model_dump_json(), use_cache)
+        result = await services.admission.run(key, lane_from_header(x_priority), lambda: code_agent.agenerate(impact, use_cache=use_cache))
+        return ModelJSONResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+@router.post("/api/generate/code/stream")
+async def generate_code_stream(impact: ImpactAssessment, cache_control: str = Header(default=None),
+                               x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    """
+    Server-sent events: one `file` event per GeneratedFile as soon as it is complete,
+    then a final `summary` event (or an `error` event if generation fails midway).
+    Streams are not coalesced, but their LLM calls go through the admission gate on the request's lane.
+    """
+    code_agent = services.code_agent
+    lane = lane_from_header(x_priority)
+    services.admission.check(lane)  # shed with 429 before the stream starts
+
+    async def events():
+        file_count = 0
+        summary = None
+        # Check for conversational bypass
+        if not needs_code(impact):
+            summary = NO_CODE
+        else:
+            llm_lane.set(lane)
+            try:
+                async for kind, value in code_agent.astream(impact, use_cache=use_cache_from_header(cache_control)):
+                    if kind == "file":
+                        file_count += 1
+                        yield sse_event("file", value.model_dump_json())
+                    else:
+                        summary = value
+            except Exception as e:
+                logger.exception("Streaming code generation failed")
+                yield sse_event("error", json.dumps({"detail": str(e)}))
+                return
+        yield sse_event("summary", json.dumps({"summary": summary or "", "file_count": file_count}))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/api/pipeline/run", response_model=PipelineResult)
+async def run_pipeline(request: TextRequest, cache_control: str = Header(default=None),
+                       x_priority: str = Header(default=None), services: Services = Depends(get_services)):
+    """
+    Full BRD -> requirements -> impact -> code flow in one request, with the stages pipelined:
+    each downstream stage starts speculatively from the streamed fields of the one before it.
+    """
+    require_text(request.text)
+    req_agent, impact_agent, code_agent = services.agents()
+    use_cache = use_cache_from_header(cache_control)
+
+    async def call() -> PipelineResult:
+        requirements, impact, code = await arun_pipelined(req_agent, impact_agent, code_agent, request.text, use_cache=use_cache)
+        return PipelineResult(requirements=requirements, impact=impact, code=code)
+
+    try:
+        key = request_key("pipeline", request.text, use_cache)
+        return ModelJSONResponse(await services.admission.run(key, lane_from_header(x_priority), call))
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"WEB ERROR: {e}", file=sys.stderr)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Serve static files (Frontend) - Catch-all must be last
-app.mount("/", StaticFiles(directory="src/web/static", html=True), name="static")
+def get_job_or_404(services: Services, job_id: str):
+    if not services.pipeline_jobs.store.exists(job_id):
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+@router.post("/api/pipeline", status_code=202)
+async def create_pipeline_job(request: TextRequest, services: Services = Depends(get_services)):
+    state = services.pipeline_jobs.submit(require_text(request.text))
+    job_id = state["job_id"]
+    return {**state, "status_url": f"/api/pipeline/{job_id}", "events_url": f"/api/pipeline/{job_id}/events"}
+
+@router.post("/api/pipeline/upload", status_code=202)
+async def create_pipeline_job_from_upload(request: Request, services: Services = Depends(get_services)):
+    """Same as /api/pipeline, with the BRD uploaded as a multipart `file`."""
+    text, _ = await extract_upload(request, services)
+    state = services.pipeline_jobs.submit(text)
+    job_id = state["job_id"]
+    return {**state, "status_url": f"/api/pipeline/{job_id}", "events_url": f"/api/pipeline/{job_id}/events"}
+
+@router.get("/api/pipeline/{job_id}")
+async def get_pipeline_job(job_id: str, include_results: bool = True, services: Services = Depends(get_services)):
+    get_job_or_404(services, job_id)
+    return services.pipeline_jobs.status(job_id, include_results=include_results)
+
+@router.post("/api/pipeline/{job_id}/resume", status_code=202)
+async def resume_pipeline_job(job_id: str, services: Services = Depends(get_services)):
+    get_job_or_404(services, job_id)
+    try:
+        return services.pipeline_jobs.resume(job_id)
+    except JobRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/api/pipeline/{job_id}/events")
+async def pipeline_job_events(job_id: str, services: Services = Depends(get_services)):
+    """Server-sent `status` events on every job state change; the stream ends once the job completes or fails."""
+    get_job_or_404(services, job_id)
+    queue = services.pipeline_jobs.subscribe(job_id)
+
+    async def events():
+        try:
+            state = services.pipeline_jobs.status(job_id, include_results=False)
+            last = None
+            while True:
+                if state != last:
+                    yield sse_event("status", json.dumps(state))
+                    last = state
+                if state["status"] in TERMINAL_STATUSES:
+                    return
+                state = await queue.get()
+        finally:
+            services.pipeline_jobs.unsubscribe(job_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/cache/stats")
+async def cache_stats(services: Services = Depends(get_services)):
+    if services.response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **services.response_cache.stats()}
+
+@router.get("/api/admission/stats")
+async def admission_stats(services: Services = Depends(get_services)):
+    return services.admission.stats()
+
+@router.get("/healthz")
+async def healthz(request: Request):
+    """Readiness: 200 once the lifespan has built the services (and warmed the LLM connection), else 503."""
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        return ModelJSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ok", "llm_connection_warm": services.warm}
+
+def create_app() -> FastAPI:
+    """
+    App factory. Services (LLM clients, agents, stores) are built once in the lifespan, before the
+    worker accepts traffic, and closed on shutdown; requests only look them up.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        services = Services()
+        await services.start()
+        app.state.services = services
+        yield
+        app.state.services = None
+        await services.aclose()
+
+    app = FastAPI(title="Flexcube Copilot", lifespan=lifespan)
+    app.middleware("http")(instrument_requests)
+    app.include_router(router)
+    # Serve static files (Frontend) - Catch-all must be last
+    app.mount("/", StaticFiles(directory="src/web/static", html=True), name="static")
+    return app
+
+app = create_app()
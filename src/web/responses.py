@@ -0,0 +1,25 @@
+import json
+from typing import Any
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from src.core.llm import type_adapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ModelJSONResponse(JSONResponse):
+    """
+    Serializes an already-validated Pydantic model straight to bytes with its cached serializer.
+    Returning a Response from an endpoint makes FastAPI skip the response_model re-validation and
+    re-serialization; response_model stays on the route for the OpenAPI schema only.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return type_adapter(type(content)).dump_json(content)
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
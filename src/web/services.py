@@ -0,0 +1,85 @@
+import os
+from typing import Optional, Tuple
+from src.core.llm import MistralLLM
+from src.core.cache import ResponseCache
+from src.core.fake_llm import FakeMistralClient
+from src.core.catalog import ComponentCatalog
+from src.core.routing import InputRouter
+from src.core.revisions import RevisionStore
+from src.core.extraction import DocumentExtractor
+from src.core.jobs import JobStore, PipelineJobManager
+from src.core.metrics import logger
+from src.web.admission import AdmissionController
+from src.agents.requirement_analysis import RequirementAnalysisAgent
+from src.agents.impact_analysis import ImpactAnalysisAgent
+from src.agents.code_generation import CodeGenerationAgent
+
+
+class Services:
+    """
+    Process-wide singletons of the web app: LLM clients, caches, stores and the three agents.
+    Built once per worker in the app lifespan and shared by every request; nothing here is
+    constructed per request.
+    """
+
+    def __init__(self):
+        if not os.environ.get("MISTRAL_API_KEY") and os.environ.get("FLEXCUBE_LLM_BACKEND") != "fake":
+            logger.warning("MISTRAL_API_KEY not found. Operations might fail or mock.")
+
+        # Shared across requests so repeat submissions are served from cache
+        self.response_cache: Optional[ResponseCache] = ResponseCache.from_env()
+
+        # FLEXCUBE_LLM_BACKEND=fake serves recorded fixtures instead of calling Mistral (benchmarks, demos)
+        llm_client = FakeMistralClient.from_env() if os.environ.get("FLEXCUBE_LLM_BACKEND") == "fake" else None
+
+        # Bounds concurrent LLM calls per worker, across requests, fan-out and background jobs;
+        # X-Priority: batch requests (and pipeline jobs) queue behind interactive ones
+        self.admission = AdmissionController.from_env()
+
+        # One app-lifetime client: pooled keep-alive connections shared by all requests
+        self.llm = MistralLLM(cache=self.response_cache, client=llm_client, admission=self.admission)
+
+        # Small, fast model for conversational input and (optionally) for classifying ambiguous input
+        self.chat_llm = MistralLLM(model=os.environ.get("FLEXCUBE_FAST_MODEL", "mistral-small-latest"),
+                                   cache=self.response_cache, client=self.llm.client, admission=self.admission)
+        self.input_router = InputRouter.from_env(classifier_llm=self.chat_llm)
+
+        # Real FCIS components for grounding impact analysis (FLEXCUBE_CATALOG); None when not configured
+        self.component_catalog = ComponentCatalog.from_env()
+
+        # Per-section results of earlier BRD revisions (FLEXCUBE_REVISIONS_DIR)
+        self.revision_store = RevisionStore.from_env()
+
+        # .docx/.pdf parsing runs in worker processes (FLEXCUBE_EXTRACT_WORKERS), off the event loop
+        self.document_extractor = DocumentExtractor.from_env()
+
+        self.req_agent = RequirementAnalysisAgent(self.llm, router=self.input_router, chat_llm=self.chat_llm,
+                                                  revision_store=self.revision_store)
+        self.impact_agent = ImpactAnalysisAgent(self.llm, catalog=self.component_catalog)
+        self.code_agent = CodeGenerationAgent(self.llm)
+
+        # Background pipeline runner; checkpoints live on disk so restarted workers resume jobs
+        self.pipeline_jobs = PipelineJobManager(
+            JobStore(os.environ.get("FLEXCUBE_JOBS_DIR", ".jobs")),
+            *self.agents(),
+            max_workers=int(os.environ.get("FLEXCUBE_PIPELINE_WORKERS", 2)),
+            lease_seconds=float(os.environ.get("FLEXCUBE_JOB_LEASE_SECONDS", 60)),
+        )
+        self.warm = False
+
+    def agents(self) -> Tuple[RequirementAnalysisAgent, ImpactAnalysisAgent, CodeGenerationAgent]:
+        return self.req_agent, self.impact_agent, self.code_agent
+
+    async def start(self) -> None:
+        """Resumes unfinished jobs whose worker is gone and pre-warms the LLM connection (FLEXCUBE_WARMUP_TIMEOUT, 0 disables)."""
+        resumed = self.pipeline_jobs.resume_incomplete()
+        if resumed:
+            logger.info("Resuming %d orphaned pipeline job(s)", len(resumed))
+        timeout = float(os.environ.get("FLEXCUBE_WARMUP_TIMEOUT", 5))
+        if timeout > 0:
+            self.warm = await self.llm.awarm_up(timeout)
+
+    async def aclose(self) -> None:
+        self.pipeline_jobs.shutdown()
+        self.document_extractor.shutdown()
+        await self.llm.aclose()
@@ -96,8 +96,27 @@ document.addEventListener('DOMContentLoaded', () => {
         codeStatus.textContent = 'Generating...';
         codeOutput.innerHTML = '<div class="code-placeholder">Generating Code...</div>';
 
+        // Render a single generated file block
+        const renderFile = (file) => {
+            const fileBlock = document.createElement('div');
+            fileBlock.className = 'code-file';
+
+            const header = document.createElement('div');
+            header.className = 'file-header';
+            header.textContent = `${file.file_name} (${file.file_type})`;
+
+            const contentP = document.createElement('div');
+            contentP.className = 'file-content';
+            contentP.textContent = file.file_content;
+
+            fileBlock.appendChild(header);
+            fileBlock.appendChild(contentP);
+            codeOutput.appendChild(fileBlock);
+        };
+
         try {
-            const response = await fetch('/api/generate/code', {
+            // Files arrive as server-sent events as soon as each one is generated
+            const response = await fetch('/api/generate/code/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(currentImpact)
@@ -105,29 +124,49 @@ document.addEventListener('DOMContentLoaded', () => {
 
             if (!response.ok) throw new Error('Code generation failed');
 
-            const data = await response.json();
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let fileCount = 0;
+            let summary = null;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventName = 'message';
+                    let data = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) eventName = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+
+                    const payload = JSON.parse(data);
+                    if (eventName === 'file') {
+                        if (fileCount === 0) codeOutput.innerHTML = ''; // Clear placeholder
+                        fileCount += 1;
+                        renderFile(payload);
+                        codeStatus.textContent = `Generating... (${fileCount} file${fileCount > 1 ? 's' : ''})`;
+                    } else if (eventName === 'summary') {
+                        summary = payload.summary;
+                    } else if (eventName === 'error') {
+                        throw new Error(payload.detail || 'Code generation failed');
+                    }
+                }
+            }
 
-            // Render Files
-            codeOutput.innerHTML = ''; // Clear placeholder
-            if (data.files && data.files.length > 0) {
-                data.files.forEach(file => {
-                    const fileBlock = document.createElement('div');
-                    fileBlock.className = 'code-file';
-
-                    const header = document.createElement('div');
-                    header.className = 'file-header';
-                    header.textContent = `${file.file_name} (${file.file_type})`;
-
-                    const contentP = document.createElement('div');
-                    contentP.className = 'file-content';
-                    contentP.textContent = file.file_content;
-
-                    fileBlock.appendChild(header);
-                    fileBlock.appendChild(contentP);
-                    codeOutput.appendChild(fileBlock);
-                });
-            } else {
-                codeOutput.innerHTML = `<div class="file-content">${data.summary || "No code generated."}</div>`;
+            if (fileCount === 0) {
+                const summaryBlock = document.createElement('div');
+                summaryBlock.className = 'file-content';
+                summaryBlock.textContent = summary || "No code generated.";
+                codeOutput.innerHTML = '';
+                codeOutput.appendChild(summaryBlock);
             }
 
             codeStatus.textContent = '✓ Done';
@@ -0,0 +1,140 @@
+import os
+import tempfile
+from typing import Dict, NamedTuple, Optional
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Plain form fields (e.g. document_id) are tiny; anything bigger is rejected
+MAX_FIELD_BYTES = 4096
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+class Upload(NamedTuple):
+    path: str
+    filename: str
+    size: int
+    fields: Dict[str, str]
+
+
+def max_upload_bytes() -> int:
+    return int(float(os.environ.get("FLEXCUBE_MAX_UPLOAD_MB", 20)) * 1024 * 1024)
+
+
+class _UploadReceiver:
+    """python-multipart callbacks: the file part goes to a temp file chunk by chunk, other parts are small fields."""
+
+    def __init__(self, file_field: str, max_bytes: int, directory: Optional[str]):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.file = None
+        self.filename = None
+        self.size = 0
+        self.fields: Dict[str, str] = {}
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._field: Optional[str] = None
+        self._value = bytearray()
+        self._writing = False
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._field = None
+        self._value = bytearray()
+        self._writing = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if name == self.file_field and filename is not None and self.file is None:
+            self.filename = os.path.basename(filename.decode("utf-8", "replace").replace("\\", "/"))
+            suffix = os.path.splitext(self.filename)[1].lower()
+            self.file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, dir=self.directory, delete=False)
+            self._writing = True
+        else:
+            self._field = name
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._writing:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                raise UploadTooLarge(self.max_bytes)
+            self.file.write(data[start:end])
+        elif self._field is not None:
+            self._value += data[start:end]
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field {self._field!r} is too large")
+
+    def on_part_end(self) -> None:
+        if self._field is not None:
+            self.fields[self._field] = self._value.decode("utf-8", "replace")
+        self._writing = False
+
+    def discard(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            os.unlink(self.file.name)
+
+
+async def receive_upload(request: Request, file_field: str = "file", max_bytes: Optional[int] = None) -> Upload:
+    """
+    Streams a multipart/form-data body straight to a temp file (FLEXCUBE_UPLOAD_DIR, default the system
+    temp dir), chunk by chunk, so the upload is never held in memory as one bytes/str object.
+    Parsing and disk writes run on the thread pool.
+    Oversized uploads are rejected with 413 from Content-Length up front, or as soon as the limit is crossed.
+    The caller owns the returned file and must delete it.
+    """
+    max_bytes = max_bytes or max_upload_bytes()
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected a multipart/form-data upload")
+    # The multipart envelope adds a little on top of the file itself
+    if int(request.headers.get("content-length") or 0) > max_bytes + 64 * 1024:
+        raise UploadTooLarge(max_bytes)
+
+    receiver = _UploadReceiver(file_field, max_bytes, os.environ.get("FLEXCUBE_UPLOAD_DIR") or None)
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    try:
+        # The parser callbacks write to the temp file; run them on the thread pool, not the event loop
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(parser.finalize)
+    except HTTPException:
+        receiver.discard()
+        raise
+    except Exception as e:
+        receiver.discard()
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}") from e
+
+    if receiver.file is None:
+        raise HTTPException(status_code=400, detail=f"Missing file field {file_field!r}")
+    receiver.file.close()
+    return Upload(receiver.file.name, receiver.filename, receiver.size, receiver.fields)
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.core.llm import llm_lane
+from src.web.admission import AdmissionController, Overloaded, lane_from_header, request_key
+
+
+def test_lane_from_header_defaults_to_interactive():
+    assert lane_from_header(None) == "interactive"
+    assert lane_from_header(" Batch ") == "batch"
+    assert lane_from_header("urgent") == "interactive"
+
+
+def test_request_key_covers_route_body_and_options():
+    assert request_key("/a", "{}", True) == request_key("/a", "{}", True)
+    assert len({request_key("/a", "{}", True), request_key("/b", "{}", True), request_key("/a", "{}", False)}) == 3
+
+
+def test_slot_bounds_concurrent_calls():
+    gate = AdmissionController(max_concurrency=2, max_queue=10)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with gate.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert gate.stats()["active"] == 0
+
+
+def test_interactive_lane_is_served_before_batch():
+    gate = AdmissionController(max_concurrency=1, max_queue=10)
+    order = []
+
+    async def call(lane, name):
+        async with gate.slot(lane):
+            order.append(name)
+            await asyncio.sleep(0.005)
+
+    async def main():
+        async with gate.slot():
+            tasks = [asyncio.ensure_future(call("batch", "b1")), asyncio.ensure_future(call("batch", "b2"))]
+            await asyncio.sleep(0)
+            tasks += [asyncio.ensure_future(call("interactive", "i1")), asyncio.ensure_future(call("interactive", "i2"))]
+            await asyncio.sleep(0)
+            assert gate.stats()["queued"] == {"interactive": 2, "batch": 2}
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["i1", "i2", "b1", "b2"]
+
+
+def test_sync_and_async_callers_share_the_limit():
+    gate = AdmissionController(max_concurrency=1, max_queue=10)
+    events = []
+
+    def worker():
+        with gate.hold("batch"):
+            events.append("thread")
+
+    async def main():
+        async with gate.slot():
+            thread = threading.Thread(target=worker)
+            thread.start()
+            await asyncio.sleep(0.05)
+            events.append("async done")
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(main())
+    assert events == ["async done", "thread"]
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    gate = AdmissionController(max_concurrency=1, max_queue=10)
+
+    async def main():
+        async with gate.slot():
+            waiter = asyncio.ensure_future(gate.slot().__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert gate.stats()["queued"]["interactive"] == 0
+        async with gate.slot():
+            assert gate.stats()["active"] == 1
+
+    asyncio.run(main())
+    assert gate.stats()["active"] == 0
+
+
+def test_full_queue_sheds_with_429_and_retry_after():
+    gate = AdmissionController(max_concurrency=1, max_queue=1)
+
+    async def llm_call():
+        async with gate.slot():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+    async def main():
+        first = asyncio.ensure_future(gate.run("a", "interactive", llm_call))
+        second = asyncio.ensure_future(gate.run("b", "interactive", llm_call))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as shed:
+            await gate.run("c", "interactive", llm_call)
+        # The batch lane has its own queue
+        batch = asyncio.ensure_future(gate.run("d", "batch", llm_call))
+        return shed.value, await asyncio.gather(first, second, batch)
+
+    shed, results = asyncio.run(main())
+    assert shed.status_code == 429
+    assert int(shed.headers["Retry-After"]) >= 1
+    assert results == ["ok", "ok", "ok"]
+
+
+def test_identical_requests_share_one_call():
+    gate = AdmissionController(max_concurrency=4, max_queue=4)
+    calls = []
+
+    async def call():
+        calls.append(llm_lane.get())
+        await asyncio.sleep(0.01)
+        return {"result": len(calls)}
+
+    async def main():
+        return await asyncio.gather(*(gate.run("same", "batch", call) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == ["batch"]
+    assert results == [{"result": 1}] * 5
+    assert gate.stats()["inflight_keys"] == 0
+
+
+def test_shared_call_survives_one_waiter_and_is_cancelled_with_the_last():
+    gate = AdmissionController()
+    async def main():
+        started, stopped = asyncio.Event(), asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                stopped.set()
+
+        first = asyncio.ensure_future(gate.run("k", "interactive", call))
+        second = asyncio.ensure_future(gate.run("k", "interactive", call))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not stopped.is_set()
+        second.cancel()
+        await asyncio.wait_for(stopped.wait(), 1)
+        return gate.stats()["inflight_keys"]
+
+    assert asyncio.run(main()) == 0
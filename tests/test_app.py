@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.web.app import create_app
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLEXCUBE_LLM_BACKEND", "fake")
+    monkeypatch.setenv("FLEXCUBE_CACHE_DISABLED", "1")
+    monkeypatch.setenv("FLEXCUBE_WARMUP_TIMEOUT", "0")
+    monkeypatch.setenv("FLEXCUBE_JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("FLEXCUBE_REVISIONS_DIR", str(tmp_path / "revisions"))
+    monkeypatch.delenv("FLEXCUBE_CATALOG", raising=False)
+    return create_app()
+
+
+def test_healthz_is_503_until_the_services_are_built(app):
+    assert TestClient(app).get("/healthz").status_code == 503
+    with TestClient(app) as client:
+        assert client.get("/healthz").json() == {"status": "ok", "llm_connection_warm": False}
+
+
+def test_services_are_built_once_and_shared_by_requests(app):
+    with TestClient(app) as client:
+        services = app.state.services
+        for _ in range(2):
+            response = client.post("/api/analyze/requirements", json={"text": "The system shall support a new fund type."})
+            assert response.status_code == 200
+        assert app.state.services is services
+        assert services.chat_llm.client is services.llm.client
+    assert app.state.services is None
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/analyze/requirements", {"text": ""}),
+    ("/api/analyze/requirements/revision", {"document_id": "brd", "text": " \n\t"}),
+    ("/api/pipeline/run", {"text": "   "}),
+    ("/api/pipeline", {"text": ""}),
+])
+def test_blank_text_is_rejected_before_any_llm_call(app, path, body):
+    with TestClient(app) as client:
+        calls = app.state.services.llm.client.calls
+        response = client.post(path, json=body)
+        assert response.status_code == 400
+        assert response.json() == {"detail": "text must not be empty"}
+        assert app.state.services.llm.client.calls == calls
+
+
+def test_importing_the_app_does_not_load_the_mistral_sdk():
+    code = "import sys, src.web.app; print('mistralai' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={"FLEXCUBE_LLM_BACKEND": "fake", "PATH": ""})
+    assert result.stdout.strip() == "False"
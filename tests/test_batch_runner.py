@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+import src.batch_runner as batch_runner
+from src.batch_runner import BatchRunner, collect_inputs, load_completed
+from src.core.models import AnalysisResult
+
+
+class ConversationalAgent:
+    """Requirement agent answering every input conversationally, so no other agent is called."""
+
+    def analyze(self, brd_text):
+        if "boom" in brd_text:
+            raise RuntimeError("analysis failed")
+        return AnalysisResult(conversation_response="Hello!")
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    folder = tmp_path / "brds"
+    (folder / "nested").mkdir(parents=True)
+    for name in ("a.txt", "b.md", "nested/c.txt"):
+        (folder / name).write_text(f"BRD {name}", encoding="utf-8")
+    (folder / "notes.pdf").write_text("ignored", encoding="utf-8")
+    return folder
+
+
+def write_records(path, *records):
+    with open(path, "a", encoding="utf-8") as f:
+        for source, status in records:
+            f.write(json.dumps({"source": source, "status": status}) + "\n")
+
+
+def test_collect_inputs_from_a_directory_or_a_glob(inputs):
+    assert [p.rsplit("/", 1)[1] for p in collect_inputs(str(inputs))] == ["a.txt", "b.md", "c.txt"]
+    assert [p.rsplit("/", 1)[1] for p in collect_inputs(str(inputs / "**" / "*.txt"))] == ["a.txt", "c.txt"]
+
+
+def test_load_completed_keeps_the_last_record_and_skips_a_cut_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, ("a", "failed"), ("b", "ok"), ("a", "ok"))
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"source": "c", "sta')
+    assert load_completed(str(output)) == {"a": "ok", "b": "ok"}
+    assert load_completed(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_process_appends_one_record_per_input(inputs, tmp_path):
+    output = tmp_path / "results.jsonl"
+    (inputs / "boom.txt").write_text("boom", encoding="utf-8")
+    runner = BatchRunner(ConversationalAgent(), None, None, output_path=str(output), concurrency=2)
+    records = runner.run(collect_inputs(str(inputs)))
+    assert sorted(r["status"] for r in records) == ["failed", "ok", "ok", "ok"]
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert {r["source"] for r in lines} == {r["source"] for r in records}
+    failed = next(r for r in lines if r["status"] == "failed")
+    assert failed["error"] == "analysis failed"
+
+
+@pytest.fixture
+def pending_runs(monkeypatch):
+    """Replaces the LLM and agents so main() only records which inputs it would process."""
+    runs = []
+
+    class StubLLM:
+        def __init__(self, **kwargs):
+            pass
+
+        def close(self):
+            pass
+
+    def run(self, paths):
+        runs.append(sorted(paths))
+        return [{"source": p, "status": "ok"} for p in paths]
+
+    monkeypatch.setattr(batch_runner, "MistralLLM", StubLLM)
+    for name in ("RequirementAnalysisAgent", "ImpactAnalysisAgent", "CodeGenerationAgent"):
+        monkeypatch.setattr(batch_runner, name, lambda *args, **kwargs: None)
+    monkeypatch.setattr(batch_runner, "ComponentCatalog", type("Catalog", (), {"from_env": staticmethod(lambda: None)}), raising=False)
+    monkeypatch.setattr(BatchRunner, "run", run)
+    return runs
+
+
+def test_resume_skips_documents_that_already_succeeded(inputs, tmp_path, pending_runs):
+    output = tmp_path / "results.jsonl"
+    paths = collect_inputs(str(inputs))
+    write_records(output, (paths[0], "ok"))
+    assert batch_runner.main([str(inputs), "--output", str(output), "--no-cache"]) == 0
+    assert pending_runs == [paths[1:]]
+
+    write_records(output, *((p, "ok") for p in paths[1:]))
+    assert batch_runner.main([str(inputs), "--output", str(output), "--no-cache"]) == 0
+    assert len(pending_runs) == 1
+
+
+def test_resume_retries_failed_documents_unless_told_not_to(inputs, tmp_path, pending_runs):
+    output = tmp_path / "results.jsonl"
+    paths = collect_inputs(str(inputs))
+    write_records(output, (paths[0], "ok"), (paths[1], "failed"))
+    batch_runner.main([str(inputs), "--output", str(output), "--no-cache"])
+    batch_runner.main([str(inputs), "--output", str(output), "--no-cache", "--skip-failed"])
+    assert pending_runs == [paths[1:], paths[2:]]
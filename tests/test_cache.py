@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from pydantic import BaseModel
+
+from src.core.cache import ResponseCache, make_cache_key
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class Other(BaseModel):
+    value: int
+
+
+MESSAGES = [{"role": "user", "content": "What changed?"}]
+
+
+def test_cache_key_changes_with_model_messages_and_schema():
+    key = make_cache_key("m", MESSAGES, Answer)
+    assert key == make_cache_key("m", [dict(m) for m in MESSAGES], Answer)
+    assert key != make_cache_key("other-model", MESSAGES, Answer)
+    assert key != make_cache_key("m", [{"role": "user", "content": "What changed? "}], Answer)
+    assert key != make_cache_key("m", MESSAGES, Other)
+    assert key != make_cache_key("m", MESSAGES)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "b" is now the least recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    stats = cache.stats()
+    assert (stats["memory_entries"], stats["evictions"], stats["disk_entries"]) == (2, 1, None)
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.set("k", "v")
+    now[0] += 30
+    assert cache.get("k") == "v"
+    now[0] += 31
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_sqlite_tier_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = ResponseCache(path)
+    first.set("k", '{"text":"hi"}')
+    first.close()
+
+    second = ResponseCache(path)
+    assert second.get("k") == '{"text":"hi"}'
+    assert second.get("k") == '{"text":"hi"}'
+    stats = second.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    second.close()
+
+
+def test_sqlite_tier_keeps_most_recently_used_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_memory_entries=1, max_disk_entries=2)
+    for key in ("a", "b"):
+        cache.set(key, key)
+        now[0] += 1
+    assert cache.get("a") == "a"  # served from disk, refreshes its access time
+    now[0] += 1
+    cache.set("c", "c")
+    assert cache.stats()["disk_entries"] == 2
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("a", "c")
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.set("k", "v")
+    cache.clear()
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLEXCUBE_CACHE_DISABLED", "1")
+    assert ResponseCache.from_env() is None
+    monkeypatch.setenv("FLEXCUBE_CACHE_DISABLED", "")
+    monkeypatch.setenv("FLEXCUBE_CACHE_PATH", str(tmp_path / "env.sqlite"))
+    monkeypatch.setenv("FLEXCUBE_CACHE_TTL", "0")
+    cache = ResponseCache.from_env()
+    assert cache.path == str(tmp_path / "env.sqlite") and cache.ttl_seconds is None
+    cache.close()
+
+
+def test_async_paths_share_both_tiers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+
+    async def main():
+        cache = ResponseCache(path, max_memory_entries=1)
+        await cache.aset("a", "1")
+        await cache.aset("b", "2")
+        assert await cache.aget("b") == "2"  # memory
+        assert await cache.aget("a") == "1"  # disk, in a worker thread
+        assert await cache.aget("missing") is None
+        assert cache.get("b") == "2"
+        return cache.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 2, 1)
+    assert ResponseCache(path).get("a") == "1"
+
+
+def test_async_memory_only_cache():
+    async def main():
+        cache = ResponseCache()
+        await cache.aset("k", "v")
+        return await cache.aget("k"), await cache.aget("other")
+
+    assert asyncio.run(main()) == ("v", None)
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+from src.core.catalog import (
+    CatalogEntry, ComponentCatalog, describe_sources, expand_sources, load_entries, sources_unchanged, tokenize,
+)
+
+CSV = (
+    "component_name,component_type,description\n"
+    "STTM_FUND,Table,Fund master with fee and NAV settings\n"
+    "STTM_FUND_EXT,Table,Extension of the fund master for hedge fund fields\n"
+    "LDPKS_UTIL,Package,Loan utility routines\n"
+    "CSDFUNDC,Screen,Capital call maintenance screen\n"
+)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    directory = tmp_path / "exports"
+    directory.mkdir()
+    (directory / "tables.csv").write_text(CSV, encoding="utf-8")
+    (directory / "jobs.json").write_text(json.dumps({"components": [
+        {"name": "fnd_capital_call_batch", "type": "Job", "comments": "Computes capital call\tfees\nnightly"},
+        {"name": "STTM_FUND", "type": "View", "description": "Also in tables.csv, which is read after this file"},
+    ]}), encoding="utf-8")
+    return directory
+
+
+def test_tokenize_splits_identifiers_and_drops_stopwords():
+    assert tokenize("STTM_PE_FUND_EXT for the fund") == ["sttm_pe_fund_ext", "sttm", "pe", "fund", "ext", "fund"]
+
+
+def test_load_entries_reads_csv_and_json(sources):
+    assert load_entries(str(sources / "tables.csv"))[0] == CatalogEntry("STTM_FUND", "Table", "Fund master with fee and NAV settings")
+    assert load_entries(str(sources / "jobs.json"))[0].name == "FND_CAPITAL_CALL_BATCH"
+    assert [os.path.basename(p) for p in expand_sources([str(sources)])] == ["jobs.json", "tables.csv"]
+
+
+def test_search_ranks_by_bm25_and_validates_names(sources):
+    catalog = ComponentCatalog.from_sources([str(sources)])
+    assert len(catalog) == 5
+    assert catalog.entry(1).component_type == "View"  # the first source wins on duplicate names
+    names = [entry.name for entry, _ in catalog.search("capital call fees", k=2)]
+    assert names == ["FND_CAPITAL_CALL_BATCH", "CSDFUNDC"]
+    assert catalog.search("unrelated words", k=3) == []
+    assert "sttm_fund " in catalog
+    assert catalog.unknown(["STTM_FUND", "STTM_FUND_HIST"]) == ["STTM_FUND_HIST"]
+
+
+def test_save_and_load_round_trip(sources, tmp_path):
+    catalog = ComponentCatalog.from_sources([str(sources)])
+    path = str(tmp_path / "catalog.idx")
+    catalog.save(path)
+    loaded = ComponentCatalog.load(path)
+    assert [loaded.entry(i) for i in range(len(loaded))] == [catalog.entry(i) for i in range(len(catalog))]
+    assert loaded.search("hedge fund extension") == catalog.search("hedge fund extension")
+    assert loaded.entry(0).description == "Computes capital call fees nightly"
+    assert loaded.sources == catalog.sources
+
+
+def test_empty_catalog_round_trip(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    ComponentCatalog.from_entries([]).save(path)
+    loaded = ComponentCatalog.load(path)
+    assert len(loaded) == 0 and loaded.search("fund") == []
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "not.idx"
+    path.write_bytes(b"something else entirely, long enough for a header" * 2)
+    with pytest.raises(ValueError):
+        ComponentCatalog.load(str(path))
+
+
+def test_from_sources_reuses_index_until_a_source_changes(sources, tmp_path):
+    index = str(tmp_path / "catalog.idx")
+    built = ComponentCatalog.from_sources([str(sources)], index)
+    assert built._mapped is None
+    assert ComponentCatalog.from_sources([str(sources)], index)._mapped is not None
+
+    # Same size and an older mtime: only the content hash reveals the edit
+    csv_path = sources / "tables.csv"
+    stat = os.stat(csv_path)
+    csv_path.write_text(CSV.replace("LDPKS_UTIL", "LDPKS_UTIX"), encoding="utf-8")
+    os.utime(csv_path, (stat.st_atime, stat.st_mtime - 3600))
+    rebuilt = ComponentCatalog.from_sources([str(sources)], index)
+    assert rebuilt._mapped is None and "LDPKS_UTIX" in rebuilt
+
+    (sources / "more.csv").write_text("name,type\nCSTB_PARAM,Table\n", encoding="utf-8")
+    assert "CSTB_PARAM" in ComponentCatalog.from_sources([str(sources)], index)
+
+
+def test_sources_unchanged_hashes_only_touched_files(sources, monkeypatch):
+    paths = expand_sources([str(sources)])
+    recorded = describe_sources(paths)
+    hashed = []
+    monkeypatch.setattr("src.core.catalog.file_sha256", lambda path: hashed.append(path) or "")
+    assert sources_unchanged(recorded, paths) and hashed == []
+
+    os.utime(paths[1], ns=(0, recorded[1]["mtime_ns"] + 1))
+    assert not sources_unchanged(recorded, paths)
+    assert hashed == [paths[1]]
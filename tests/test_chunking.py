@@ -0,0 +1,125 @@
+import asyncio
+
+from src.agents.requirement_analysis import RequirementAnalysisAgent, merge_analysis_results
+from src.core.chunking import CHARS_PER_TOKEN, _split_oversized, chunk_text, estimate_tokens, is_heading, split_sections
+from src.core.models import AnalysisResult
+
+
+def brd(sections: int, lines: int = 5) -> str:
+    return "".join(
+        f"# {i} Section {i}\n" + "".join(f"The system shall handle case {i}.{j} for the fund.\n" for j in range(lines)) + "\n"
+        for i in range(sections)
+    )
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * (CHARS_PER_TOKEN + 1)) == 2
+
+
+def test_is_heading():
+    assert is_heading("# Overview")
+    assert is_heading("3.2 Fee Calculation")
+    assert is_heading("Section 4")
+    assert is_heading("FUNCTIONAL REQUIREMENTS:")
+    assert not is_heading("The system shall compute the fee.")
+    assert not is_heading("   ")
+
+
+def test_split_sections_starts_each_section_at_a_heading():
+    text = "Preamble line\n# A\nbody a\n# B\nbody b\n"
+    assert split_sections(text) == ["Preamble line\n", "# A\nbody a\n", "# B\nbody b\n"]
+    assert "".join(split_sections(text)) == text
+
+
+def test_split_sections_of_blank_text_is_empty():
+    assert split_sections("") == []
+    assert split_sections("  \n\n") == []
+
+
+def test_split_oversized_concatenates_back_to_the_section():
+    section = "\n\n".join(f"Paragraph {i} " + "word " * 30 for i in range(10))
+    pieces = _split_oversized(section, 200)
+    assert len(pieces) > 1
+    assert all(len(piece) <= 200 for piece in pieces)
+    assert "".join(pieces) == section
+
+
+def test_split_oversized_handles_trailing_separator_and_hard_splits():
+    section = ("x" * 150 + "\n") * 3
+    assert "".join(_split_oversized(section, 100)) == section
+    unbroken = "y" * 250
+    assert _split_oversized(unbroken, 100) == ["y" * 100, "y" * 100, "y" * 50]
+
+
+def test_chunk_text_respects_budget_and_keeps_all_text():
+    text = brd(40)
+    chunks = chunk_text(text, max_tokens=200, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 * CHARS_PER_TOKEN for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_chunk_text_prefixes_overlap_from_previous_chunk():
+    chunks = chunk_text(brd(40), max_tokens=200, overlap_tokens=20)
+    assert all(len(chunk) <= 200 * CHARS_PER_TOKEN for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        tail = chunk[:chunk.index("# ")]
+        assert tail and previous.endswith(tail)
+
+
+def test_chunk_text_of_empty_input_is_empty():
+    assert chunk_text("") == []
+    assert chunk_text(" \n\t\n") == []
+
+
+def test_merge_dedupes_lists_in_document_order():
+    merged = merge_analysis_results([
+        AnalysisResult(functional_requirements=["Compute fee.", "Post entries"]),
+        AnalysisResult(functional_requirements=["compute  FEE", "Send alerts;"]),
+    ])
+    assert merged.functional_requirements == ["Compute fee.", "Post entries", "Send alerts;"]
+
+
+def test_merge_scalars():
+    merged = merge_analysis_results([
+        AnalysisResult(business_objective="N/A", client_type="Retail", risk_tolerance="High"),
+        AnalysisResult(business_objective="Launch hedge funds", client_type="retail", risk_tolerance="Low - capital preservation"),
+        AnalysisResult(business_objective="Something later", client_type="Institutional", risk_tolerance="low"),
+    ])
+    assert merged.business_objective == "Launch hedge funds"
+    assert merged.client_type == "Retail; Institutional"
+    assert merged.risk_tolerance == "Low - capital preservation"
+
+
+def test_merge_of_nothing_is_the_empty_result():
+    assert merge_analysis_results([]) == AnalysisResult()
+
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        self.prompts.append(prompt)
+        return AnalysisResult(functional_requirements=[f"Requirement {len(self.prompts)}"])
+
+    async def agenerate_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        return self.generate_structured(prompt, response_model, use_cache, system_prompt)
+
+
+def test_chunked_analysis_of_blank_input_makes_no_calls():
+    llm = RecordingLLM()
+    agent = RequirementAnalysisAgent(llm)
+    assert agent.analyze("   \n", chunked=True) == AnalysisResult()
+    assert asyncio.run(agent.aanalyze("", chunked=True)) == AnalysisResult()
+    assert llm.prompts == []
+
+
+def test_chunked_analysis_calls_once_per_chunk():
+    llm = RecordingLLM()
+    agent = RequirementAnalysisAgent(llm, chunk_tokens=200, overlap_tokens=0)
+    text = brd(40)
+    result = agent.analyze(text, chunked=True)
+    assert len(llm.prompts) == len(chunk_text(text, 200, 0))
+    assert len(result.functional_requirements) == len(llm.prompts)
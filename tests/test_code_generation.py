@@ -0,0 +1,121 @@
+import pytest
+
+from src.agents.code_generation import CodeGenerationAgent, merge_generation_results, partition_impact
+from src.core.models import AffectedComponent, CodeGenerationResponse, EffortEstimation, GeneratedFile, ImpactAssessment
+
+
+def component(name: str, component_type: str = "Table") -> AffectedComponent:
+    return AffectedComponent(component_name=name, component_type=component_type, nature_of_change="Modify")
+
+
+def impact(components, schema_changes=(), code_changes=()) -> ImpactAssessment:
+    return ImpactAssessment(
+        affected_components=list(components),
+        schema_changes=list(schema_changes),
+        code_changes=list(code_changes),
+        effort_estimation=EffortEstimation(complexity="Medium", person_days=5, justification="Several objects"),
+        overall_risk="Medium",
+        mitigation_strategies=["Regression test fund setup"],
+    )
+
+
+def file(name: str, content: str = "") -> GeneratedFile:
+    return GeneratedFile(file_name=name, file_content=content or f"-- {name}", file_type="SQL")
+
+
+def test_partition_by_component_keeps_shared_context():
+    parts = partition_impact(impact(
+        [component("STTM_FUND"), component("LDPKS_UTIL", "Package")],
+        schema_changes=["ALTER TABLE STTM_FUND ADD (FEE NUMBER)"],
+        code_changes=["Update LDPKS_UTIL.fn_fee"],
+    ))
+    assert [label for label, _ in parts] == ["STTM_FUND", "LDPKS_UTIL"]
+    fund, util = parts[0][1], parts[1][1]
+    assert fund.schema_changes == ["ALTER TABLE STTM_FUND ADD (FEE NUMBER)"] and fund.code_changes == []
+    assert util.code_changes == ["Update LDPKS_UTIL.fn_fee"] and util.schema_changes == []
+    assert util.effort_estimation == fund.effort_estimation
+    assert util.mitigation_strategies == ["Regression test fund setup"]
+
+
+def test_partition_by_component_type_groups_components():
+    parts = partition_impact(
+        impact([component("STTM_FUND"), component("LDPKS_UTIL", "Package"), component("STTM_FUND_EXT")]),
+        partition_by="component_type",
+    )
+    assert [(label, [c.component_name for c in part.affected_components]) for label, part in parts] == [
+        ("Table", ["STTM_FUND", "STTM_FUND_EXT"]),
+        ("Package", ["LDPKS_UTIL"]),
+    ]
+
+
+def test_change_goes_to_the_longest_whole_identifier():
+    parts = dict(partition_impact(impact(
+        [component("STTM_FUND"), component("STTM_FUND_EXT")],
+        schema_changes=[
+            "ALTER TABLE STTM_FUND_EXT ADD (HURDLE NUMBER)",
+            "ALTER TABLE sttm_fund ADD (FEE NUMBER)",
+            "Copy STTM_FUND.FEE into STTM_FUND_EXT",
+        ],
+    )))
+    assert parts["STTM_FUND"].schema_changes == ["ALTER TABLE sttm_fund ADD (FEE NUMBER)"]
+    assert parts["STTM_FUND_EXT"].schema_changes == [
+        "ALTER TABLE STTM_FUND_EXT ADD (HURDLE NUMBER)",
+        "Copy STTM_FUND.FEE into STTM_FUND_EXT",
+    ]
+
+
+def test_every_change_is_assigned_exactly_once():
+    changes = ["Rebuild STTM_FUND_EXT_HIST", "Add index on STTM_FUND", "Recompile invalid objects"]
+    parts = partition_impact(impact([component("STTM_FUND"), component("LDPKS_UTIL")], code_changes=changes))
+    assigned = [change for _, part in parts for change in part.code_changes]
+    assert sorted(assigned) == sorted(changes)
+    # Neither name is a whole identifier in the first or last change, so they go to the first part
+    assert parts[0][1].code_changes == changes
+
+
+def test_merge_generation_results_dedupes_and_renames():
+    merged = merge_generation_results([
+        ("STTM_FUND", CodeGenerationResponse(files=[file("pkg.sql", "a"), file("fund.sql")], summary="Fund table")),
+        ("LDPKS_UTIL", CodeGenerationResponse(files=[file("pkg.sql", "a"), file("PKG.sql", "b"), file("pkg.sql", "c")], summary="")),
+    ])
+    assert [f.file_name for f in merged.files] == ["pkg.sql", "fund.sql", "PKG_2.sql", "pkg_3.sql"]
+    assert [f.file_content for f in merged.files] == ["a", "-- fund.sql", "b", "c"]
+    assert merged.summary == "STTM_FUND: Fund table"
+
+
+class PartitionLLM:
+    """Returns one file per prompt; fails the first call for every prompt listed in flaky."""
+
+    def __init__(self, flaky=()):
+        self.flaky = set(flaky)
+        self.calls = []
+
+    def generate_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        self.calls.append(prompt)
+        # The partition's own components are in its assessment; the others are only listed by name
+        owner = prompt.split('"component_name":"', 1)[1].split('"', 1)[0]
+        if owner in self.flaky:
+            self.flaky.discard(owner)
+            raise RuntimeError("transient")
+        return CodeGenerationResponse(files=[file(f"{owner.lower()}.sql")], summary=owner)
+
+
+def test_fanout_retries_a_failed_partition_only():
+    llm = PartitionLLM(flaky=["LDPKS_UTIL"])
+    agent = CodeGenerationAgent(llm)
+    result = agent.generate(impact([component("STTM_FUND"), component("LDPKS_UTIL", "Package")]), fanout=True)
+    assert [f.file_name for f in result.files] == ["sttm_fund.sql", "ldpks_util.sql"]
+    assert len(llm.calls) == 3
+
+
+def test_fanout_raises_once_retries_are_used_up():
+    agent = CodeGenerationAgent(PartitionLLM(flaky=["LDPKS_UTIL"]), partition_retries=0)
+    with pytest.raises(RuntimeError, match="partition\\(s\\): LDPKS_UTIL"):
+        agent.generate(impact([component("STTM_FUND"), component("LDPKS_UTIL", "Package")]), fanout=True)
+
+
+def test_prompt_leaves_out_unverified_components():
+    assessment = impact([component("STTM_FUND")])
+    assessment.unverified_components = ["STTM_FUND_HIST"]
+    prompt = CodeGenerationAgent(PartitionLLM()).prompt_key(assessment)
+    assert "STTM_FUND_HIST" not in prompt and "unverified_components" not in prompt
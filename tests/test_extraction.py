@@ -0,0 +1,139 @@
+import asyncio
+import zipfile
+
+import pytest
+
+from src.core.extraction import (
+    SUPPORTED_EXTENSIONS, DocumentExtractor, PdfReader, UnsupportedDocumentError, _repeated_edge_paragraphs, _repeated_edges,
+    extract_text, normalize_pages,
+)
+
+DISCLAIMER = (
+    "CONFIDENTIAL: This document is the property of the bank and must not be shared with any third party "
+    "without approval."
+)
+RULE = "The fee shall be calculated on the average daily NAV of the fund and charged monthly to the unit holder account."
+
+
+def page(number, body):
+    return f"ACME Bank - Fund BRD v2.1\n{body}\nPage {number} of 4"
+
+
+def test_running_headers_page_numbers_and_footers_are_stripped():
+    pages = [page(i, f"# {i} Section {i}\n\nRequirements for section {i}.") for i in range(1, 5)]
+    text = normalize_pages(pages)
+    assert "ACME Bank" not in text and "Page" not in text
+    assert [line for line in text.splitlines() if line.startswith("#")] == [f"# {i} Section {i}" for i in range(1, 5)]
+
+
+def test_table_of_contents_is_stripped():
+    text = normalize_pages([
+        "Table of Contents\n1 Scope ........ 2\n2 Fees . . . . . 3\n\n# 1 Scope\n\nSwitches between funds.",
+    ])
+    assert text == "# 1 Scope\n\nSwitches between funds.\n"
+
+
+def test_back_to_back_duplicate_paragraphs_and_blank_runs_are_collapsed():
+    text = normalize_pages([f"Intro\n\n{RULE}\n\n{RULE}\n\n\n\n\nOutro"])
+    assert text == f"Intro\n\n{RULE}\n\nOutro\n"
+
+
+def test_repeated_disclaimer_paragraph_is_stripped_but_body_repeats_are_kept():
+    pages = [
+        f"# {i} {fund} Fund\n\n{fund} text.\nSubscriptions settle T+2.\nRedemptions settle T+3.\n\n{RULE}\n\n"
+        f"Cut-off is 2 pm.\nSwitches are free.\nReports run daily.\n\n{DISCLAIMER}\nPage {i}"
+        for i, fund in enumerate(["Equity", "Bond", "Money Market"], 1)
+    ]
+    text = normalize_pages(pages)
+    assert DISCLAIMER not in text and "Page" not in text
+    assert text.count(RULE) == 3
+    assert text.count("Switches are free.") == 3
+
+
+def test_multi_line_disclaimer_is_stripped():
+    disclaimer = (
+        "CONFIDENTIAL: This document is the property of the bank\nand must not be shared with any third party\n"
+        "without the written approval of the\nchief compliance officer of the bank."
+    )
+    pages = [f"# {i} Section {w}\n\n{w} requirements go here.\n\nDetails for {w} only.\n\n{disclaimer}"
+             for i, w in enumerate(["alpha", "bravo", "charlie", "delta"])]
+    text = normalize_pages(pages)
+    assert "CONFIDENTIAL" not in text and "compliance officer" not in text
+    assert text.count("requirements go here") == 4
+
+
+def test_short_documents_keep_their_edges():
+    # With fewer than three pages nothing counts as a running header
+    text = normalize_pages(["Fund BRD\nScope one", "Fund BRD\nScope two"])
+    assert text.count("Fund BRD") == 2
+
+
+def test_repeated_edges_ignores_lines_the_body_uses():
+    pages = [["Header", "a", "b", "c", "body 1", "x", "y", "z", "Footer 1"] for _ in range(3)]
+    pages[1][4] = "Header"
+    repeated = _repeated_edges(pages)
+    assert "footer #" in repeated
+    assert "header" not in repeated
+    assert _repeated_edges(pages[:2]) == set()
+
+
+def test_numbered_headings_are_not_mistaken_for_one_another():
+    pages = [[f"# {i} Overview", f"text {i}"] for i in range(1, 5)]
+    assert _repeated_edges(pages) == {"text #"}
+
+
+def test_repeated_edge_paragraphs_only_counts_long_first_or_last_paragraphs():
+    short = "Internal use only"
+    pages = [[DISCLAIMER, f"body {i}", short] for i in range(4)]
+    assert _repeated_edge_paragraphs(pages) == {" ".join(DISCLAIMER.split()).casefold()}
+    pages[2] = ["intro", DISCLAIMER, "middle", "end"]
+    assert _repeated_edge_paragraphs(pages) == set()
+
+
+def test_extract_text_reads_form_feed_pages(tmp_path):
+    path = tmp_path / "brd.txt"
+    path.write_bytes("﻿Header\r\nFirst page\fHeader\nSecond page\fHeader\nThird page".encode("utf-8"))
+    assert extract_text(str(path), "BRD.TXT") == "First page\n\nSecond page\n\nThird page\n"
+
+
+def test_extract_text_reads_docx_body_headings_and_tables(tmp_path):
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    document = f"""<w:document {w}><w:body>
+        <w:p><w:pPr><w:pStyle w:val="TOC1"/></w:pPr><w:r><w:t>Scope ..... 1</w:t></w:r></w:p>
+        <w:p><w:pPr><w:pStyle w:val="Heading2"/></w:pPr><w:r><w:t>Scope</w:t></w:r></w:p>
+        <w:p><w:r><w:t>Fund</w:t></w:r><w:r><w:tab/><w:t>switches</w:t></w:r></w:p>
+        <w:tbl><w:tr><w:tc><w:p><w:r><w:t>Field</w:t></w:r></w:p></w:tc><w:tc><w:p><w:r><w:t>Type</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+    </w:body></w:document>"""
+    path = tmp_path / "brd.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", document)
+        archive.writestr("word/header1.xml", "<w:hdr/>")
+    assert extract_text(str(path), "brd.docx") == "## Scope\nFund\tswitches\nField | Type\n"
+
+
+def test_unsupported_and_unreadable_documents(tmp_path):
+    path = tmp_path / "brd.xlsx"
+    path.write_bytes(b"not a document")
+    with pytest.raises(UnsupportedDocumentError, match="Unsupported file type .xlsx"):
+        extract_text(str(path), "brd.xlsx")
+    with pytest.raises(UnsupportedDocumentError, match="Not a readable .docx"):
+        extract_text(str(path), "brd.docx")
+
+
+@pytest.mark.skipif(PdfReader is not None, reason="pypdf is installed")
+def test_pdf_is_only_supported_with_pypdf(tmp_path):
+    path = tmp_path / "brd.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    assert ".pdf" not in SUPPORTED_EXTENSIONS
+    with pytest.raises(UnsupportedDocumentError, match=r"Unsupported file type \.pdf.*pypdf"):
+        extract_text(str(path), "brd.pdf")
+
+
+def test_extractor_runs_in_a_process_pool(tmp_path):
+    path = tmp_path / "brd.md"
+    path.write_text("# Scope\n\nFund switches", encoding="utf-8")
+    extractor = DocumentExtractor(max_workers=1)
+    try:
+        assert asyncio.run(extractor.aextract(str(path), "brd.md")) == "# Scope\n\nFund switches\n"
+    finally:
+        extractor.shutdown()
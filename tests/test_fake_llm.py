@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from src.core.fake_llm import FakeMistralClient
+from src.core.llm import MistralLLM
+from src.core.models import AnalysisResult, CodeGenerationResponse, ImpactAssessment
+
+
+def test_structured_calls_get_the_fixture_for_their_schema():
+    client = FakeMistralClient()
+    llm = MistralLLM(client=client)
+    assert isinstance(llm.generate_structured("brd", AnalysisResult, use_cache=False), AnalysisResult)
+    assert isinstance(llm.generate_structured("impact", ImpactAssessment, use_cache=False), ImpactAssessment)
+    assert client.calls == 2
+
+
+def test_text_calls_get_the_text_fixture():
+    llm = MistralLLM(client=FakeMistralClient())
+    assert asyncio.run(llm.agenerate_text("hello", use_cache=False))
+
+
+def test_payload_scale_multiplies_list_items_with_unique_names():
+    one = MistralLLM(client=FakeMistralClient()).generate_structured("x", CodeGenerationResponse, use_cache=False)
+    three = MistralLLM(client=FakeMistralClient(payload_scale=3)).generate_structured("x", CodeGenerationResponse, use_cache=False)
+    assert len(three.files) == 3 * len(one.files)
+    assert len({f.file_name for f in three.files}) == len(three.files)
+
+
+def test_latency_is_simulated():
+    llm = MistralLLM(client=FakeMistralClient(latency_ms=50))
+    started = time.perf_counter()
+    llm.generate_structured("x", AnalysisResult, use_cache=False)
+    assert time.perf_counter() - started >= 0.05
+
+
+def test_jitter_is_reproducible():
+    first, second = FakeMistralClient(latency_ms=100, jitter_ms=50, seed=7), FakeMistralClient(latency_ms=100, jitter_ms=50, seed=7)
+    usage = first.respond([{"role": "user", "content": "x"}])[1]
+    assert [first.latency_for(usage) for _ in range(5)] == [second.latency_for(usage) for _ in range(5)]
+
+
+def test_stream_chunks_join_to_the_fixture():
+    client = FakeMistralClient(stream_chunk_chars=16)
+
+    async def main():
+        stream = await client.chat.stream_async(model="m", messages=[{"role": "user", "content": "x"}])
+        async with stream as events:
+            return [event.data.choices[0].delta.content async for event in events]
+
+    chunks = asyncio.run(main())
+    assert len(chunks) > 1 and all(len(c) <= 16 for c in chunks)
+    assert "".join(chunks) == client.respond([{"role": "user", "content": "x"}])[0]
@@ -0,0 +1,245 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from src.core.jobs import TERMINAL_STATUSES, JobRunningError, JobStore, PipelineJobManager
+from src.core.models import AnalysisResult, CodeGenerationResponse, EffortEstimation, GeneratedFile, ImpactAssessment
+
+REQUIREMENTS = AnalysisResult(business_objective="Add a fund extension table", functional_requirements=["Store NAV"])
+IMPACT = ImpactAssessment(
+    affected_components=[], schema_changes=["CREATE TABLE sttm_fund_ext"], code_changes=[],
+    effort_estimation=EffortEstimation(complexity="Low", person_days=2, justification="One table"),
+    overall_risk="Low", mitigation_strategies=[],
+)
+CODE = CodeGenerationResponse(files=[GeneratedFile(file_name="a.sql", file_content="--", file_type="DDL")], summary="ok")
+
+
+class StubAgent:
+    """Returns result for every call, failing the first `failures` calls; `gate` holds calls until it is set."""
+
+    def __init__(self, result, failures=0, gate=None):
+        self.result = result
+        self.failures = failures
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.calls <= self.failures:
+            raise RuntimeError("stage failed")
+        return self.result
+
+    analyze = assess = generate = __call__
+
+
+def wait_for(manager, job_id, statuses=("completed", "failed"), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = manager.status(job_id, include_results=False)
+        # A finished job is saved just before its worker lets go of it; wait for that too
+        if state["status"] in statuses and not (state["status"] in TERMINAL_STATUSES and job_id in manager._active):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs"))
+
+
+def make_manager(store, req=None, impact=None, code=None, **kwargs):
+    return PipelineJobManager(store, req or StubAgent(REQUIREMENTS), impact or StubAgent(IMPACT), code or StubAgent(CODE), **kwargs)
+
+
+def test_job_runs_every_stage_and_checkpoints_it(store):
+    manager = make_manager(store)
+    try:
+        job_id = manager.submit("BRD text")["job_id"]
+        assert wait_for(manager, job_id)["status"] == "completed"
+        state = manager.status(job_id)
+        assert state["completed_stages"] == ["requirements", "impact", "code"]
+        assert state["results"]["code"] == CODE.model_dump()
+        assert store.load_input(job_id) == "BRD text"
+        assert store.load_checkpoint(job_id, "impact") == IMPACT
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_conversational_input_skips_code_generation(store):
+    code = StubAgent(CODE)
+    manager = make_manager(store, req=StubAgent(AnalysisResult(conversation_response="Hello!")), code=code)
+    try:
+        job_id = manager.submit("hi")["job_id"]
+        wait_for(manager, job_id)
+        assert store.load_checkpoint(job_id, "code").files == []
+        assert code.calls == 0
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_resume_skips_checkpointed_stages(store):
+    req, impact = StubAgent(REQUIREMENTS), StubAgent(IMPACT, failures=1)
+    manager = make_manager(store, req=req, impact=impact)
+    try:
+        job_id = manager.submit("BRD text")["job_id"]
+        failed = wait_for(manager, job_id)
+        assert failed["status"] == "failed" and failed["error"] == "stage failed"
+        assert failed["completed_stages"] == ["requirements"]
+
+        manager.resume(job_id)
+        assert wait_for(manager, job_id)["status"] == "completed"
+        assert (req.calls, impact.calls) == (1, 2)
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_resume_of_completed_job_is_a_no_op(store):
+    req = StubAgent(REQUIREMENTS)
+    manager = make_manager(store, req=req)
+    try:
+        job_id = manager.submit("BRD text")["job_id"]
+        wait_for(manager, job_id)
+        assert manager.resume(job_id)["status"] == "completed"
+        assert req.calls == 1
+    finally:
+        manager.shutdown(wait=True)
+
+
+# --- Leases ----------------------------------------------------------------------------------
+
+def orphan(store, owner, expires_in):
+    """A job left running by another worker, whose lease expires in expires_in seconds."""
+    job_id = store.create("orphaned BRD")["job_id"]
+    state = store.load_state(job_id)
+    state["status"] = "running"
+    store.save_state(state)
+    store._write(store._lease_path(job_id), json.dumps({"owner": owner, "expires_at": time.time() + expires_in}))
+    return job_id
+
+
+def test_running_job_cannot_be_resumed_by_any_worker(store):
+    gate = threading.Event()
+    first = make_manager(store, req=StubAgent(REQUIREMENTS, gate=gate), lease_seconds=2)
+    second = make_manager(store, lease_seconds=2)
+    try:
+        job_id = first.submit("BRD text")["job_id"]
+        for manager in (first, second):
+            with pytest.raises(JobRunningError):
+                manager.resume(job_id)
+        assert second.resume_incomplete() == []
+        assert store.read_lease(job_id)["owner"] == first.owner
+
+        gate.set()
+        assert wait_for(first, job_id)["status"] == "completed"
+        assert store.read_lease(job_id) is None
+    finally:
+        gate.set()
+        first.shutdown(wait=True)
+        second.shutdown(wait=True)
+
+
+def test_expired_lease_is_adopted(store):
+    manager = make_manager(store, lease_seconds=2)
+    try:
+        job_id = orphan(store, "otherhost:1:abc:def", expires_in=0.2)
+        assert manager.resume_incomplete() == []
+        time.sleep(0.3)
+        assert manager.resume_incomplete() == [job_id]
+        assert wait_for(manager, job_id)["status"] == "completed"
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_lease_of_dead_local_process_is_adopted_before_expiry(store):
+    manager = make_manager(store, lease_seconds=2)
+    try:
+        job_id = orphan(store, f"{socket.gethostname()}:999999:abc:def", expires_in=60)
+        assert manager.resume_incomplete() == [job_id]
+        assert wait_for(manager, job_id)["status"] == "completed"
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_heartbeat_adopts_jobs_of_a_dead_worker(store):
+    manager = make_manager(store, lease_seconds=0.3)
+    try:
+        job_id = orphan(store, "otherhost:1:abc:def", expires_in=0.1)
+        assert wait_for(manager, job_id, timeout=3)["status"] == "completed"
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_heartbeat_keeps_a_long_job_leased(store):
+    gate = threading.Event()
+    first = make_manager(store, req=StubAgent(REQUIREMENTS, gate=gate), lease_seconds=0.3)
+    second = make_manager(store, lease_seconds=0.3)
+    try:
+        job_id = first.submit("BRD text")["job_id"]
+        time.sleep(0.8)
+        assert store.read_lease(job_id)["expires_at"] > time.time()
+        assert second.resume_incomplete() == []
+        gate.set()
+        wait_for(first, job_id)
+    finally:
+        gate.set()
+        first.shutdown(wait=True)
+        second.shutdown(wait=True)
+
+
+def test_only_one_contender_takes_over_a_stale_lease(store):
+    job_id = orphan(store, "otherhost:1:abc:def", expires_in=-1)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def contend(owner):
+        barrier.wait()
+        results.append(store.acquire_lease(job_id, owner, 30))
+
+    threads = [threading.Thread(target=contend, args=(f"otherhost:{i}:x:y",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+
+
+def test_heartbeat_reads_only_unfinished_jobs(store, monkeypatch):
+    manager = make_manager(store, lease_seconds=0.15)
+    try:
+        done = [manager.submit(f"BRD {i}")["job_id"] for i in range(5)]
+        for job_id in done:
+            wait_for(manager, job_id)
+        assert store.unfinished_job_ids() == []
+
+        loaded = []
+        load_state = store.load_state
+        monkeypatch.setattr(store, "load_state", lambda job_id: loaded.append(job_id) or load_state(job_id))
+        job_id = orphan(store, "otherhost:1:abc:def", expires_in=0.1)
+        assert wait_for(manager, job_id, timeout=3)["status"] == "completed"
+        time.sleep(0.2)  # a few more heartbeats, with nothing left to adopt
+        assert set(loaded) == {job_id}
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_unfinished_index_is_built_for_an_existing_store(store):
+    manager = make_manager(store)
+    try:
+        finished = manager.submit("BRD text")["job_id"]
+        wait_for(manager, finished)
+    finally:
+        manager.shutdown(wait=True)
+    job_id = orphan(store, "otherhost:1:abc:def", expires_in=60)
+    os.unlink(os.path.join(store.root, ".active", job_id))
+    os.rmdir(os.path.join(store.root, ".active"))
+
+    reopened = JobStore(store.root)
+    assert reopened.unfinished_job_ids() == [job_id]
+    assert sorted(reopened.job_ids()) == sorted([finished, job_id])
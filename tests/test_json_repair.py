@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from src.core.json_repair import (
+    JsonPatch, apply_patches, close_truncated, json_span, parse_repair_response, remove_trailing_commas, repair_json,
+)
+
+
+def test_json_span_returns_clean_response_unchanged():
+    text = '{"a": [1, 2]}'
+    assert json_span(text) is text
+
+
+def test_json_span_strips_fence_and_prose():
+    text = 'Here is the result:\n```json\n{"a": {"b": 1}}\n```\nHope this helps.'
+    assert json_span(text) == '{"a": {"b": 1}}'
+
+
+def test_json_span_prefers_top_level_array():
+    assert json_span('Result: [{"a": 1}, {"a": 2}] done') == '[{"a": 1}, {"a": 2}]'
+
+
+def test_json_span_without_json_returns_text():
+    assert json_span("no json here") == "no json here"
+
+
+def test_json_span_truncated_keeps_tail():
+    assert json_span('prefix {"a": [1, 2') == '{"a": [1, 2'
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1,}', '{"a": 1}'),
+    ('[1, 2, ]', '[1, 2 ]'),
+    ('{"a": [1,\n  ],\n}', '{"a": [1\n  ]\n}'),
+    ('{"a": "x,}"}', '{"a": "x,}"}'),
+    ('{"a": "quote \\" ,]",}', '{"a": "quote \\" ,]"}'),
+])
+def test_remove_trailing_commas(text, expected):
+    assert remove_trailing_commas(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1', {"a": 1}),
+    ('{"a": "unfinished', {"a": "unfinished"}),
+    ('{"a": [1, 2,', {"a": [1, 2]}),
+    ('{"a": ', {"a": None}),
+    ('{"a"', {"a": None}),
+    ('{"a": tr', {"a": None}),
+    ('{"a": true', {"a": True}),
+    ('[{"a": 1}, {"b": -2.5', [{"a": 1}, {"b": -2.5}]),
+    ('{"a": "esc\\', {"a": "esc"}),
+])
+def test_close_truncated_produces_valid_json(text, expected):
+    assert json.loads(close_truncated(text)) == expected
+
+
+def test_close_truncated_leaves_complete_json_alone():
+    text = '{"a": [1, {"b": null}]}'
+    assert close_truncated(text) is text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"items": ["x", "y",],}\n```', {"items": ["x", "y"]}),
+    ('Sure! {"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('The answer is {"a": 1, "b": "}"} as requested. {"c": 2}', {"a": 1, "b": "}"}),
+    ('```\n[{"name": "STTM_FUND",},\n```', [{"name": "STTM_FUND"}]),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_apply_patches_sets_creates_and_appends():
+    data = {"a": {"b": 1}, "items": ["x"]}
+    patches = [
+        JsonPatch(path=["a", "b"], value=2),
+        JsonPatch(path=["a", "c"], value="new"),
+        JsonPatch(path=["items", 0], value="y"),
+        JsonPatch(path=["items", 1], value="z"),
+    ]
+    assert apply_patches(data, patches) == {"a": {"b": 2, "c": "new"}, "items": ["y", "z"]}
+
+
+def test_apply_patches_skips_unresolvable_paths():
+    data = {"items": ["x"]}
+    patches = [JsonPatch(path=["missing", "key"], value=1), JsonPatch(path=["items", 5], value="far")]
+    assert apply_patches(data, patches) == {"items": ["x"]}
+
+
+def test_apply_patches_empty_path_replaces_root():
+    assert apply_patches({"a": 1}, [JsonPatch(path=[], value=[1])]) == [1]
+
+
+def test_parse_repair_response_handles_fenced_and_invalid_content():
+    response = parse_repair_response('```json\n{"patches": [{"path": ["a"], "value": 1},]}\n```')
+    assert response is not None
+    assert [p.path for p in response.patches] == [["a"]]
+    assert parse_repair_response("not json at all") is None
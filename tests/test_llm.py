@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+import src.core.llm as llm_module
+from src.core.cache import ResponseCache
+from src.core.llm import MistralLLM
+
+
+class Answer(BaseModel):
+    text: str
+    score: int
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content):
+        self.message = _Message(content)
+
+
+class _Response:
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+        self.usage = None
+
+
+class ScriptedChat:
+    """Answers each call with the next scripted item; exceptions in the script are raised."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+
+    def _next(self, messages):
+        self.calls.append(messages)
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return _Response(item)
+
+    def complete(self, model, messages, **kwargs):
+        return self._next(messages)
+
+    async def complete_async(self, model, messages, **kwargs):
+        await asyncio.sleep(0)
+        return self._next(messages)
+
+
+class ScriptedClient:
+    def __init__(self, *script):
+        self.chat = ScriptedChat(script)
+
+
+def make_llm(client, **kwargs):
+    llm = MistralLLM(**kwargs)
+    llm.client = client
+    return llm
+
+
+def test_generate_structured_validates_the_response():
+    client = ScriptedClient('```json\n{"text": "ok", "score": 3}\n```')
+    llm = make_llm(client)
+    assert llm.generate_structured("prompt", Answer) == Answer(text="ok", score=3)
+    system, user = client.chat.calls[0]
+    assert system["role"] == "system" and '"score"' in system["content"]
+    assert user == {"role": "user", "content": "prompt"}
+
+
+def test_async_path_matches_sync_path():
+    llm = make_llm(ScriptedClient('{"text": "a", "score": 1}', '{"text": "a", "score": 1}'))
+    sync = llm.generate_structured("prompt", Answer, use_cache=False)
+    assert asyncio.run(llm.agenerate_structured("prompt", Answer, use_cache=False)) == sync
+
+
+def test_async_calls_share_one_client_concurrently():
+    client = ScriptedClient(*['{"text": "x", "score": 1}'] * 5)
+    llm = make_llm(client)
+
+    async def main():
+        return await asyncio.gather(*(llm.agenerate_structured(f"prompt {i}", Answer) for i in range(5)))
+
+    assert len(asyncio.run(main())) == 5
+    assert len(client.chat.calls) == 5
+
+
+def test_cached_response_skips_the_client():
+    client = ScriptedClient('{"text": "once", "score": 1}')
+    llm = make_llm(client, cache=ResponseCache())
+    first = llm.generate_structured("prompt", Answer)
+    assert asyncio.run(llm.agenerate_structured("prompt", Answer)) == first
+    assert len(client.chat.calls) == 1
+
+
+def test_generate_text_returns_the_content():
+    llm = make_llm(ScriptedClient("plain answer"))
+    assert asyncio.run(llm.agenerate_text("hi")) == "plain answer"
+
+
+# --- Retries ---------------------------------------------------------------------------------
+
+class RetryableError(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_module, "retry_delay", lambda error, attempt: 0.0)
+
+
+def test_retryable_errors_are_retried(no_backoff):
+    client = ScriptedClient(RetryableError("rate limited"), '{"text": "after retry", "score": 2}')
+    llm = make_llm(client, max_retries=1)
+    assert asyncio.run(llm.agenerate_structured("prompt", Answer)).text == "after retry"
+
+
+def test_non_retryable_errors_are_raised(no_backoff):
+    llm = make_llm(ScriptedClient(ValueError("bad request")), max_retries=3)
+    with pytest.raises(ValueError, match="bad request"):
+        llm.generate_text("prompt")
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from src.core.metrics import (
+    Counter, Gauge, Histogram, Registry, finish_trace, instrumented_stage, record_span, span, start_trace,
+)
+
+
+def test_counter_renders_one_sample_per_label_set():
+    counter = Counter("requests_total", "Requests by outcome", ("route", "outcome"))
+    counter.inc(route="/a", outcome="ok")
+    counter.inc(2, route="/a", outcome="ok")
+    counter.inc(route="/b", outcome="error")
+    assert counter.value(route="/a", outcome="ok") == 3
+    assert counter.render() == [
+        "# HELP requests_total Requests by outcome",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a",outcome="ok"} 3.0',
+        'requests_total{route="/b",outcome="error"} 1.0',
+    ]
+
+
+def test_unlabelled_metric_and_label_escaping():
+    plain = Counter("restarts_total", "Restarts")
+    plain.inc()
+    assert plain.render()[-1] == "restarts_total 1.0"
+
+    counter = Counter("errors_total", "Errors", ("message",))
+    counter.inc(message='say "hi"\\\n')
+    assert counter.render()[-1] == 'errors_total{message="say \\"hi\\"\\\\\\n"} 1.0'
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = Histogram("latency_seconds", "Latency", ("call",), buckets=(0.1, 1, 0.5))
+    for value in (0.05, 0.1, 0.3, 0.7, 5):
+        histogram.observe(value, call="sync")
+    assert histogram.count(call="sync") == 5
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{call="sync",le="0.1"} 2.0',
+        'latency_seconds_bucket{call="sync",le="0.5"} 3.0',
+        'latency_seconds_bucket{call="sync",le="1"} 4.0',
+        'latency_seconds_bucket{call="sync",le="+Inf"} 5.0',
+        'latency_seconds_sum{call="sync"} 6.15',
+        'latency_seconds_count{call="sync"} 5.0',
+    ]
+
+
+def test_registry_renders_every_metric_in_registration_order():
+    registry = Registry()
+    registry.counter("b_total", "B").inc()
+    registry.histogram("a_seconds", "A", buckets=(1,)).observe(2)
+    text = registry.render()
+    assert text.endswith("\n")
+    names = [line.split()[2] for line in text.splitlines() if line.startswith("# TYPE")]
+    assert names == ["b_total", "a_seconds"]
+    assert 'a_seconds_bucket{le="1"} 0.0' in text and 'a_seconds_bucket{le="+Inf"} 1.0' in text
+
+
+def test_trace_collects_spans_into_one_log_line(caplog):
+    token = start_trace(route="/analyze")
+    with span("llm.call", model="small") as data:
+        data["cache"] = "miss"
+    record_span("parse", 0.002)
+    with caplog.at_level(logging.INFO, logger="flexcube.trace"):
+        trace = finish_trace(token, status=200)
+    assert [s["name"] for s in trace["spans"]] == ["llm.call", "parse"]
+    assert trace["spans"][0]["cache"] == "miss" and trace["status"] == 200
+    assert json.loads(caplog.records[-1].getMessage())["trace_id"] == trace["trace_id"]
+    # Outside a trace, spans are dropped
+    record_span("orphan", 0.1)
+
+
+def test_instrumented_stage_records_outcome_for_sync_and_async(monkeypatch):
+    import src.core.metrics as metrics
+
+    stage_seconds = Histogram("stage_seconds", "Stage", ("stage", "outcome"))
+    monkeypatch.setattr(metrics, "AGENT_STAGE_SECONDS", stage_seconds)
+
+    @instrumented_stage("sync")
+    def ok():
+        return 1
+
+    @instrumented_stage("async")
+    async def fails():
+        raise ValueError("boom")
+
+    assert ok() == 1
+    with pytest.raises(ValueError):
+        asyncio.run(fails())
+    assert stage_seconds.count(stage="sync", outcome="ok") == 1
+    assert stage_seconds.count(stage="async", outcome="error") == 1
+
+
+def test_gauge_goes_up_and_down():
+    gauge = Gauge("queue_depth", "Queued requests", ("lane",))
+    gauge.inc(3, lane="batch")
+    gauge.dec(lane="batch")
+    gauge.set(5, lane="interactive")
+    assert gauge.render()[1:] == [
+        "# TYPE queue_depth gauge",
+        'queue_depth{lane="batch"} 2.0',
+        'queue_depth{lane="interactive"} 5',
+    ]
@@ -0,0 +1,80 @@
+from pydantic import BaseModel
+
+from src.core.chunking import estimate_tokens
+from src.core.prompts import PROMPT_TOKENS, PROMPT_TRIMMED, PromptBuilder, clean_text, compact_schema, encode_payload, prune_empty
+
+
+class Sample(BaseModel):
+    business_objective: str
+    risk_tolerance: str = "N/A"
+
+
+def test_clean_text_dedents_and_strips():
+    assert clean_text("""
+        Line one
+          indented
+    """) == "Line one\n  indented"
+
+
+def test_prune_empty_drops_placeholders_recursively():
+    data = {"a": "N/A", "b": [], "c": {"d": None, "e": ["x", "none", ""]}, "f": 0, "g": "kept"}
+    assert prune_empty(data) == {"c": {"e": ["x"]}, "f": 0, "g": "kept"}
+
+
+def test_encode_payload_is_compact_and_pruned():
+    assert encode_payload(Sample(business_objective="Grow CASA")) == '{"business_objective":"Grow CASA"}'
+
+
+def test_compact_schema_drops_property_titles_only():
+    schema = compact_schema(Sample)
+    assert '"title":"Sample"' in schema
+    assert "Business Objective" not in schema and " " not in schema.replace("Grow", "")
+
+
+def test_prompt_within_budget_is_untouched():
+    builder = PromptBuilder("impact_analysis", budget_tokens=1000)
+    prompt = builder.add("Assess this.").add_payload("requirements", {"items": ["a", "b"]}).build()
+    assert prompt == 'Assess this.\n\n<requirements>\n{"items":["a","b"]}\n</requirements>'
+    assert builder.trimmed == [] and builder.tokens == estimate_tokens(prompt)
+
+
+def test_payload_is_trimmed_in_order_then_by_halving_the_longest_list():
+    payload = {
+        "history": "h" * 400,
+        "audit": "a" * 400,
+        "rules": [f"rule {i} " + "r" * 40 for i in range(16)],
+        "data": ["d" * 40] * 4,
+    }
+    builder = PromptBuilder("impact_analysis", budget_tokens=120)
+    builder.add("Assess this.").add_payload("requirements", payload, trim_order=("history", "audit"))
+    prompt = builder.build()
+    assert builder.trimmed == ["history", "audit", "rules[8:]", "rules[4:]"]
+    assert builder.tokens <= 120 and builder.tokens == estimate_tokens(prompt)
+    assert "rule 0 " in prompt and "rule 15 " not in prompt
+
+
+def test_fixed_text_is_never_trimmed():
+    brd = "The bank wants a new fund extension table. " * 200
+    builder = PromptBuilder("requirement_analysis", budget_tokens=100)
+    prompt = builder.add(f"<brd>\n{brd}\n</brd>").add_payload("context", {"notes": ["x" * 50] * 8}).build()
+    assert brd in prompt
+    # The payload is cut as far as it goes; the prompt stays over budget rather than losing BRD text
+    assert builder.tokens > 100
+    assert builder.trimmed == ["notes[4:]", "notes[2:]", "notes[1:]"]
+
+
+def test_prompt_without_payload_is_never_trimmed():
+    builder = PromptBuilder("requirement_analysis", budget_tokens=10)
+    assert builder.add("x" * 400).build() == "x" * 400
+    assert builder.trimmed == []
+
+
+def test_unrecorded_build_leaves_prompt_metrics_alone():
+    def build(record):
+        builder = PromptBuilder("impact_analysis", budget_tokens=10)
+        return builder.add_payload("requirements", {"items": ["x" * 40] * 4}).build(record)
+
+    observed, trimmed = PROMPT_TOKENS.count(stage="impact_analysis"), PROMPT_TRIMMED.value(stage="impact_analysis", field="items")
+    assert build(record=False) == build(record=True)
+    assert PROMPT_TOKENS.count(stage="impact_analysis") == observed + 1
+    assert PROMPT_TRIMMED.value(stage="impact_analysis", field="items") == trimmed + 2
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import src.core.ratelimit as ratelimit
+from src.core.ratelimit import RateLimiter, TokenBucket, is_retryable, retry_delay
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+    # Callers queue behind each other: the next one waits for two refills
+    assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_bucket_refills_continuously_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=4)
+    bucket.reserve(4)
+    clock.now += 1.0
+    assert bucket.reserve(2) == 0.0
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    clock.now += 60
+    assert [bucket.reserve() for _ in range(4)] == [0.0] * 4
+    assert bucket.reserve() > 0
+
+
+def test_charge_delays_later_callers(clock):
+    bucket = TokenBucket(rate=10.0, capacity=100)
+    bucket.charge(150)
+    assert bucket.reserve(10) == pytest.approx(6.0)
+
+
+def test_limiter_waits_for_the_slowest_bucket(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    limiter.acquire(estimated_tokens=600)
+    assert clock.slept == []
+    limiter.acquire(estimated_tokens=300)
+    # Requests refill 1/s and tokens 10/s: the 300 tokens take 30s
+    assert clock.slept == [pytest.approx(30.0)]
+    limiter.record_usage(120)
+    assert limiter.stats() == {"requests": 2, "tokens": 1020, "wait_seconds": 30.0}
+
+
+def test_limiter_without_limits_never_waits(clock):
+    limiter = RateLimiter()
+    for _ in range(100):
+        limiter.acquire(estimated_tokens=10_000)
+    assert clock.slept == []
+    assert limiter.stats()["requests"] == 100
+
+
+def test_async_acquire_sleeps_without_blocking(clock, monkeypatch):
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    limiter = RateLimiter(requests_per_minute=60)
+
+    async def main():
+        await asyncio.gather(*(limiter.aacquire() for _ in range(62)))
+
+    asyncio.run(main())
+    assert sorted(delays) == pytest.approx([1.0, 2.0])
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def test_retryable_errors():
+    assert is_retryable(ApiError(429)) and is_retryable(ApiError(503))
+    assert not is_retryable(ApiError(400)) and not is_retryable(ApiError(401))
+    assert is_retryable(type("ReadTimeout", (Exception,), {})())
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_retry_delay_honours_retry_after():
+    assert 7.0 <= retry_delay(ApiError(429, {"retry-after": "7"}), attempt=0) <= 8.0
+    assert retry_delay(ApiError(429, {"retry-after": "600"}), attempt=0, max_delay=60) <= 61.0
+    assert 0 <= retry_delay(ApiError(503), attempt=3) <= 8.0
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import src.web.responses as responses
+from src.core.models import (
+    AnalysisResult, CodeGenerationResponse, EffortEstimation, FieldChange, GeneratedFile, ImpactAssessment, RevisionAnalysis,
+)
+from src.web.responses import ModelJSONResponse
+
+ANALYSIS = AnalysisResult(
+    business_objective="Fonds d'épargne — new NAV rules ✓",
+    functional_requirements=["Switch units", 'Quote "as-of" NAV'],
+    conversation_response=None,
+)
+IMPACT = ImpactAssessment(
+    affected_components=[], schema_changes=["ALTER TABLE sttm_fund ADD (lock_in NUMBER)"], code_changes=[],
+    effort_estimation=EffortEstimation(complexity="Low", person_days=2, justification="One column\nand a screen"),
+    overall_risk="Low", mitigation_strategies=[], unverified_components=["STDXYZ"],
+)
+CODE = CodeGenerationResponse(files=[GeneratedFile(file_name="a.sql", file_content="BEGIN\n  NULL;\nEND;\n/", file_type="PLSQL")], summary="ok")
+REVISION = RevisionAnalysis(
+    document_id="doc-1", revision=2, analysis=ANALYSIS,
+    changed_fields={"business_objective": FieldChange(old="a", new="b")}, sections_total=4, sections_changed=1,
+)
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    for name, model in {"analysis": ANALYSIS, "impact": IMPACT, "code": CODE, "revision": REVISION}.items():
+        # The same model returned plainly (FastAPI validates and serializes it) and as ModelJSONResponse
+        app.add_api_route(f"/default/{name}", lambda model=model: model, response_model=type(model))
+        app.add_api_route(f"/fast/{name}", lambda model=model: ModelJSONResponse(model), response_model=type(model))
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("name", ["analysis", "impact", "code", "revision"])
+def test_body_matches_the_default_serializer(client, name):
+    default, fast = client.get(f"/default/{name}"), client.get(f"/fast/{name}")
+    assert fast.status_code == default.status_code == 200
+    assert fast.headers["content-type"] == default.headers["content-type"]
+    assert fast.json() == default.json()
+
+
+def test_body_round_trips_to_an_equal_model():
+    body = ModelJSONResponse(REVISION).body
+    assert RevisionAnalysis.model_validate_json(body) == REVISION
+    assert ImpactAssessment.model_validate_json(ModelJSONResponse(IMPACT).body) == IMPACT
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_plain_data_is_compact_json(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("orjson is not installed")
+    response = ModelJSONResponse({"status": "starting", "note": "ü"}, status_code=503)
+    assert response.status_code == 503
+    assert json.loads(response.body) == {"status": "starting", "note": "ü"}
+    assert b" " not in response.body
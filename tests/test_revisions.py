@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+import time
+
+from src.agents.requirement_analysis import RequirementAnalysisAgent, diff_analysis
+from src.core.chunking import split_sections
+from src.core.models import AnalysisResult, FieldChange
+from src.core.revisions import RevisionStore, block_key, fingerprint, group_sections
+
+
+def brd(sections: int, edit: int = -1) -> str:
+    return "".join(
+        f"# {i} Section {i}\n" + f"The system shall handle {'revised ' if i == edit else ''}case {i} with rule {i * 7}.\n" * 3
+        for i in range(sections)
+    )
+
+
+def blocks_of(text: str, max_tokens: int = 6000):
+    sections = split_sections(text)
+    fingerprints = [fingerprint(s) for s in sections]
+    groups = group_sections(fingerprints, [len(s) for s in sections], max_tokens)
+    return [tuple(fingerprints[i] for i in group) for group in groups]
+
+
+def test_fingerprint_ignores_whitespace_only():
+    assert fingerprint("The system  shall\ncompute fees.\n") == fingerprint("The system shall compute fees.")
+    assert fingerprint("The system shall compute fees.") != fingerprint("The system shall compute fee.")
+
+
+def test_group_sections_covers_every_section_in_order():
+    sizes = [500] * 50
+    fingerprints = [fingerprint(f"section {i}") for i in range(50)]
+    groups = group_sections(fingerprints, sizes, max_tokens=1000)
+    assert [i for group in groups for i in group] == list(range(50))
+    assert all(sum(sizes[i] for i in group) <= 4000 for group in groups)
+
+
+def test_short_documents_split_into_several_blocks():
+    text = brd(36)
+    assert len(text) < 6000  # a quarter of one block's budget
+    assert len(blocks_of(text)) > 1
+
+
+def test_editing_a_section_changes_at_most_two_blocks():
+    for edit in range(0, 40, 7):
+        before, after = blocks_of(brd(40)), blocks_of(brd(40, edit=edit))
+        assert len(set(after) - set(before)) <= 2
+
+
+def test_block_key_depends_on_salt_and_sections():
+    assert block_key("a", ["x", "y"]) == block_key("a", ["x", "y"])
+    assert block_key("a", ["x", "y"]) != block_key("b", ["x", "y"])
+    assert block_key("a", ["x", "y"]) != block_key("a", ["xy"])
+
+
+def test_diff_analysis_reports_added_removed_and_scalars():
+    old = AnalysisResult(business_objective="Launch funds", functional_requirements=["Compute fee.", "Post entries"])
+    new = AnalysisResult(business_objective="Launch  funds", functional_requirements=["compute fee", "Send alerts"], risk_tolerance="Low")
+    assert diff_analysis(old, new) == {
+        "functional_requirements": FieldChange(added=["Send alerts"], removed=["Post entries"]),
+        "risk_tolerance": FieldChange(old="N/A", new="Low"),
+    }
+    assert diff_analysis(new, new) == {}
+
+
+def test_store_drops_expired_blocks(tmp_path):
+    store = RevisionStore(str(tmp_path), ttl_seconds=60)
+    store.put_block("old", AnalysisResult(business_objective="old"))
+    store.put_block("new", AnalysisResult(business_objective="new"))
+    stale = time.time() - 120
+    os.utime(store._block_path("old"), (stale, stale))
+    assert store.get_block("old") is None
+    assert store.prune() == 1
+    assert store.get_block("new").business_objective == "new"
+
+
+def test_store_evicts_least_recently_used_blocks(tmp_path):
+    store = RevisionStore(str(tmp_path), ttl_seconds=None, max_blocks=2)
+    for i, key in enumerate(["a", "b", "c"]):
+        store.put_block(key, AnalysisResult())
+        os.utime(store._block_path(key), (1000 + i, 1000 + i))
+    assert store.get_block("a") is not None  # a read refreshes "a"
+    assert store.prune() == 1
+    assert store.get_block("b") is None
+    assert store.get_block("a") is not None and store.get_block("c") is not None
+
+
+class SectionLLM:
+    model = "stub"
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        with self.lock:
+            self.calls += 1
+        rules = [line.strip() for line in prompt.splitlines() if line.startswith("The system shall")]
+        return AnalysisResult(functional_requirements=rules)
+
+
+class AsyncSectionLLM(SectionLLM):
+    async def agenerate_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        return self.generate_structured(prompt, response_model, use_cache, system_prompt)
+
+
+def test_revision_reanalyzes_only_changed_blocks(tmp_path):
+    llm = SectionLLM()
+    agent = RequirementAnalysisAgent(llm, revision_store=RevisionStore(str(tmp_path)))
+    first = agent.analyze_revision("brd", brd(40))
+    assert (first.revision, first.blocks_analyzed) == (1, first.blocks_total)
+    second = agent.analyze_revision("brd", brd(40, edit=20))
+    assert second.revision == 2
+    assert 1 <= second.blocks_analyzed <= 2 < second.blocks_total
+    assert second.sections_changed == 1
+    assert second.changed_fields["functional_requirements"].added == ["The system shall handle revised case 20 with rule 140."]
+
+
+def test_concurrent_revisions_get_distinct_numbers(tmp_path):
+    store = RevisionStore(str(tmp_path))
+    agent = RequirementAnalysisAgent(SectionLLM(), revision_store=store)
+    revisions = []
+
+    def run(i):
+        revisions.append(agent.analyze_revision("brd", brd(12, edit=i)).revision)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(revisions) == list(range(1, 9))
+    # Locks are released with their last holder: no entries or lock files are left behind
+    assert store._document_locks == {}
+    assert not [name for name in os.listdir(tmp_path / "documents") if name.endswith(".lock")]
+
+
+def test_async_revision_does_block_io_off_the_event_loop(tmp_path):
+    store = RevisionStore(str(tmp_path))
+    loop_thread = threading.get_ident()
+    io_threads = []
+    for name in ("get_block", "put_block"):
+        method = getattr(store, name)
+
+        def traced(*args, method=method):
+            io_threads.append(threading.get_ident())
+            return method(*args)
+
+        setattr(store, name, traced)
+    agent = RequirementAnalysisAgent(AsyncSectionLLM(), revision_store=store)
+    result = asyncio.run(agent.aanalyze_revision("brd", brd(12)))
+    assert result.revision == 1 and result.blocks_analyzed == result.blocks_total
+    assert io_threads and loop_thread not in io_threads
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.core.routing import CONVERSATIONAL, DOCUMENT, UNCERTAIN, InputRouter
+
+LONG_BRD = "\n".join(
+    ["1. Business Objective", "Enable investors to switch units between funds without a redemption.", "2. Scope"]
+    + [f"- The system shall validate switch request {i} against the fund's cut-off time and NAV date." for i in range(20)]
+)
+
+CASES = [
+    # text, expected route, expected reason (substring)
+    ("", CONVERSATIONAL, "empty input"),
+    ("   \n\t ", CONVERSATIONAL, "empty input"),
+    ("Hi", CONVERSATIONAL, "greeting"),
+    ("hello there, how are you doing today", CONVERSATIONAL, "greeting"),
+    ("Thanks!", CONVERSATIONAL, "greeting"),
+    ("What can you do?", CONVERSATIONAL, "question"),
+    ("Who built this tool?", CONVERSATIONAL, "question"),
+    ("What is the NAV cut-off for the fund?", UNCERTAIN, "no strong signal"),
+    ("Enable capital calls on committed capital", UNCERTAIN, "no strong signal"),
+    ("The system shall block redemptions during the lock-in period and report the fee.", DOCUMENT, "vocabulary"),
+    ("Add a maker checker approval for subscription reversals", DOCUMENT, "vocabulary"),
+    ("# Scope\nFund switches\n# Out of scope\nTransfers", DOCUMENT, "structure"),
+    ("- one\n- two\n- three", DOCUMENT, "structure"),
+    (LONG_BRD, DOCUMENT, "long input"),
+]
+
+
+@pytest.mark.parametrize("text, route, reason", CASES)
+def test_classify(text, route, reason):
+    decision = InputRouter().classify(text)
+    assert decision.route == route
+    assert reason in decision.reason
+
+
+def test_uncertain_input_defaults_to_the_document_path():
+    decision = InputRouter().route("What is the NAV cut-off for the fund?")
+    assert decision.route == DOCUMENT
+    assert decision.method == "heuristic" and "defaulting to document" in decision.reason
+
+
+class Classifier:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def generate_text(self, prompt):
+        self.prompts.append(prompt)
+        return self.answer
+
+    async def agenerate_text(self, prompt):
+        return self.generate_text(prompt)
+
+
+def test_classifier_breaks_ties_only():
+    classifier = Classifier(" conversation.")
+    router = InputRouter(classifier_llm=classifier)
+    assert router.route("Hi").method == "heuristic"
+    decision = asyncio.run(router.aroute("What is the NAV cut-off for the fund?"))
+    assert (decision.route, decision.method) == (CONVERSATIONAL, "classifier")
+    assert len(classifier.prompts) == 1
+    assert InputRouter(classifier_llm=Classifier("DOCUMENT")).route("What is the NAV cut-off for the fund?").route == DOCUMENT
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("FLEXCUBE_ROUTING", "off")
+    assert InputRouter.from_env() is None
+    monkeypatch.setenv("FLEXCUBE_ROUTING", "on")
+    monkeypatch.setenv("FLEXCUBE_ROUTING_MAX_CHAT_WORDS", "5")
+    classifier = Classifier("DOCUMENT")
+    router = InputRouter.from_env(classifier)
+    assert router.max_chat_words == 5 and router.classifier_llm is None
+    monkeypatch.setenv("FLEXCUBE_ROUTING_CLASSIFIER", "1")
+    assert InputRouter.from_env(classifier).classifier_llm is classifier
@@ -0,0 +1,87 @@
+import asyncio
+
+from src.agents.code_generation import CodeGenerationAgent
+from src.agents.impact_analysis import ImpactAnalysisAgent
+from src.agents.requirement_analysis import RequirementAnalysisAgent
+from src.core.fake_llm import FakeMistralClient
+from src.core.jobs import arun_pipelined
+from src.core.llm import MistralLLM
+from src.core.models import AnalysisResult, EffortEstimation, FieldChange, ImpactAssessment
+from src.core.prompts import PROMPT_TOKENS
+from src.core.speculation import SPECULATION, Speculation
+
+BRD = "The system shall support a new Hedge Fund type with performance fees, a 90-day lock-up and monthly NAV."
+IMPACT = ImpactAssessment(
+    affected_components=[], schema_changes=[], code_changes=[],
+    effort_estimation=EffortEstimation(complexity="Low", person_days=1, justification="None"),
+    overall_risk="Low", mitigation_strategies=[],
+)
+
+
+def outcomes(stage):
+    return {o: SPECULATION.value(stage=stage, outcome=o) for o in ("started", "restarted", "kept", "discarded")}
+
+
+def test_pipelined_run_keeps_speculation_and_matches_sequential():
+    client = FakeMistralClient(latency_ms=5, ms_per_token=0.05)
+    agents = (RequirementAnalysisAgent(MistralLLM(client=client)), ImpactAnalysisAgent(MistralLLM(client=client)),
+              CodeGenerationAgent(MistralLLM(client=client)))
+    req_agent, impact_agent, code_agent = agents
+    requirements = req_agent.analyze(BRD, use_cache=False)
+    impact = impact_agent.assess(requirements, use_cache=False)
+    code = code_agent.generate(impact, use_cache=False)
+
+    before = {stage: outcomes(stage) for stage in ("impact", "code")}
+    calls = client.calls
+    prompts = {stage: PROMPT_TOKENS.count(stage=stage) for stage in ("impact_analysis", "code_generation")}
+    assert asyncio.run(arun_pipelined(*agents, BRD, use_cache=False)) == (requirements, impact, code)
+    assert client.calls - calls == 3
+    # Speculation keys are prompts too, but only the prompts actually sent are recorded
+    assert {stage: PROMPT_TOKENS.count(stage=stage) - n for stage, n in prompts.items()} == {"impact_analysis": 1, "code_generation": 1}
+    for stage in ("impact", "code"):
+        after = outcomes(stage)
+        assert {o: after[o] - before[stage][o] for o in after} == {"started": 1, "restarted": 0, "kept": 1, "discarded": 0}
+
+
+def test_prompts_use_only_the_leading_upstream_fields():
+    for model, agent in ((AnalysisResult, ImpactAnalysisAgent), (ImpactAssessment, CodeGenerationAgent)):
+        fields = list(model.model_fields)
+        assert fields[:len(agent.input_fields)] == list(agent.input_fields)
+
+    impact_agent = ImpactAnalysisAgent(MistralLLM(client=FakeMistralClient()))
+    requirements = AnalysisResult(business_objective="Launch hedge funds", functional_requirements=["Compute fees"])
+    tail = requirements.model_copy(update={"client_type": "Retail", "risk_tolerance": "Low", "historical_issues": ["x"]})
+    assert impact_agent.prompt_key(tail) == impact_agent.prompt_key(requirements)
+    assert impact_agent.reassess(IMPACT, {"client_type": FieldChange(old="N/A", new="Retail")}) is IMPACT
+
+
+def test_speculation_restarts_on_a_changed_prompt_and_redoes_a_stale_run():
+    runs = []
+
+    async def run(requirements):
+        runs.append(requirements.business_objective)
+        return requirements.business_objective
+
+    def speculation():
+        return Speculation("impact", run, AnalysisResult.model_validate, ("business_objective",),
+                           lambda requirements: requirements.business_objective, max_restarts=1)
+
+    async def kept():
+        stage = speculation()
+        stage.offer("business_objective", "a")
+        await asyncio.sleep(0)
+        stage.offer("client_type", "Retail")  # not part of the key
+        return await stage.resolve(AnalysisResult(business_objective="a", client_type="Retail"))
+
+    async def restarted_then_redone():
+        stage = speculation()
+        stage.offer("business_objective", "b")
+        await asyncio.sleep(0)
+        stage.offer("business_objective", "c")
+        await asyncio.sleep(0)
+        stage.offer("business_objective", "d")  # restarts used up: the run on "c" carries on
+        return await stage.resolve(AnalysisResult(business_objective="d"))
+
+    assert asyncio.run(kept()) == "a"
+    assert asyncio.run(restarted_then_redone()) == "d"
+    assert runs == ["a", "b", "c", "d"]
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from src.agents.code_generation import CodeGenerationAgent
+from src.core.models import AffectedComponent, EffortEstimation, ImpactAssessment
+from src.core.streaming import JsonStreamParser, astream_fields
+
+RESPONSE = (
+    'Sure, here it is:\n```json\n'
+    '{"files": [{"file_name": "a.sql", "file_content": "select \\"x\\" from t; -- }]", "file_type": "DML"},'
+    ' {"file_name": "b.sql", "file_content": "", "file_type": "DDL"}],\n'
+    ' "summary": "Two files", "count": 2, "ok": true, "extra": null}\n```'
+)
+
+
+def feed_in_pieces(parser: JsonStreamParser, text: str, size: int):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+async def chunks(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+def collect(agen):
+    async def run():
+        return [item async for item in agen]
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(RESPONSE)])
+def test_parser_emits_wanted_values_regardless_of_chunking(size):
+    parser = JsonStreamParser(lambda path: (len(path) == 2 and path[0] == "files") or path == ("summary",))
+    events = feed_in_pieces(parser, RESPONSE, size)
+    assert [path for path, _ in events] == [("files", 0), ("files", 1), ("summary",)]
+    assert events[0][1]["file_content"] == 'select "x" from t; -- }]'
+    assert events[2][1] == "Two files"
+    assert parser.done
+
+
+def test_parser_emits_top_level_scalars_when_they_close():
+    parser = JsonStreamParser(lambda path: len(path) == 1)
+    assert parser.feed('{"count": 12') == []
+    assert parser.feed(', "ok": true}') == [(("count",), 12), (("ok",), True)]
+    assert parser.done
+
+
+def test_parser_is_not_done_on_truncated_input():
+    parser = JsonStreamParser(lambda path: len(path) == 1)
+    events = parser.feed(RESPONSE[:RESPONSE.index('"summary"')])
+    assert [path for path, _ in events] == [("files",)]
+    assert not parser.done
+
+
+def test_parser_ignores_text_after_the_value():
+    parser = JsonStreamParser(lambda path: len(path) == 1)
+    assert parser.feed('{"a": 1} {"b": 2}') == [(("a",), 1)]
+    assert parser.done
+
+
+def test_parser_decodes_escaped_keys():
+    parser = JsonStreamParser(lambda path: len(path) == 1)
+    assert parser.feed('{"a\\"b": [1]}') == [(('a"b',), [1])]
+
+
+def test_astream_fields_yields_fields_in_order():
+    fields = collect(astream_fields(chunks('{"a": {"x"', ': 1}, "b": [1', ', 2]}')))
+    assert fields == [("a", {"x": 1}), ("b", [1, 2])]
+
+
+def test_astream_fields_raises_on_incomplete_object():
+    with pytest.raises(ValueError):
+        collect(astream_fields(chunks('{"a": 1, "b": [1, ')))
+
+
+class StreamingLLM:
+    def __init__(self, text: str):
+        self.text = text
+
+    async def astream_structured(self, prompt, response_model, use_cache=True, system_prompt=None):
+        for i in range(0, len(self.text), 16):
+            yield self.text[i:i + 16]
+
+
+def impact() -> ImpactAssessment:
+    return ImpactAssessment(
+        affected_components=[AffectedComponent(component_name="STTM_FUND", component_type="Table", nature_of_change="Modify")],
+        schema_changes=["ALTER TABLE STTM_FUND ADD (FEE NUMBER)"],
+        code_changes=[],
+        effort_estimation=EffortEstimation(complexity="Low", person_days=1, justification="One column"),
+        overall_risk="Low",
+        mitigation_strategies=[],
+    )
+
+
+def test_code_generation_astream_yields_files_then_summary():
+    agent = CodeGenerationAgent(StreamingLLM(RESPONSE))
+    items = collect(agent.astream(impact(), fanout=False))
+    assert [kind for kind, _ in items] == ["file", "file", "summary"]
+    assert items[1][1].file_name == "b.sql"
+
+
+def test_code_generation_astream_raises_on_truncated_stream():
+    agent = CodeGenerationAgent(StreamingLLM(RESPONSE[:RESPONSE.index('{"file_name": "b.sql"')]))
+    with pytest.raises(ValueError, match="ended before"):
+        collect(agent.astream(impact(), fanout=False))
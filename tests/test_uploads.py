@@ -0,0 +1,90 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.web.uploads import max_upload_bytes, receive_upload
+
+LIMIT = 4096
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLEXCUBE_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def client(upload_dir):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        received = await receive_upload(request, max_bytes=LIMIT)
+        try:
+            with open(received.path, "rb") as f:
+                content = f.read().decode("utf-8")
+            return {"filename": received.filename, "size": received.size, "fields": received.fields,
+                    "content": content, "in_upload_dir": os.path.dirname(received.path) == str(upload_dir)}
+        finally:
+            os.unlink(received.path)
+
+    return TestClient(app)
+
+
+def test_file_and_fields_are_received(client, upload_dir):
+    response = client.post("/upload", files={"file": ("../BRD v2.TXT", b"Fund switches\n" * 10)}, data={"document_id": "doc-1"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "filename": "BRD v2.TXT", "size": 140, "fields": {"document_id": "doc-1"},
+        "content": "Fund switches\n" * 10, "in_upload_dir": True,
+    }
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_oversized_content_length_is_rejected_up_front(client, upload_dir):
+    response = client.post("/upload", files={"file": ("brd.txt", b"x" * (LIMIT + 70 * 1024))})
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_limit_crossed_mid_stream_is_rejected_and_cleaned_up(client, upload_dir):
+    # Under the Content-Length allowance for the multipart envelope, but the file part itself is too big
+    response = client.post("/upload", files={"file": ("brd.txt", b"x" * (LIMIT + 1))})
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_non_multipart_body_is_unsupported(client):
+    assert client.post("/upload", json={"text": "BRD"}).status_code == 415
+    assert client.post("/upload", content=b"BRD", headers={"content-type": "multipart/form-data"}).status_code == 415
+
+
+def test_missing_file_field(client, upload_dir):
+    response = client.post("/upload", files={"attachment": ("brd.txt", b"BRD")}, data={"document_id": "doc-1"})
+    assert response.status_code == 400
+    assert "Missing file field 'file'" in response.json()["detail"]
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_oversized_form_field_is_rejected(client, upload_dir):
+    response = client.post("/upload", files={"file": ("brd.txt", b"BRD")}, data={"document_id": "x" * 5000})
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_malformed_body_is_rejected_and_cleaned_up(client, upload_dir):
+    body = (
+        b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"brd.txt\"\r\n\r\nFund switches"
+        b"\r\n--b\r\nthis is not a header line\r\n\r\n--b--\r\n"
+    )
+    response = client.post("/upload", content=body, headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Malformed multipart body")
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_max_upload_bytes_from_env(monkeypatch):
+    monkeypatch.setenv("FLEXCUBE_MAX_UPLOAD_MB", "0.5")
+    assert max_upload_bytes() == 512 * 1024